@@ -0,0 +1,335 @@
+import os
+import tempfile
+import threading
+import numpy as np
+import sounddevice as sd
+from typing import Callable, List, Optional
+
+
+class AudioCaptureBuffer:
+    """
+    Preallocated, growable float32 buffer that an audio callback writes into.
+    Consumers read through zero-copy views instead of concatenating chunk lists.
+    Long recordings spill to a memory-mapped temporary file so they don't stay in RAM.
+    """
+
+    def __init__(self, sample_rate: int = 16000, initial_seconds: float = 30.0,
+                 max_seconds: float = 300.0, dtype=np.float32,
+                 spill_seconds: Optional[float] = 120.0, spill_dir: Optional[str] = None):
+        """
+        Args:
+            sample_rate: Samples per second stored in the buffer
+            initial_seconds: Capacity to preallocate up front
+            max_seconds: Hard limit on how much audio the buffer will ever hold
+            spill_seconds: Once the buffer needs to grow past this, the audio moves to a
+                           memory-mapped file; None keeps everything in RAM
+            spill_dir: Directory for the spill file, defaults to the system temp directory
+        """
+        self.sample_rate = sample_rate
+        self.dtype = dtype
+        self.max_samples = int(max_seconds * sample_rate)
+        self.initial_samples = min(int(initial_seconds * sample_rate), self.max_samples)
+        self.spill_samples = None if spill_seconds is None else int(spill_seconds * sample_rate)
+        if self.spill_samples is not None:
+            self.initial_samples = min(self.initial_samples, self.spill_samples)
+        self.spill_dir = spill_dir
+        self.spill_path = None
+        self.lock = threading.Lock()
+        self.reset()
+
+    @property
+    def is_spilled(self) -> bool:
+        return isinstance(self._buffer, np.memmap)
+
+    def reset(self):
+        """Drop all captured audio, keeping the current in-memory allocation for reuse"""
+        with self.lock:
+            if getattr(self, "_buffer", None) is not None and self.is_spilled:
+                # Views handed out earlier keep the mapping alive until they are released
+                self._buffer = None
+                self._remove_spill_file()
+            if getattr(self, "_buffer", None) is None or len(self._buffer) < self.initial_samples:
+                self._buffer = np.empty(self.initial_samples, dtype=self.dtype)
+            self.length = 0
+
+    def __len__(self) -> int:
+        return self.length
+
+    @property
+    def is_full(self) -> bool:
+        return self.length >= self.max_samples
+
+    @property
+    def seconds(self) -> float:
+        return self.length / self.sample_rate
+
+    def _grow(self, needed: int):
+        """Double the allocation (capped at max_samples) until needed samples fit"""
+        capacity = max(len(self._buffer), 1)
+        while capacity < needed:
+            capacity *= 2
+        capacity = min(capacity, self.max_samples)
+        if self.spill_samples is not None and capacity > self.spill_samples:
+            self._spill()
+            return
+        new_buffer = np.empty(capacity, dtype=self.dtype)
+        new_buffer[:self.length] = self._buffer[:self.length]
+        # Views handed out earlier keep the old array alive and stay valid
+        self._buffer = new_buffer
+
+    def _spill(self):
+        """
+        Move the captured audio into a memory-mapped file sized for max_samples, so the
+        buffer never has to grow (or copy) again and the OS can page it out of RAM.
+        """
+        fd, self.spill_path = tempfile.mkstemp(prefix="babagaboosh-capture-", suffix=".f32", dir=self.spill_dir)
+        os.close(fd)
+        spilled = np.memmap(self.spill_path, dtype=self.dtype, mode="w+", shape=(self.max_samples,))
+        spilled[:self.length] = self._buffer[:self.length]
+        self._buffer = spilled
+        print(f"Recording passed {self.spill_samples / self.sample_rate:.0f} seconds, "
+              f"spilling audio to {self.spill_path}")
+        # On POSIX the mapping stays valid after the file is unlinked and the space is
+        # freed when the last view goes away; elsewhere it's removed on the next reset
+        self._remove_spill_file()
+
+    def _remove_spill_file(self):
+        if self.spill_path is None:
+            return
+        try:
+            os.remove(self.spill_path)
+            self.spill_path = None
+        except OSError:
+            pass
+
+    def write(self, samples: np.ndarray) -> int:
+        """
+        Append samples, stopping at max_samples.
+
+        Returns:
+            int: Number of samples actually written
+        """
+        with self.lock:
+            count = min(len(samples), self.max_samples - self.length)
+            if count <= 0:
+                return 0
+            end = self.length + count
+            if end > len(self._buffer):
+                self._grow(end)
+            self._buffer[self.length:end] = samples[:count]
+            self.length = end
+            return count
+
+    def view(self, start: int = 0, end: Optional[int] = None) -> np.ndarray:
+        """
+        Zero-copy view of captured samples [start:end].
+        Samples already written never change, so the view is safe to read while
+        recording continues.
+        """
+        with self.lock:
+            end = self.length if end is None else min(end, self.length)
+            return self._buffer[start:end]
+
+
+class PreRollBuffer:
+    """
+    Fixed-size ring buffer holding the most recent audio heard while not recording,
+    so a recording can start with what was said just before it was triggered.
+    """
+
+    def __init__(self, sample_rate: int = 16000, preroll_ms: int = 300, dtype=np.float32):
+        self.capacity = int(sample_rate * preroll_ms / 1000)
+        self._ring = np.zeros(self.capacity, dtype=dtype)
+        self.position = 0  # Next index to write
+        self.filled = 0
+
+    def write(self, samples: np.ndarray):
+        if self.capacity == 0:
+            return
+        samples = samples[-self.capacity:]
+        count = len(samples)
+        first = min(count, self.capacity - self.position)
+        self._ring[self.position:self.position + first] = samples[:first]
+        self._ring[:count - first] = samples[first:]
+        self.position = (self.position + count) % self.capacity
+        self.filled = min(self.filled + count, self.capacity)
+
+    def read(self) -> np.ndarray:
+        """Copy of the buffered audio, oldest sample first"""
+        start = (self.position - self.filled) % self.capacity if self.capacity else 0
+        if start + self.filled <= self.capacity:
+            return self._ring[start:start + self.filled].copy()
+        return np.concatenate([self._ring[start:], self._ring[:self.position]])
+
+    def clear(self):
+        self.position = 0
+        self.filled = 0
+
+
+class AudioRecorder:
+    """
+    Gap-free microphone capture using a single long-lived sounddevice InputStream.
+    The stream callback copies each block straight into an AudioCaptureBuffer.
+
+    The stream can also be kept open between recordings (open()/close()); while it is
+    open but not recording, incoming audio only feeds a short pre-roll ring buffer, so
+    start() has no stream start-up delay and the recording includes the audio from
+    just before it was triggered. Idle audio is also passed to any idle_listeners
+    (e.g. a wake word detector).
+    """
+
+    def __init__(self, sample_rate: int = 16000, channels: int = 1, dtype=np.float32,
+                 max_seconds: float = 300.0, block_seconds: float = 0.1,
+                 on_limit_reached: Optional[Callable[[], None]] = None,
+                 stream_factory: Optional[Callable[..., "sd.InputStream"]] = None,
+                 spill_seconds: Optional[float] = 120.0, preroll_ms: int = 300):
+        """
+        Args:
+            sample_rate: Capture rate (Whisper expects 16kHz)
+            channels: Input channels; multi-channel input is downmixed to mono
+            max_seconds: Maximum recording length, capture stops once reached
+            block_seconds: Audio delivered per callback
+            on_limit_reached: Called once (from the audio thread) when max_seconds is hit
+            stream_factory: Creates the input stream (default: sounddevice.InputStream);
+                            benchmarks and tests pass a simulated stream here
+            spill_seconds: Recordings longer than this are kept in a memory-mapped
+                           file instead of RAM; None keeps everything in RAM
+            preroll_ms: Audio from before start() kept at the beginning of a recording
+                        while the stream is held open
+        """
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.dtype = dtype
+        self.blocksize = int(block_seconds * sample_rate)
+        self.on_limit_reached = on_limit_reached
+        self.stream_factory = stream_factory or sd.InputStream
+        self.buffer = AudioCaptureBuffer(sample_rate, max_seconds=max_seconds, dtype=dtype,
+                                         spill_seconds=spill_seconds)
+        self.preroll = PreRollBuffer(sample_rate, preroll_ms, dtype=dtype)
+        self.preroll_samples = self.preroll.capacity  # Pre-roll put in front of a plain start()
+        self.idle_samples = 0  # Samples heard while not recording, since the stream was created
+        self.limit_reached = threading.Event()
+        self.stream = None
+        self.keep_open = False
+        self.capturing = False
+        # Called from the audio thread with each block heard while not recording. They must
+        # be cheap and copy what they keep; the block is only valid during the call.
+        self.idle_listeners: List[Callable[[np.ndarray], None]] = []
+        # Makes switching between pre-roll and recording atomic with respect to the callback
+        self.capture_lock = threading.Lock()
+
+    @property
+    def is_running(self) -> bool:
+        return self.stream is not None
+
+    def _open_stream(self):
+        self.stream = self.stream_factory(
+            samplerate=self.sample_rate,
+            channels=self.channels,
+            dtype=self.dtype,
+            blocksize=self.blocksize,
+            callback=self._callback
+        )
+        self.stream.start()
+
+    def _close_stream(self):
+        if self.stream is not None:
+            try:
+                self.stream.stop()
+                self.stream.close()
+            finally:
+                self.stream = None
+
+    def open(self):
+        """Open the input stream and keep it open between recordings, filling the pre-roll"""
+        self.keep_open = True
+        if self.stream is None:
+            self.preroll.clear()
+            self._open_stream()
+
+    def close(self):
+        """Close a stream held open by open(), ending any recording in progress"""
+        self.keep_open = False
+        with self.capture_lock:
+            self.capturing = False
+        self._close_stream()
+
+    def keep_idle_audio(self, milliseconds: int):
+        """
+        Grow the pre-roll ring so at least this much idle audio is available to
+        start(since_idle_sample=...). A plain start() still only uses preroll_ms of it.
+        """
+        capacity = int(self.sample_rate * milliseconds / 1000)
+        with self.capture_lock:
+            if capacity > self.preroll.capacity:
+                kept = self.preroll.read()
+                self.preroll = PreRollBuffer(self.sample_rate, milliseconds, dtype=self.dtype)
+                self.preroll.write(kept)
+
+    def start(self, since_idle_sample: Optional[int] = None):
+        """
+        Clear the buffer and start recording, opening the input stream if needed.
+
+        Args:
+            since_idle_sample: Begin the recording at this idle_samples position instead of
+                               preroll_ms before now, e.g. right after a wake phrase that took
+                               a while to confirm
+        """
+        with self.capture_lock:
+            self.buffer.reset()
+            self.limit_reached.clear()
+            if self.stream is not None:
+                preroll = self.preroll.read()
+                keep = self.preroll_samples
+                if since_idle_sample is not None:
+                    keep = self.idle_samples - since_idle_sample
+                    if keep > len(preroll):
+                        print(f"Lost {(keep - len(preroll)) / self.sample_rate:.2f}s of audio before the recording started")
+                keep = min(max(keep, 0), len(preroll))
+                self.buffer.write(preroll[len(preroll) - keep:])
+            self.capturing = True
+        if self.stream is None:
+            self._open_stream()
+
+    def stop(self) -> np.ndarray:
+        """
+        Stop recording, closing the input stream unless it is held open.
+
+        Returns:
+            np.ndarray: Zero-copy view of everything that was captured
+        """
+        with self.capture_lock:
+            self.capturing = False
+            # Pre-roll from before this recording must not leak into the next one
+            self.preroll.clear()
+        if not self.keep_open:
+            self._close_stream()
+        return self.buffer.view()
+
+    def _callback(self, indata, frames, time_info, status):
+        """sounddevice stream callback, runs on the audio thread"""
+        if status:
+            print(f"Audio input status: {status}")
+
+        # Mono input is a strided column view; downmix anything wider
+        samples = indata[:, 0] if indata.shape[1] == 1 else indata.mean(axis=1)
+
+        reached_limit = False
+        with self.capture_lock:
+            capturing = self.capturing
+            if not capturing:
+                self.preroll.write(samples)
+                self.idle_samples += len(samples)
+            elif not self.limit_reached.is_set():
+                self.buffer.write(samples)
+                reached_limit = self.buffer.is_full
+                if reached_limit:
+                    self.limit_reached.set()
+
+        if not capturing:
+            for listener in self.idle_listeners:
+                listener(samples)
+        elif reached_limit:
+            print(f"Reached the maximum recording length of {self.buffer.max_samples / self.sample_rate:.0f} seconds")
+            if self.on_limit_reached:
+                self.on_limit_reached()
@@ -0,0 +1,71 @@
+import io
+import wave
+import numpy as np
+import soundfile as sf
+import whisper
+
+WHISPER_SAMPLE_RATE = 16000
+
+
+def to_mono(audio: np.ndarray) -> np.ndarray:
+    """Downmix (samples, channels) audio to a 1-D array"""
+    if audio.ndim == 1:
+        return audio
+    return audio.mean(axis=1, dtype=np.float32)
+
+
+def _lowpass_filter(cutoff: float, num_taps: int = 63) -> np.ndarray:
+    """Windowed-sinc FIR low-pass, cutoff given as a fraction of the sample rate"""
+    n = np.arange(num_taps) - (num_taps - 1) / 2
+    taps = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(num_taps)
+    return (taps / taps.sum()).astype(np.float32)
+
+
+def resample_audio(audio: np.ndarray, orig_sr: int, target_sr: int = WHISPER_SAMPLE_RATE) -> np.ndarray:
+    """
+    Resample 1-D audio with vectorized numpy.
+    Downsampling low-passes first so higher frequencies don't alias into speech.
+    """
+    if orig_sr == target_sr or len(audio) == 0:
+        return audio.astype(np.float32, copy=False)
+
+    if target_sr < orig_sr:
+        audio = np.convolve(audio, _lowpass_filter(0.5 * target_sr / orig_sr), mode="same")
+
+    n_out = int(round(len(audio) * target_sr / orig_sr))
+    # For integer ratios (e.g. 48kHz -> 16kHz) these positions land exactly on samples
+    positions = np.arange(n_out) * (orig_sr / target_sr)
+    return np.interp(positions, np.arange(len(audio)), audio).astype(np.float32)
+
+
+def pcm_to_whisper_audio(pcm: bytes, sample_rate: int = 48000, channels: int = 2,
+                         target_sr: int = WHISPER_SAMPLE_RATE) -> np.ndarray:
+    """
+    Convert raw 16-bit PCM (e.g. Discord's 48kHz stereo) to float32 mono at target_sr,
+    entirely in memory. A WAV header, if present, overrides the given format.
+    """
+    if pcm[:4] == b"RIFF":
+        with wave.open(io.BytesIO(pcm), "rb") as wav_file:
+            sample_rate = wav_file.getframerate()
+            channels = wav_file.getnchannels()
+            pcm = wav_file.readframes(wav_file.getnframes())
+
+    # Drop any trailing partial frame instead of failing the reshape
+    frame_bytes = 2 * channels
+    usable = len(pcm) - len(pcm) % frame_bytes
+    samples = np.frombuffer(pcm, dtype=np.int16, count=usable // 2).reshape(-1, channels)
+    audio = to_mono(samples.astype(np.float32) / 32768.0)
+    return resample_audio(audio, sample_rate, target_sr)
+
+
+def load_audio_file(filename: str, sample_rate: int = WHISPER_SAMPLE_RATE) -> np.ndarray:
+    """
+    Decode an audio file to float32 mono at sample_rate.
+    Formats libsndfile understands are decoded in-process; anything else falls back
+    to Whisper's ffmpeg loader.
+    """
+    try:
+        audio, file_sample_rate = sf.read(filename, dtype="float32", always_2d=False)
+    except Exception:
+        return whisper.load_audio(filename, sr=sample_rate)
+    return resample_audio(to_mono(audio), file_sample_rate, sample_rate)
@@ -0,0 +1,164 @@
+"""
+Batch transcription of many audio files across a pool of worker processes.
+
+Usage:
+    python batch_transcribe.py recordings/ --output transcripts.jsonl
+    python batch_transcribe.py "vods/**/*.mp3" --model small --workers 8
+"""
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from audio_decoding import WHISPER_SAMPLE_RATE, load_audio_file
+
+AUDIO_EXTENSIONS = {".wav", ".mp3", ".flac", ".ogg", ".m4a", ".aac", ".opus", ".webm", ".mp4", ".mkv"}
+
+# Per-process model, loaded once by init_worker (also used by long_file_transcribe.py)
+_worker_model = None
+_worker_options = {}
+
+
+def find_audio_files(source: str) -> List[str]:
+    """
+    Expand a directory (searched recursively) or a glob pattern into audio file paths.
+    """
+    if os.path.isdir(source):
+        paths = glob.glob(os.path.join(source, "**", "*"), recursive=True)
+    else:
+        paths = glob.glob(source, recursive=True)
+    return sorted(p for p in paths if os.path.isfile(p) and os.path.splitext(p)[1].lower() in AUDIO_EXTENSIONS)
+
+
+def init_worker(model_size: str, device: Optional[str], threads_per_worker: int, transcribe_options: Dict,
+                dtype: Optional[str] = None):
+    """Load this worker's own copy of the model. Runs once in each worker process."""
+    global _worker_model, _worker_options
+    import torch
+    from whisper_model_registry import get_whisper_model
+
+    # Split the cores between workers instead of every worker using all of them
+    torch.set_num_threads(threads_per_worker)
+    handle = get_whisper_model(model_size, device, dtype, warm_up=False)
+    _worker_model = handle.model
+    _worker_options = dict(transcribe_options, fp16=handle.fp16)
+
+
+def transcribe_in_worker(filename: str, audio: np.ndarray) -> Dict:
+    """Transcribe already-decoded audio with this worker's model"""
+    start_time = time.time()
+    result = _worker_model.transcribe(audio, **_worker_options)
+    return {
+        "file": filename,
+        "text": result["text"].strip(),
+        "language": result.get("language"),
+        "duration": round(len(audio) / WHISPER_SAMPLE_RATE, 3),
+        "transcribe_seconds": round(time.time() - start_time, 3),
+    }
+
+
+def transcribe_batch(paths: Iterable[str], model_size: str = "base", workers: Optional[int] = None,
+                     device: Optional[str] = None, decode_workers: int = 2,
+                     **transcribe_options) -> Iterator[Dict]:
+    """
+    Transcribe many files in parallel, yielding results in completion order.
+
+    Files are decoded and resampled on a thread pool ahead of inference, then fanned
+    out to worker processes that each hold their own model. At most a couple of
+    decoded files per worker are kept in memory at once.
+
+    Args:
+        paths: Audio files to transcribe
+        model_size: Whisper model size loaded by every worker
+        workers: Number of worker processes (default: one per 4 cores, at least 1)
+        device: 'cpu' or 'cuda'
+        decode_workers: Threads decoding audio ahead of the workers
+        **transcribe_options: Extra options passed to model.transcribe
+
+    Yields:
+        dict: One result per file, with an "error" key instead of "text" on failure
+    """
+    paths = list(paths)
+    cpu_count = os.cpu_count() or 1
+    workers = workers or max(1, cpu_count // 4)
+    threads_per_worker = max(1, cpu_count // workers)
+    max_in_flight = workers * 2
+
+    # spawn keeps torch's thread pools out of the children
+    context = multiprocessing.get_context("spawn")
+    with ThreadPoolExecutor(max_workers=decode_workers) as decoder, \
+            ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker,
+                                initargs=(model_size, device, threads_per_worker, transcribe_options)) as pool:
+        pending_paths = iter(paths)
+        decoding = {}
+        transcribing = {}
+
+        def fill_decode_queue():
+            while len(decoding) + len(transcribing) < max_in_flight:
+                path = next(pending_paths, None)
+                if path is None:
+                    return
+                decoding[decoder.submit(load_audio_file, path)] = path
+
+        fill_decode_queue()
+        while decoding or transcribing:
+            done, _ = wait(list(decoding) + list(transcribing), return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in decoding:
+                    path = decoding.pop(future)
+                    try:
+                        audio = future.result()
+                    except Exception as e:
+                        yield {"file": path, "error": f"Could not decode audio: {e}"}
+                        continue
+                    transcribing[pool.submit(transcribe_in_worker, path, audio)] = path
+                else:
+                    path = transcribing.pop(future)
+                    try:
+                        yield future.result()
+                    except Exception as e:
+                        yield {"file": path, "error": str(e)}
+            fill_decode_queue()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Transcribe a directory or glob of audio files with Whisper")
+    parser.add_argument("source", help="Directory (searched recursively) or glob pattern of audio files")
+    parser.add_argument("--model", default="base", help="Whisper model size (default: base)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: cores / 4)")
+    parser.add_argument("--device", default=None, help="cpu or cuda (default: cuda if available)")
+    parser.add_argument("--language", default=None, help="Skip language detection, e.g. 'en'")
+    parser.add_argument("--output", default=None, help="JSONL output file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    paths = find_audio_files(args.source)
+    if not paths:
+        print(f"No audio files found in {args.source}", file=sys.stderr)
+        return 1
+
+    transcribe_options = {"language": args.language} if args.language else {}
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    start_time = time.time()
+    try:
+        for count, result in enumerate(transcribe_batch(paths, args.model, args.workers, args.device,
+                                                        **transcribe_options), start=1):
+            output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            output.flush()
+            print(f"[{count}/{len(paths)}] {result['file']}", file=sys.stderr)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    print(f"Transcribed {len(paths)} files in {time.time() - start_time:.1f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
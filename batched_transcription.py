@@ -0,0 +1,109 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Optional, Tuple
+
+import numpy as np
+import torch
+import whisper
+from whisper.audio import N_SAMPLES
+
+
+class BatchedTranscriber:
+    """
+    Collects utterances that arrive close together and transcribes them as one batch.
+    The padded mel spectrograms are stacked so the encoder and every greedy decoder
+    step run once for the whole batch instead of once per clip.
+    """
+
+    def __init__(self, model_handle, language: Optional[str] = "en", max_batch_size: int = 8,
+                 max_wait_ms: int = 30, no_speech_threshold: float = 0.6, logprob_threshold: float = -1.0,
+                 compression_ratio_threshold: float = 2.4):
+        """
+        Args:
+            model_handle: WhisperModelHandle of the model to run
+            language: Spoken language, None to detect per clip
+            max_batch_size: Largest number of clips decoded together
+            max_wait_ms: How long the first clip of a batch waits for others to arrive
+            no_speech_threshold: Together with logprob_threshold, clips this likely to be silence
+                                 transcribe to "" (same defaults as whisper's transcribe())
+            logprob_threshold: Results less confident than this are not trusted
+            compression_ratio_threshold: Results more repetitive than this are not trusted
+        """
+        self.model_handle = model_handle
+        self.language = language
+        self.no_speech_threshold = no_speech_threshold
+        self.logprob_threshold = logprob_threshold
+        self.compression_ratio_threshold = compression_ratio_threshold
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_ms / 1000
+        self.requests: "queue.Queue[Tuple[np.ndarray, Future]]" = queue.Queue()
+        self.worker_thread = threading.Thread(target=self._run, daemon=True, name="whisper-batcher")
+        self.worker_thread.start()
+
+    def submit(self, audio: np.ndarray) -> Future:
+        """
+        Queue a float32 16kHz clip of at most 30 seconds.
+
+        Returns:
+            Future: Resolves to the transcribed text, or None if the greedy result failed the
+                    confidence checks; callers should then decode the clip with temperature fallback
+        """
+        if len(audio) > N_SAMPLES:
+            raise ValueError("Batched transcription only supports clips up to 30 seconds")
+        future = Future()
+        self.requests.put((audio, future))
+        return future
+
+    def transcribe(self, audio: np.ndarray) -> Optional[str]:
+        """Submit a clip and wait for its text"""
+        return self.submit(audio).result()
+
+    def _collect_batch(self) -> List[Tuple[np.ndarray, Future]]:
+        """Block for the first request, then gather more until the batch is full or the wait is over"""
+        batch = [self.requests.get()]
+        deadline = time.time() + self.max_wait_seconds
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            try:
+                texts = self._decode_batch([audio for audio, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), text in zip(batch, texts):
+                future.set_result(text)
+
+    def _decode_batch(self, clips: List[np.ndarray]) -> List[Optional[str]]:
+        model = self.model_handle.model
+        fp16 = self.model_handle.fp16
+        mel = torch.stack([whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), model.dims.n_mels)
+                           for audio in clips]).to(model.device)
+        options = whisper.DecodingOptions(language=self.language, fp16=fp16, temperature=0.0,
+                                          without_timestamps=True)
+        with self.model_handle.decode_lock, torch.no_grad():
+            results = whisper.decode(model, mel, options)
+        if len(clips) > 1:
+            print(f"Transcribed {len(clips)} utterances in one batch")
+        return [self._checked_text(result) for result in results]
+
+    def _checked_text(self, result) -> Optional[str]:
+        """Apply the checks whisper's transcribe() makes before it keeps a greedy result"""
+        low_confidence = result.avg_logprob < self.logprob_threshold
+        if result.no_speech_prob > self.no_speech_threshold and low_confidence:
+            return ""  # Silence; the text would only be a hallucination
+        if low_confidence or result.compression_ratio > self.compression_ratio_threshold:
+            return None
+        return result.text.strip()
@@ -0,0 +1,215 @@
+from collections import deque
+from functools import lru_cache
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional
+
+Message = Dict[str, str]
+
+# Every reply is primed with <im_start>assistant
+REPLY_PRIMING_TOKENS = 2
+
+
+def estimate_text_tokens(text: str) -> int:
+    """Character-based estimate (~4 characters per token)"""
+    return len(text) // 4
+
+
+def message_token_counter(count_text: Callable[[str], int] = estimate_text_tokens,
+                          cache_size: int = 4096) -> Callable[[Message], int]:
+    """
+    Build a per-message token counter around a text counter.
+    Pass an exact tokenizer's counting function to replace the estimate; counts for
+    repeated strings (roles, the system prompt) are memoized.
+
+    Args:
+        count_text: Returns the number of tokens in a string
+        cache_size: How many distinct strings to remember counts for
+    """
+    count_text = lru_cache(maxsize=cache_size)(count_text)
+
+    def count_message(message: Message) -> int:
+        num_tokens = 4  # every message follows <im_start>{role/name}\n{content}<im_end>\n
+        for key, value in message.items():
+            num_tokens += count_text(str(value))
+            if key == "name":  # if there's a name, the role is omitted
+                num_tokens += -1  # role is always required and always 1 token
+        return num_tokens
+
+    return count_message
+
+
+estimate_message_tokens = message_token_counter()
+
+
+class ChatHistory:
+    """
+    Conversation history with incremental token accounting.
+
+    A leading system message is kept in a fixed slot, followed by an optional pinned
+    message (e.g. a summary of older turns), and the rest of the conversation in a
+    deque, each with its token count computed once on append. The running total
+    makes token_count O(1) and trimming the oldest messages amortized O(1).
+
+    Behaves like the plain list it replaces: append(), len(), iteration, indexing
+    and str() (as written to the chat backup file) all work the same way.
+    Messages must not be modified after they are appended.
+    """
+
+    def __init__(self, messages: Iterable[Message] = (),
+                 token_counter: Optional[Callable[[Message], int]] = None):
+        """
+        Args:
+            messages: Initial messages; a leading system message goes in the system slot
+            token_counter: Returns the tokens used by one message (default: estimate)
+        """
+        self.token_counter = token_counter or estimate_message_tokens
+        self.system_message: Optional[Message] = None
+        self.system_tokens = 0
+        self.pinned_message: Optional[Message] = None
+        self.pinned_tokens = 0
+        self.messages: Deque[Message] = deque()
+        self.message_tokens: Deque[int] = deque()
+        self.messages_total = 0
+        self.extend(messages)
+
+    @property
+    def token_count(self) -> int:
+        """Tokens the whole history uses as a prompt, including the reply priming"""
+        return self.system_tokens + self.pinned_tokens + self.messages_total + REPLY_PRIMING_TOKENS
+
+    def _fixed_messages(self) -> List[Message]:
+        """The system and pinned messages that precede the conversation, in order"""
+        return [message for message in (self.system_message, self.pinned_message) if message is not None]
+
+    def append(self, message: Message):
+        if (self.system_message is None and self.pinned_message is None and not self.messages
+                and message.get("role") == "system"):
+            self.set_system_message(message)
+            return
+        count = self.token_counter(message)
+        self.messages.append(message)
+        self.message_tokens.append(count)
+        self.messages_total += count
+
+    def extend(self, messages: Iterable[Message]):
+        for message in messages:
+            self.append(message)
+
+    def set_system_message(self, message: Optional[Message]):
+        """Replace (or with None, remove) the system message"""
+        self.system_message = message
+        self.system_tokens = self.token_counter(message) if message is not None else 0
+
+    def set_pinned_message(self, message: Optional[Message]):
+        """
+        Replace (or with None, remove) the pinned message that follows the system message.
+        It only changes when set here, so it stays byte-identical across requests.
+        """
+        self.pinned_message = message
+        self.pinned_tokens = self.token_counter(message) if message is not None else 0
+
+    def pop_oldest(self) -> Optional[Message]:
+        """Remove the oldest message after the system and pinned messages, None if there is none"""
+        if not self.messages:
+            return None
+        self.messages_total -= self.message_tokens.popleft()
+        return self.messages.popleft()
+
+    def trim_to(self, max_tokens: int, target_tokens: Optional[int] = None) -> List[Message]:
+        """
+        If the history is over max_tokens, drop the oldest messages (never the system or
+        pinned message) until it is at most target_tokens. Dropping one large block down
+        to a lower target, instead of a message per turn, leaves the start of the prompt
+        unchanged for the following turns so provider-side prompt caching can hit.
+        The window always restarts at a user message, so exchanges are never split.
+
+        Args:
+            max_tokens: Limit that triggers trimming
+            target_tokens: Size to trim down to (default: max_tokens)
+
+        Returns:
+            list: The removed messages, oldest first
+        """
+        if self.token_count <= max_tokens:
+            return []
+        count = self.oldest_block_size(max_tokens if target_tokens is None else target_tokens)
+        return [self.pop_oldest() for _ in range(count)]
+
+    def oldest_block_size(self, target_tokens: int) -> int:
+        """
+        How many of the oldest messages have to go for the history to fit in target_tokens,
+        extended so the remaining window starts at a user message. Nothing is removed.
+        """
+        count = 0
+        total = self.token_count
+        while count < len(self.messages) and total > target_tokens:
+            total -= self.message_tokens[count]
+            count += 1
+        while count < len(self.messages) and self.messages[count].get("role") != "user":
+            count += 1
+        return count
+
+    def pop(self, index: int = -1) -> Message:
+        """list.pop; popping the oldest message after the system (and pinned) message is O(1)"""
+        fixed = self._fixed_messages()
+        if index < 0:
+            index += len(self)
+        if 0 <= index < len(fixed):
+            message = fixed[index]
+            if message is self.system_message:
+                self.set_system_message(None)
+            else:
+                self.set_pinned_message(None)
+            return message
+        position = index - len(fixed)
+        if not 0 <= position < len(self.messages):
+            raise IndexError("pop index out of range")
+        if position == 0:
+            return self.pop_oldest()
+        if position == len(self.messages) - 1:
+            self.messages_total -= self.message_tokens.pop()
+            return self.messages.pop()
+        self.messages_total -= self.message_tokens[position]
+        del self.message_tokens[position]
+        message = self.messages[position]
+        del self.messages[position]
+        return message
+
+    def clear(self):
+        """Remove everything except the system and pinned messages"""
+        self.messages.clear()
+        self.message_tokens.clear()
+        self.messages_total = 0
+
+    def to_list(self) -> List[Message]:
+        return list(self)
+
+    def __iter__(self) -> Iterator[Message]:
+        yield from self._fixed_messages()
+        yield from self.messages
+
+    def __len__(self) -> int:
+        return len(self.messages) + (self.system_message is not None) + (self.pinned_message is not None)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.to_list()[index]
+        if index < 0:
+            index += len(self)
+        fixed = self._fixed_messages()
+        if 0 <= index < len(fixed):
+            return fixed[index]
+        index -= len(fixed)
+        if not 0 <= index < len(self.messages):
+            raise IndexError("chat history index out of range")
+        return self.messages[index]
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (ChatHistory, list)):
+            return self.to_list() == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return repr(self.to_list())
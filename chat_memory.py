@@ -0,0 +1,164 @@
+import ast
+import hashlib
+import heapq
+import json
+import math
+import os
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from transcript_utils import normalize_words
+
+DEFAULT_MEMORY_PATH = os.path.join(os.path.expanduser("~"), ".cache", "babagaboosh", "chat_memory.jsonl")
+
+# Words too common to say anything about which exchange is relevant
+STOPWORDS = frozenset("""
+a about after again all am an and any are as at be because been before being but by can could did do does doing
+don't for from had has have having he her here hers him his how i i'm if in into is it it's its just me more most
+my no not now of off on once only or other our out over own same she should so some such than that that's the
+their them then there these they this those through to too under until up very was we were what when where which
+while who why will with would you you're your yours yourself
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased words with punctuation and stopwords removed"""
+    return [word for word in normalize_words(text) if word not in STOPWORDS]
+
+
+class ChatMemoryIndex:
+    """
+    Local BM25 index of past exchanges (a user message and the answer to it), so old
+    details can be recalled without sending the whole conversation.
+
+    Every exchange is appended to a JSON lines file together with its term counts,
+    so adding one is a single small write, and loading rebuilds the postings without
+    re-tokenizing anything. Works fully offline.
+    """
+
+    def __init__(self, path: Optional[str] = DEFAULT_MEMORY_PATH, k1: float = 1.5, b: float = 0.75):
+        """
+        Args:
+            path: JSON lines file the index is kept in, None to keep it in memory only
+            k1: BM25 term frequency saturation
+            b: BM25 document length normalization
+        """
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.exchanges: List[Tuple[str, str]] = []
+        self.doc_lengths: List[int] = []
+        self.total_length = 0
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.digests = set()  # Exchanges already indexed, so importing a history twice is harmless
+        self.lock = threading.Lock()
+
+        if self.path and os.path.exists(self.path):
+            self._load()
+
+    @staticmethod
+    def _digest(user: str, assistant: str) -> str:
+        return hashlib.blake2b(json.dumps([user, assistant]).encode(), digest_size=16).hexdigest()
+
+    def _load(self):
+        with open(self.path, "r", encoding="utf-8") as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                    self._index(entry["user"], entry["assistant"], entry["terms"])
+                except (ValueError, KeyError):
+                    continue  # A partly written last line from a crash
+
+    def _index(self, user: str, assistant: str, terms: Dict[str, int]) -> int:
+        """Add an exchange to the in-memory postings. Caller holds the lock (or is the constructor)."""
+        doc_id = len(self.exchanges)
+        self.exchanges.append((user, assistant))
+        self.digests.add(self._digest(user, assistant))
+        length = sum(terms.values())
+        self.doc_lengths.append(length)
+        self.total_length += length
+        for term, count in terms.items():
+            self.postings.setdefault(term, {})[doc_id] = count
+        return doc_id
+
+    def add_exchange(self, user: str, assistant: str) -> Optional[int]:
+        """
+        Index one exchange and append it to the file.
+
+        Returns:
+            int: The exchange's id, or None if it was already indexed
+        """
+        terms = dict(Counter(tokenize(f"{user} {assistant}")))
+        with self.lock:
+            if self._digest(user, assistant) in self.digests:
+                return None
+            doc_id = self._index(user, assistant, terms)
+        if self.path:
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as file:
+                    file.write(json.dumps({"user": user, "assistant": assistant, "terms": terms}) + "\n")
+            except OSError as e:
+                print(f"Could not save chat memory: {e}")
+        return doc_id
+
+    def add_messages(self, messages: Iterable[Dict[str, str]]) -> int:
+        """
+        Index every user message that is directly followed by an assistant answer.
+
+        Returns:
+            int: How many new exchanges were added
+        """
+        added = 0
+        previous = None
+        for message in messages:
+            if previous and previous.get("role") == "user" and message.get("role") == "assistant":
+                if self.add_exchange(previous["content"], message["content"]) is not None:
+                    added += 1
+            previous = message
+        return added
+
+    def add_backup_file(self, backup_path: str) -> int:
+        """
+        Index a chat history backup (the str() of the history that chatgpt_character.py writes).
+
+        Returns:
+            int: How many new exchanges were added
+        """
+        try:
+            with open(backup_path, "r", encoding="utf-8") as file:
+                messages = ast.literal_eval(file.read())
+        except (OSError, ValueError, SyntaxError) as e:
+            print(f"Could not read chat history backup {backup_path}: {e}")
+            return 0
+        return self.add_messages(messages)
+
+    def search(self, query: str, top_k: int = 3) -> List[Tuple[float, str, str]]:
+        """
+        Find the past exchanges most relevant to query.
+
+        Returns:
+            list: (score, user message, answer) for up to top_k exchanges, best first
+        """
+        query_terms = set(tokenize(query))
+        with self.lock:
+            count = len(self.exchanges)
+            if not count or not query_terms:
+                return []
+            average_length = self.total_length / count
+            scores: Dict[int, float] = {}
+            for term in query_terms:
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, frequency in postings.items():
+                    length_norm = 1 - self.b + self.b * self.doc_lengths[doc_id] / average_length
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (self.k1 + 1) / (
+                        frequency + self.k1 * length_norm)
+            best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+            return [(score, *self.exchanges[doc_id]) for doc_id, score in best]
+
+    def __len__(self) -> int:
+        return len(self.exchanges)
@@ -1,21 +1,46 @@
-import time
-import keyboard
+import atexit
 from rich import print
 from whisper_speech_to_text import SpeechToTextManager
+from push_to_talk import PushToTalkManager
+from wake_word import WakeWordManager
+from voice_activity import VoiceActivityDetector
 from openai_chat import OpenAiManager
+from chat_memory import ChatMemoryIndex
 from espeak_tts import EspeakTTSManager
 from obs_websockets import OBSWebsocketsManager
 from audio_player import AudioManager
+from streaming_speech import StreamingSpeechManager
 
 ESPEAK_VOICE = "default"  # Using default espeak voice
 
 BACKUP_FILE = "ChatHistoryBackup.txt"
 
+WHISPER_MODEL_SIZE = "auto"  # Largest model that transcribes a turn within the budget below
+WHISPER_LATENCY_BUDGET = 2.0  # seconds
+
+END_OF_TURN_SILENCE_MS = 1200  # In toggle mode, stop listening after this much silence
+
+PUSH_TO_TALK_KEY = "f4"
+PUSH_TO_TALK_MODE = "toggle"  # "toggle": press to start, press again (or go quiet) to stop. "hold": talk while held
+
+USE_WAKE_WORD = False  # Hands-free: start a turn by saying the wake phrase instead of pressing F4
+WAKE_PHRASES = ["hey sam"]
+
 tts_manager = EspeakTTSManager()
 obswebsockets_manager = OBSWebsocketsManager()
-speechtotext_manager = SpeechToTextManager()
-openai_manager = OpenAiManager()
+speechtotext_manager = SpeechToTextManager(model_size=WHISPER_MODEL_SIZE, latency_budget_seconds=WHISPER_LATENCY_BUDGET,
+                                           vad=VoiceActivityDetector())
+# Remember every exchange across sessions, starting with the last session's backup
+chat_memory = ChatMemoryIndex()
+chat_memory.add_backup_file(BACKUP_FILE)
+openai_manager = OpenAiManager(memory_index=chat_memory)
+atexit.register(openai_manager.close)  # Close the pooled OpenAI connections on Ctrl+C
 audio_manager = AudioManager()
+speech_manager = StreamingSpeechManager(tts_manager, audio_manager, ESPEAK_VOICE)
+if USE_WAKE_WORD:
+    turn_trigger = WakeWordManager(speechtotext_manager, WAKE_PHRASES)
+else:
+    turn_trigger = PushToTalkManager(speechtotext_manager, PUSH_TO_TALK_KEY, PUSH_TO_TALK_MODE)
 
 FIRST_SYSTEM_MESSAGE = {"role": "system", "content": '''
 You are Pajama Sam, the lovable protagonist from the children's series Pajama Sam from Humongous Entertainment. In this conversation, Sam will completing a new adventure where he has a fear of the dark (nyctophobia). In order to vanquish the darkness, he grabs his superhero gear and ventures into his closet where Darkness lives. After losing his balance and falling into the land of darkness, his gear is taken away by a group of customs trees. Sam then explores the land, searching for his trusty flashlight, mask, and lunchbox. 
@@ -41,41 +66,36 @@ While responding as Sam, you must obey the following rules:
 Okay, let the conversation begin!'''}
 openai_manager.chat_history.append(FIRST_SYSTEM_MESSAGE)
 
-print("[green]Starting the loop, press F4 to begin")
-while True:
-    # Wait until user presses "f4" key
-    if keyboard.read_key() != "f4":
-        time.sleep(0.1)
-        continue
+# Keep the mic open so each turn starts instantly and includes the moment before it was triggered
+turn_trigger.start()
 
-    print("[green]User pressed F4 key! Now listening to your microphone:")
-
-    # Get question from mic
-    mic_result = speechtotext_manager.speechtotext_from_mic_continuous()
+if USE_WAKE_WORD:
+    print(f"[green]Starting the loop, say '{WAKE_PHRASES[0]}' to begin")
+else:
+    print("[green]Starting the loop, press F4 to begin")
+while True:
+    # Wait for F4 (or the wake phrase), then get the question from the mic
+    mic_result = turn_trigger.wait_for_turn(end_silence_ms=END_OF_TURN_SILENCE_MS)
     
     if mic_result == '':
         print("[red]Did not receive any input from your microphone!")
         continue
 
-    # Send question to OpenAi
-    openai_result = openai_manager.chat_with_history(mic_result)
+    # Send question to OpenAi and stream the answer back one sentence at a time.
+    # Each sentence is turned into audio by ESpeak and played while the next ones are still being generated,
+    # and the picture of Pajama Sam in OBS is enabled as soon as the first one starts playing
+    try:
+        speech_manager.speak(
+            openai_manager.chat_with_history_streamed(mic_result),
+            on_first_audio=lambda: obswebsockets_manager.set_source_visibility("*** Mid Monitor", "Pajama Sam", True)
+        )
+    except Exception as e:
+        print(f"[red]Error while getting or speaking the answer: {e}")
     
     # Write the results to txt file as a backup
     with open(BACKUP_FILE, "w") as file:
         file.write(str(openai_manager.chat_history))
 
-    # Send it to ESpeak to turn into cool audio
-    tts_output = tts_manager.text_to_audio(openai_result, ESPEAK_VOICE, False)
-
-    # Enable the picture of Pajama Sam in OBS
-    obswebsockets_manager.set_source_visibility("*** Mid Monitor", "Pajama Sam", True)
-
-    # Play the audio file
-    if tts_output:
-        audio_manager.play_audio(tts_output, True, True, True)
-    else:
-        print("[red]Failed to generate TTS audio[/red]")
-
     # Disable Pajama Sam pic in OBS
     obswebsockets_manager.set_source_visibility("*** Mid Monitor", "Pajama Sam", False)
 
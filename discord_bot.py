@@ -3,19 +3,18 @@ from discord.ext import commands
 import asyncio
 import os
 import io
-import wave
 import audioop
 from rich import print
 from whisper_speech_to_text import SpeechToTextManager
-from openai_chat import OpenAiManager
+from openai_chat import AsyncOpenAiManager
 from espeak_tts import EspeakTTSManager
 from obs_websockets import OBSWebsocketsManager
 
 class DiscordBotManager:
     def __init__(self):
         self.bot = None
-        self.speechtotext_manager = SpeechToTextManager()
-        self.openai_manager = OpenAiManager()
+        self.speechtotext_manager = SpeechToTextManager(model_size="auto", batch_window_ms=30)
+        self.openai_manager = AsyncOpenAiManager()
         self.tts_manager = EspeakTTSManager()
         self.obswebsockets_manager = OBSWebsocketsManager()
         self.is_listening = False
@@ -129,21 +128,27 @@ Okay, let the conversation begin!'''}
                     await channel.send("No audio was recorded!")
                     return
                 
-                # Process the first user's audio (you could combine multiple users if needed)
-                user = recorded_users[0]
-                audio_data = sink.recorded_users[user]
+                # Convert every speaker's audio to text using Whisper. Clips transcribed at
+                # the same time are decoded together in one batch.
+                user_texts = await asyncio.gather(*[
+                    self.process_discord_audio_to_text(sink.recorded_users[user])
+                    for user in recorded_users
+                ])
+                spoken = [(user, text.strip()) for user, text in zip(recorded_users, user_texts) if text.strip()]
                 
-                # Convert audio to text using Azure
-                text_result = await self.process_discord_audio_to_text(audio_data)
-                
-                if not text_result.strip():
+                if not spoken:
                     await channel.send("I couldn't understand what you said. Please try again!")
                     return
                 
+                if len(spoken) == 1:
+                    text_result = spoken[0][1]
+                else:
+                    text_result = "\n".join(f"{user.display_name}: {text}" for user, text in spoken)
+                
                 await channel.send(f"I heard: *{text_result}*")
                 
                 # Get AI response
-                ai_response = self.openai_manager.chat_with_history(text_result)
+                ai_response = await self.openai_manager.chat_with_history(text_result)
                 
                 # Convert response to audio
                 audio_file = self.tts_manager.text_to_audio(ai_response, "default", True)
@@ -179,27 +184,12 @@ Okay, let the conversation begin!'''}
         self.recording_finished = recording_finished
 
     async def process_discord_audio_to_text(self, audio_data):
-        """Convert Discord audio data to text using Azure Speech-to-Text"""
+        """Convert Discord audio data to text using Whisper, entirely in memory"""
         try:
-            # Save audio data to a temporary file
-            temp_audio_file = "temp_discord_audio.wav"
-            
-            with wave.open(temp_audio_file, 'wb') as wav_file:
-                wav_file.setnchannels(2)  # Discord audio is stereo
-                wav_file.setsampwidth(2)  # 16-bit audio
-                wav_file.setframerate(48000)  # Discord uses 48kHz
-                wav_file.writeframes(audio_data.getvalue())
-            
-            # Use Azure Speech-to-Text to process the file
-            result = self.speechtotext_manager.speechtotext_from_file(temp_audio_file)
-            
-            # Clean up temp file
-            try:
-                os.remove(temp_audio_file)
-            except:
-                pass
-            
-            return result
+            # Discord audio is 48kHz 16-bit stereo; decode it off the event loop
+            return await asyncio.to_thread(
+                self.speechtotext_manager.speechtotext_from_pcm, audio_data.getvalue(), 48000, 2
+            )
             
         except Exception as e:
             print(f"[red]Error converting audio to text: {e}[/red]")
@@ -225,7 +215,16 @@ Okay, let the conversation begin!'''}
     def run(self, token):
         """Start the Discord bot"""
         self.create_bot()
-        self.bot.run(token)
+        discord.utils.setup_logging()  # bot.run() would do this
+        asyncio.run(self._run(token))
+
+    async def _run(self, token):
+        try:
+            async with self.bot:
+                await self.bot.start(token)
+        finally:
+            # Close the pooled OpenAI connections while their event loop is still running
+            await self.openai_manager.aclose()
 
 
 # Main execution
@@ -6,7 +6,7 @@ import tempfile
 import wave
 from rich import print
 from whisper_speech_to_text import SpeechToTextManager
-from openai_chat import OpenAiManager
+from openai_chat import AsyncOpenAiManager
 from espeak_tts import EspeakTTSManager
 from obs_websockets import OBSWebsocketsManager
 
@@ -18,8 +18,8 @@ class PajamaSamBot:
         # Initialize managers
         self.tts_manager = EspeakTTSManager()
         self.obswebsockets_manager = OBSWebsocketsManager()
-        self.speechtotext_manager = SpeechToTextManager()
-        self.openai_manager = OpenAiManager()
+        self.speechtotext_manager = SpeechToTextManager(model_size="auto")
+        self.openai_manager = AsyncOpenAiManager()
         
         # Character setup
         FIRST_SYSTEM_MESSAGE = {"role": "system", "content": '''
@@ -100,7 +100,7 @@ Okay, let the conversation begin!'''}
             try:
                 async with ctx.typing():
                     # Get AI response
-                    ai_response = self.openai_manager.chat_with_history(message)
+                    ai_response = await self.openai_manager.chat_with_history(message)
                     
                     # Write backup
                     with open(BACKUP_FILE, "w") as file:
@@ -206,10 +206,19 @@ Ready to talk? Start speaking now! 🎭
     def run(self, token):
         """Start the Discord bot"""
         try:
-            self.bot.run(token)
+            discord.utils.setup_logging()  # bot.run() would do this
+            asyncio.run(self._run(token))
         except Exception as e:
             print(f"[red]Error running bot: {e}[/red]")
 
+    async def _run(self, token):
+        try:
+            async with self.bot:
+                await self.bot.start(token)
+        finally:
+            # Close the pooled OpenAI connections while their event loop is still running
+            await self.openai_manager.aclose()
+
 
 # Main execution
 if __name__ == '__main__':
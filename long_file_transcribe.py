@@ -0,0 +1,102 @@
+"""
+Parallel transcription of long recordings. The audio is split at quiet points into
+overlapping chunks, the chunks are transcribed concurrently in worker processes,
+and the transcripts are stitched back together with the duplicated overlap removed.
+
+Usage:
+    python long_file_transcribe.py stream_vod.mp3 --workers 8
+"""
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from audio_decoding import WHISPER_SAMPLE_RATE, load_audio_file
+from batch_transcribe import init_worker, transcribe_in_worker
+from transcript_utils import stitch_transcripts
+from voice_activity import VoiceActivityDetector
+
+
+def plan_chunks(audio: np.ndarray, chunk_seconds: float = 60.0, overlap_seconds: float = 2.0,
+                search_seconds: float = 5.0, sample_rate: int = WHISPER_SAMPLE_RATE) -> List[Tuple[int, int]]:
+    """
+    Choose chunk boundaries near every chunk_seconds, moved to the quietest frame
+    within search_seconds so cuts land in pauses. Each chunk is then widened by
+    overlap_seconds on both sides so words at a boundary appear whole in one chunk.
+
+    Returns:
+        list: (start, end) sample ranges
+    """
+    vad = VoiceActivityDetector(sample_rate=sample_rate)
+    chunk_samples = int(chunk_seconds * sample_rate)
+    search_samples = min(int(search_seconds * sample_rate), chunk_samples // 2)
+    overlap_samples = int(overlap_seconds * sample_rate)
+
+    cuts = [0]
+    target = chunk_samples
+    while target < len(audio) - search_samples:
+        window_start = target - search_samples
+        energy = vad.frame_energy_db(audio[window_start:target + search_samples])
+        cut = window_start + int(np.argmin(energy)) * vad.frame_size + vad.frame_size // 2
+        cuts.append(cut)
+        target = cut + chunk_samples
+    cuts.append(len(audio))
+
+    return [(max(start - overlap_samples, 0), min(end + overlap_samples, len(audio)))
+            for start, end in zip(cuts[:-1], cuts[1:])]
+
+
+def transcribe_long_audio(audio: np.ndarray, model_size: str = "base", workers: Optional[int] = None,
+                          device: Optional[str] = None, dtype: Optional[str] = None, chunk_seconds: float = 60.0,
+                          overlap_seconds: float = 2.0, **transcribe_options) -> str:
+    """
+    Transcribe a long float32 16kHz recording across worker processes.
+
+    Args:
+        audio: Audio samples
+        model_size: Whisper model size loaded by every worker
+        workers: Number of worker processes (default: one per 4 cores, at least 1)
+        device: 'cpu' or 'cuda'
+        dtype: Model dtype loaded by every worker, e.g. 'int8' for the quantized model
+        chunk_seconds: Target chunk length before overlap
+        overlap_seconds: Audio shared between neighbouring chunks
+        **transcribe_options: Extra options passed to model.transcribe
+
+    Returns:
+        str: Stitched transcript
+    """
+    chunks = plan_chunks(audio, chunk_seconds, overlap_seconds)
+    cpu_count = os.cpu_count() or 1
+    workers = min(workers or max(1, cpu_count // 4), len(chunks))
+    threads_per_worker = max(1, cpu_count // workers)
+    print(f"Transcribing {len(audio) / WHISPER_SAMPLE_RATE:.0f}s of audio as {len(chunks)} chunks on {workers} workers")
+
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker,
+                             initargs=(model_size, device, threads_per_worker, transcribe_options, dtype)) as pool:
+        futures = [pool.submit(transcribe_in_worker, f"chunk {index}", audio[start:end])
+                   for index, (start, end) in enumerate(chunks)]
+        texts = [future.result()["text"] for future in futures]
+
+    return stitch_transcripts(texts)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Transcribe one long audio file in parallel chunks")
+    parser.add_argument("file", help="Audio file to transcribe")
+    parser.add_argument("--model", default="base", help="Whisper model size (default: base)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: cores / 4)")
+    parser.add_argument("--chunk", type=float, default=60.0, help="Chunk length in seconds")
+    parser.add_argument("--language", default=None, help="Skip language detection, e.g. 'en'")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    options = {"language": args.language} if args.language else {}
+    text = transcribe_long_audio(load_audio_file(args.file), args.model, args.workers,
+                                 chunk_seconds=args.chunk, **options)
+    print(text)
+    print(f"\nTranscribed in {time.time() - start_time:.1f}s")
@@ -1,82 +1,506 @@
-from openai import OpenAI
+from openai import AsyncOpenAI
+import asyncio
+import httpx
+import itertools
 import os
+import re
+import threading
+import time
 from rich import print
+from chat_history import ChatHistory, REPLY_PRIMING_TOKENS, estimate_message_tokens
+from response_cache import ResponseCache
+
+MAX_HISTORY_TOKENS = 8000
+
+RECALL_PREFIX = "Earlier exchanges that may be relevant to the next message:"
+SUMMARY_PREFIX = "Summary of the earlier conversation: "
+SUMMARY_PROMPT = """Here is a summary of a conversation so far, followed by the next part of it.
+Rewrite the summary so it also covers the new part, in at most {max_words} words.
+Keep names, facts, decisions, open questions and running jokes; drop small talk.
+Reply with only the summary.
+
+SUMMARY SO FAR:
+{summary}
+
+NEXT PART:
+{transcript}"""
+
+# Sentence-ending punctuation (plus closing quotes/brackets) followed by whitespace, or a line break
+SENTENCE_END = re.compile(r'([.!?\u2026]+["\'\u201d\u2019)\]]*)\s+|\n+')
+# Words whose trailing period doesn't end a sentence
+ABBREVIATIONS = {"mr", "mrs", "ms", "dr", "st", "jr", "sr", "vs", "etc", "e.g", "i.e", "prof", "mt"}
 
 def num_tokens_from_messages(messages, model='gpt-4o'):
   """Returns an estimated number of tokens used by a list of messages.
   Uses character-based estimation (~4 characters per token) since tiktoken dependency was removed."""
-  num_tokens = 0
-  for message in messages:
-      num_tokens += 4  # every message follows <im_start>{role/name}\n{content}<im_end>\n
-      for key, value in message.items():
-          # Estimate tokens based on character count (~4 characters per token)
-          num_tokens += len(str(value)) // 4
-          if key == "name":  # if there's a name, the role is omitted
-              num_tokens += -1  # role is always required and always 1 token
-  num_tokens += 2  # every reply is primed with <im_start>assistant
-  return num_tokens
+  if isinstance(messages, ChatHistory):
+      return messages.token_count
+  return sum(estimate_message_tokens(message) for message in messages) + REPLY_PRIMING_TOKENS
+
+
+def split_complete_sentences(text, min_chars=12):
+  """Splits streamed text into the sentences that are definitely finished and the unfinished rest.
+  Sentences shorter than min_chars (e.g. "Oh no!") are joined onto the next one so TTS isn't called for every fragment."""
+  sentences = []
+  start = 0
+  for match in SENTENCE_END.finditer(text):
+      if match.group(1) == ".":
+          words = text[start:match.start(1)].split()
+          if words and words[-1].lower() in ABBREVIATIONS:
+              continue
+      end = match.end(1) if match.group(1) else match.start()
+      sentence = text[start:end].strip()
+      if len(sentence) < min_chars:
+          continue
+      sentences.append(sentence)
+      start = match.end()
+  return sentences, text[start:]
+
+
+def _usage_field(value, name):
+  """Reads a usage field whether the client parsed it into an object or left it as a dict"""
+  if value is None:
+      return None
+  if isinstance(value, dict):
+      return value.get(name)
+  return getattr(value, name, None)
       
 
-class OpenAiManager:
-    
-    def __init__(self):
-        self.chat_history = [] # Stores the entire conversation
+# One keep-alive connection pool per event loop, shared by every AsyncOpenAiManager running on it
+_http_clients = {}
+
+def shared_http_client(max_connections=20):
+  """Returns the pooled HTTP client for the running event loop, creating it on first use."""
+  loop = asyncio.get_running_loop()
+  client = _http_clients.get(loop)
+  if client is None or client.is_closed:
+      client = httpx.AsyncClient(
+          limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections,
+                              keepalive_expiry=60),
+          timeout=httpx.Timeout(60.0, connect=10.0)
+      )
+      _http_clients[loop] = client
+  return client
+
+
+class AsyncOpenAiManager:
+    """
+    Non-blocking OpenAI chat for asyncio code such as the Discord bots.
+    Requests go through a shared keep-alive connection pool, at most
+    max_concurrent_requests run at once, and each one has its own timeout, so a slow
+    completion never holds up the event loop or other conversations.
+    """
+
+    def __init__(self, token_counter=None, max_concurrent_requests=4, request_timeout=60.0, max_retries=2,
+                 history_target_tokens=MAX_HISTORY_TOKENS // 2, summarize_after_tokens=3000,
+                 summary_model="gpt-4o-mini", summary_max_words=200, memory_index=None, memory_top_k=3,
+                 memory_max_tokens=800, response_cache=None, use_response_cache=True):
+        """
+        Args:
+            token_counter: Counts one message's tokens for the history,
+                           e.g. chat_history.message_token_counter(exact_tokenizer_count)
+            max_concurrent_requests: Requests allowed in flight at once; others wait their turn
+            request_timeout: Seconds before a single request is abandoned (and retried)
+            max_retries: Retries for failed or timed out requests
+            history_target_tokens: When the history passes MAX_HISTORY_TOKENS, old turns are dropped
+                                   in one block down to this size. Between drops the start of the prompt
+                                   stays identical, which lets OpenAI's prompt cache serve it.
+            summarize_after_tokens: Once the history passes this size, the oldest turns are folded into a
+                                    running summary (the pinned message) in the background, leaving about
+                                    half of it as live turns. None turns summarization off.
+            summary_model: Model the summaries are written with
+            summary_max_words: Length limit for the summary
+            memory_index: A chat_memory.ChatMemoryIndex. Every exchange is added to it, and the most relevant
+                          old exchanges that are no longer in the live history are sent along with each prompt.
+            memory_top_k: Old exchanges recalled per prompt
+            memory_max_tokens: Token limit for the recalled exchanges
+            response_cache: Cache for chat() answers, defaults to an in-memory ResponseCache
+            use_response_cache: Set to False to always send chat() requests
+        """
+        self.chat_history = ChatHistory(token_counter=token_counter) # Stores the entire conversation
         try:
-            self.client = OpenAI(api_key=os.environ['OPENAI_API_KEY'])
-        except TypeError:
+            self.api_key = os.environ['OPENAI_API_KEY']
+        except KeyError:
             exit("Ooops! You forgot to set OPENAI_API_KEY in your environment!")
+        self.request_timeout = request_timeout
+        self.history_target_tokens = history_target_tokens
+        self.last_request_stats = {}
+        self.prompt_token_totals = {"prompt_tokens": 0, "cached_tokens": 0}
+        self.max_retries = max_retries
+        self.request_slots = asyncio.Semaphore(max_concurrent_requests)
+        self.summarize_after_tokens = summarize_after_tokens
+        self.summary_model = summary_model
+        self.summary_max_words = summary_max_words
+        self.compaction_task = None
+        self.compacting_ids = set() # Messages the running compaction will remove from the history
+        self.unsummarized = [] # Messages the token limit dropped before they could be summarized
+        self.memory_index = memory_index
+        self.memory_top_k = memory_top_k
+        self.memory_max_tokens = memory_max_tokens
+        self.response_cache = (response_cache or ResponseCache()) if use_response_cache else None
+        self.in_flight_chats = {} # Running chat() requests by cache key, shared by identical questions
+        self.coalesced_requests = 0
+        self._client = None
+        self._client_loop = None
+        self._http_client = None
 
-    # Asks a question with no chat history
-    def chat(self, prompt=""):
+    @property
+    def client(self):
+        """AsyncOpenAI client on the shared connection pool of the running event loop"""
+        loop = asyncio.get_running_loop()
+        # The pool may have been closed by another manager's aclose()
+        pool_closed = self._http_client is not None and self._http_client.is_closed
+        if self._client is None or self._client_loop is not loop or pool_closed:
+            self._http_client = shared_http_client()
+            self._client = AsyncOpenAI(api_key=self.api_key, http_client=self._http_client,
+                                       max_retries=self.max_retries)
+            self._client_loop = loop
+        return self._client
+
+    async def aclose(self):
+        """
+        Let a running summary finish, then close the connection pool of the running event loop.
+        The pool is shared by every manager on this loop; a later request opens a new one.
+        """
+        if self.compaction_task is not None and not self.compaction_task.done():
+            await asyncio.wait([self.compaction_task])
+        http_client = _http_clients.pop(asyncio.get_running_loop(), None)
+        if http_client is not None and not http_client.is_closed:
+            await http_client.aclose()
+        self._client = None
+        self._client_loop = None
+        self._http_client = None
+
+    # Asks a question with no chat history.
+    # Without history the same question always makes the same request, so answers are cached,
+    # and identical questions asked at the same time share one request.
+    async def chat(self, prompt="", model="gpt-4o"):
         if not prompt:
             print("Didn't receive input!")
             return
 
         # Check that the prompt is under the token context limit
         chat_question = [{"role": "user", "content": prompt}]
-        if num_tokens_from_messages(chat_question) > 8000:
+        if num_tokens_from_messages(chat_question) > MAX_HISTORY_TOKENS:
             print("The length of this chat question is too large for the GPT model")
             return
 
-        print("[yellow]\nAsking ChatGPT a question...")
-        completion = self.client.chat.completions.create(
-          model="gpt-4o",
-          messages=chat_question
-        )
+        cache_key = ResponseCache.make_key(model, chat_question)
+        # Join an identical request that is already running before looking in the cache,
+        # so callers that share one request count as coalesced rather than cache misses
+        request = self.in_flight_chats.get(cache_key)
+        if request is not None:
+            self.coalesced_requests += 1
+            print("[yellow]\nWaiting for the same question that is already being asked...")
+        elif self.response_cache is not None:
+            cached_answer = self.response_cache.get(cache_key)
+            if cached_answer is not None:
+                print(f"[yellow]\nAnswered from the response cache ({self.response_cache.hits} hits, "
+                      f"{self.response_cache.misses} misses)")
+                print(f"[green]\n{cached_answer}\n")
+                return cached_answer
+
+        if request is None:
+            request = asyncio.ensure_future(self._request_chat(chat_question, model, cache_key))
+            self.in_flight_chats[cache_key] = request
+        # Shielded, so one caller giving up doesn't cancel the request for the others
+        openai_answer = await asyncio.shield(request)
 
         # Process the answer
-        openai_answer = completion.choices[0].message.content
         print(f"[green]\n{openai_answer}\n")
         return openai_answer
 
-    # Asks a question that includes the full conversation history
-    def chat_with_history(self, prompt=""):
+    async def _request_chat(self, chat_question, model, cache_key):
+        """Sends a chat() request and caches the answer"""
+        try:
+            print("[yellow]\nAsking ChatGPT a question...")
+            start_time = time.time()
+            async with self.request_slots:
+                completion = await self.client.chat.completions.create(
+                  model=model,
+                  messages=chat_question,
+                  timeout=self.request_timeout
+                )
+            self._record_request_stats(completion.usage, start_time)
+            openai_answer = completion.choices[0].message.content
+            if self.response_cache is not None and openai_answer:
+                self.response_cache.put(cache_key, openai_answer)
+            return openai_answer
+        finally:
+            self.in_flight_chats.pop(cache_key, None)
+
+    # Asks a question that includes the full conversation history.
+    # The question and answer are added to the history together once the answer arrives,
+    # so concurrent conversations never interleave half-finished exchanges.
+    async def chat_with_history(self, prompt=""):
         if not prompt:
             print("Didn't receive input!")
             return
 
-        # Add our prompt into the chat history
-        self.chat_history.append({"role": "user", "content": prompt})
-
-        # Check total token limit. Remove old messages as needed
-        print(f"[coral]Chat History has a current token length of {num_tokens_from_messages(self.chat_history)}")
-        while num_tokens_from_messages(self.chat_history) > 8000:
-            self.chat_history.pop(1) # We skip the 1st message since it's the system message
-            print(f"Popped a message! New token length is: {num_tokens_from_messages(self.chat_history)}")
+        user_message = {"role": "user", "content": prompt}
+        messages = self._history_with(user_message)
 
         print("[yellow]\nAsking ChatGPT a question...")
-        completion = self.client.chat.completions.create(
-          model="gpt-4o",
-          messages=self.chat_history
-        )
+        start_time = time.time()
+        async with self.request_slots:
+            completion = await self.client.chat.completions.create(
+              model="gpt-4o",
+              messages=messages,
+              timeout=self.request_timeout
+            )
+        self._record_request_stats(completion.usage, start_time)
 
-        # Add this answer to our chat history
-        self.chat_history.append({"role": completion.choices[0].message.role, "content": completion.choices[0].message.content})
+        # Add the question and this answer to our chat history
+        self._commit_exchange(user_message, {"role": completion.choices[0].message.role,
+                                             "content": completion.choices[0].message.content})
 
         # Process the answer
         openai_answer = completion.choices[0].message.content
         print(f"[green]\n{openai_answer}\n")
         return openai_answer
+
+    # Asks a question that includes the full conversation history, yielding the answer one sentence at a time
+    # as it streams in. The question and answer are only added to the history once the whole answer has arrived.
+    async def chat_with_history_streamed(self, prompt=""):
+        if not prompt:
+            print("Didn't receive input!")
+            return
+
+        user_message = {"role": "user", "content": prompt}
+        messages = self._history_with(user_message)
+
+        print("[yellow]\nAsking ChatGPT a question...")
+        reply = {"role": "assistant", "parts": [], "usage": None, "first_token_time": None}
+        start_time = time.time()
+        # Sentences are read from the API into a queue, so the request slot is released as soon
+        # as the stream ends rather than after the caller has finished speaking every sentence
+        ready_sentences = asyncio.Queue()
+        reader = asyncio.ensure_future(self._read_sentence_stream(messages, reply, ready_sentences))
+        reader.add_done_callback(lambda _: ready_sentences.put_nowait(None))
+        try:
+            while True:
+                sentence = await ready_sentences.get()
+                if sentence is None:
+                    break
+                yield sentence
+            await reader  # Raises if the request failed
+        finally:
+            reader.cancel()
+
+        self._record_request_stats(reply["usage"], start_time, reply["first_token_time"])
+
+        # The stream finished, so commit the question and answer together
+        openai_answer = "".join(reply["parts"])
+        self._commit_exchange(user_message, {"role": reply["role"], "content": openai_answer})
+        print(f"[green]\n{openai_answer}\n")
+
+    async def _read_sentence_stream(self, messages, reply, ready_sentences):
+        """Stream an answer into reply, putting each finished sentence on ready_sentences"""
+        unfinished = ""
+        async with self.request_slots:
+            stream = await self.client.chat.completions.create(
+              model="gpt-4o",
+              messages=messages,
+              stream=True,
+              timeout=self.request_timeout,
+              # Ask for a final chunk with token usage (not a named argument in this client version)
+              extra_body={"stream_options": {"include_usage": True}}
+            )
+            async for chunk in stream:
+                reply["usage"] = getattr(chunk, "usage", None) or reply["usage"]
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta.role:
+                    reply["role"] = delta.role
+                if delta.content:
+                    if reply["first_token_time"] is None:
+                        reply["first_token_time"] = time.time()
+                    reply["parts"].append(delta.content)
+                    sentences, unfinished = split_complete_sentences(unfinished + delta.content)
+                    for sentence in sentences:
+                        ready_sentences.put_nowait(sentence)
+        if unfinished.strip():
+            ready_sentences.put_nowait(unfinished.strip())
+
+    def _history_with(self, user_message):
+        """Trims the history to leave room for user_message and any recalled exchanges (never dropping the
+        system or pinned message), then returns the messages to send"""
+        # Recalled exchanges go after the history, so the cached start of the prompt stays the same
+        recalled = self._recall(user_message["content"])
+        extra_messages = ([recalled] if recalled else []) + [user_message]
+        reserved_tokens = sum(self.chat_history.token_counter(message) for message in extra_messages)
+        print(f"[coral]Chat History has a current token length of {self.chat_history.token_count + reserved_tokens}")
+        evicted = self.chat_history.trim_to(MAX_HISTORY_TOKENS - reserved_tokens,
+                                            self.history_target_tokens - reserved_tokens)
+        if evicted:
+            print(f"Dropped the {len(evicted)} oldest messages in one block! New token length is: "
+                  f"{self.chat_history.token_count + reserved_tokens}")
+            if self.summarize_after_tokens is not None:
+                self.unsummarized.extend(message for message in evicted if id(message) not in self.compacting_ids)
+        return self.chat_history.to_list() + extra_messages
+
+    def _recall(self, prompt):
+        """Returns a system message with the old exchanges most relevant to prompt, or None if there are none"""
+        if self.memory_index is None:
+            return None
+        live = {message["content"] for message in self.chat_history if message["role"] == "user"}
+        lines = [RECALL_PREFIX]
+        recalled_tokens = self.chat_history.token_counter({"role": "system", "content": RECALL_PREFIX})
+        for _, user, assistant in self.memory_index.search(prompt, self.memory_top_k):
+            if user in live:
+                continue
+            exchange = f"user: {user}\nassistant: {assistant}"
+            exchange_tokens = self.chat_history.token_counter({"content": exchange})
+            if recalled_tokens + exchange_tokens > self.memory_max_tokens:
+                continue
+            lines.append(exchange)
+            recalled_tokens += exchange_tokens
+        if len(lines) == 1:
+            return None
+        print(f"[coral]Recalled {len(lines) - 1} earlier exchanges ({recalled_tokens} tokens)")
+        return {"role": "system", "content": "\n\n".join(lines)}
+
+    def _commit_exchange(self, user_message, answer_message):
+        """Adds a finished question and answer to the history (and memory index) together"""
+        self.chat_history.append(user_message)
+        self.chat_history.append(answer_message)
+        if self.memory_index is not None:
+            self.memory_index.add_exchange(user_message["content"], answer_message["content"])
+        self._schedule_compaction()
+
+    def _schedule_compaction(self):
+        """Starts folding the oldest turns into the running summary if the history has grown past
+        summarize_after_tokens. The summary is written in the background, off the request path."""
+        if self.summarize_after_tokens is None or (self.compaction_task and not self.compaction_task.done()):
+            return
+        count = 0
+        if self.chat_history.token_count > self.summarize_after_tokens:
+            count = self.chat_history.oldest_block_size(self.summarize_after_tokens // 2)
+        if not count and not self.unsummarized:
+            return
+        block = list(itertools.islice(self.chat_history.messages, count))
+        dropped, self.unsummarized = self.unsummarized, []
+        self.compacting_ids = {id(message) for message in block}
+        self.compaction_task = asyncio.create_task(self._compact(dropped, block))
+
+    async def _compact(self, dropped, block):
+        """Summarizes the previous summary plus the given messages, then swaps the summary in for them.
+        The messages stay in the live history until the summary is ready, so nothing is missing meanwhile."""
+        print(f"[yellow]Summarizing the {len(dropped) + len(block)} oldest messages in the background...")
+        previous = self.chat_history.pinned_message
+        prompt = SUMMARY_PROMPT.format(
+            max_words=self.summary_max_words,
+            summary=previous["content"][len(SUMMARY_PREFIX):] if previous else "(nothing yet)",
+            transcript="\n".join(f"{message['role']}: {message['content']}" for message in dropped + block)
+        )
+        try:
+            summary = await self._request_summary(prompt)
+        except Exception as e:
+            print(f"[red]Couldn't summarize the chat history: {e}")
+            summary = None
+        if not summary:
+            # Try again after the next turn. Messages of the block that the token limit dropped meanwhile
+            # were left out of unsummarized because this summary was going to cover them.
+            live = {id(message) for message in self.chat_history.messages}
+            lost = [message for message in block if id(message) not in live]
+            self.unsummarized = dropped + lost + self.unsummarized
+            self.compacting_ids = set()
+            return
+
+        # The block is still the oldest part of the history, unless the token limit dropped some of it meanwhile
+        while self.chat_history.messages and id(self.chat_history.messages[0]) in self.compacting_ids:
+            self.chat_history.pop_oldest()
+        self.compacting_ids = set()
+        self.chat_history.set_pinned_message({"role": "system", "content": SUMMARY_PREFIX + summary.strip()})
+        print(f"[coral]Chat history compacted! New token length is: {self.chat_history.token_count}")
+
+    async def _request_summary(self, prompt):
+        """Stateless request for a summary. Unlike chat() it isn't printed as an answer or counted in
+        last_request_stats, so those keep describing the conversation's own requests."""
+        async with self.request_slots:
+            completion = await self.client.chat.completions.create(
+              model=self.summary_model,
+              messages=[{"role": "user", "content": prompt}],
+              timeout=self.request_timeout
+            )
+        return completion.choices[0].message.content
+
+    def _record_request_stats(self, usage, start_time, first_token_time=None):
+        """Keeps and prints how much of the prompt OpenAI served from its prompt cache, and how fast the answer started"""
+        prompt_tokens = _usage_field(usage, "prompt_tokens") or 0
+        cached_tokens = _usage_field(_usage_field(usage, "prompt_tokens_details"), "cached_tokens") or 0
+        self.prompt_token_totals["prompt_tokens"] += prompt_tokens
+        self.prompt_token_totals["cached_tokens"] += cached_tokens
+        self.last_request_stats = {
+            "prompt_tokens": prompt_tokens,
+            "cached_tokens": cached_tokens,
+            "uncached_tokens": prompt_tokens - cached_tokens,
+            # Without streaming the first token arrives with the whole answer
+            "time_to_first_token": round((first_token_time or time.time()) - start_time, 3),
+            "total_seconds": round(time.time() - start_time, 3),
+        }
+        print(f"[coral]Prompt: {prompt_tokens} tokens ({cached_tokens} cached, {prompt_tokens - cached_tokens} uncached), "
+              f"first token after {self.last_request_stats['time_to_first_token']:.2f}s")
+
+
+class OpenAiManager:
+    """
+    Blocking wrapper around AsyncOpenAiManager for code that isn't async.
+    Requests run on a private event loop thread, so the connection pool stays warm
+    between calls.
+    """
+    
+    def __init__(self, token_counter=None, **async_options):
+        self.async_manager = AsyncOpenAiManager(token_counter, **async_options)
+        self._loop = asyncio.new_event_loop()
+        self._closed = False
+        threading.Thread(target=self._loop.run_forever, daemon=True, name="openai-loop").start()
+
+    @property
+    def chat_history(self):
+        return self.async_manager.chat_history
+
+    @property
+    def last_request_stats(self):
+        return self.async_manager.last_request_stats
+
+    @property
+    def response_cache(self):
+        return self.async_manager.response_cache
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def close(self):
+        """Close the connection pool on the private loop and stop it. The manager can't be used afterwards."""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._run(self.async_manager.aclose())
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+
+    # Asks a question with no chat history
+    def chat(self, prompt="", model="gpt-4o"):
+        return self._run(self.async_manager.chat(prompt, model))
+
+    # Asks a question that includes the full conversation history
+    def chat_with_history(self, prompt=""):
+        return self._run(self.async_manager.chat_with_history(prompt))
+
+    # Asks a question that includes the full conversation history, yielding the answer one sentence at a time
+    def chat_with_history_streamed(self, prompt=""):
+        sentences = self.async_manager.chat_with_history_streamed(prompt)
+        try:
+            while True:
+                try:
+                    yield self._run(sentences.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            self._run(sentences.aclose())
    
 
 if __name__ == '__main__':
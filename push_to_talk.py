@@ -0,0 +1,96 @@
+import threading
+from typing import Optional
+
+import keyboard
+from rich import print
+
+
+class PushToTalkManager:
+    """
+    Event-driven push-to-talk for a SpeechToTextManager. The microphone stream stays
+    open with a rolling pre-roll, and the hotkey handlers start and stop recordings
+    directly, so a turn begins the instant the key goes down and includes the audio
+    from just before it.
+
+    The hotkey only starts a turn while wait_for_turn() is waiting for one. Presses
+    while the previous turn is still being transcribed or answered are ignored, so
+    they can't restart the recorder under a running transcription or record Sam.
+
+    Modes:
+        'hold':   record while the hotkey is held down
+        'toggle': the hotkey starts a recording; pressing it again (or trailing
+                  silence, if end_silence_ms is used) ends it
+    """
+
+    def __init__(self, speechtotext_manager, hotkey: str = "f4", mode: str = "hold", streaming: bool = True):
+        if mode not in ("hold", "toggle"):
+            raise ValueError(f"Unknown push-to-talk mode '{mode}', expected 'hold' or 'toggle'")
+        self.speechtotext_manager = speechtotext_manager
+        self.hotkey = hotkey
+        self.mode = mode
+        self.streaming = streaming
+        self.turn_started = threading.Event()
+        self.armed = False  # Only start turns while wait_for_turn() is waiting
+        self.armed_lock = threading.Lock()
+        self.key_down = False
+        self.hooks = []
+
+    def start(self):
+        """Open the microphone and register the hotkey handlers"""
+        self.speechtotext_manager.start_listening()
+        self.hooks = [keyboard.on_press_key(self.hotkey, self._on_press),
+                      keyboard.on_release_key(self.hotkey, self._on_release)]
+
+    def stop(self):
+        """Remove the hotkey handlers and close the microphone"""
+        for hook in self.hooks:
+            keyboard.unhook(hook)
+        self.hooks = []
+        self.speechtotext_manager.stop_listening()
+
+    def _on_press(self, event):
+        # Held keys auto-repeat key-down events; only the first one counts
+        if self.key_down:
+            return
+        self.key_down = True
+
+        if self.speechtotext_manager.is_recording:
+            if self.mode == "toggle":
+                self.speechtotext_manager.stop_recording()
+            return
+
+        with self.armed_lock:
+            if not self.armed:
+                return
+            self.armed = False
+        self.speechtotext_manager.start_mic_turn()
+        self.turn_started.set()
+        print(f"[green]User pressed {self.hotkey.upper()}! Now listening to your microphone:")
+
+    def _on_release(self, event):
+        self.key_down = False
+        if self.mode == "hold" and self.speechtotext_manager.is_recording:
+            self.speechtotext_manager.stop_recording()
+
+    def wait_for_turn(self, end_silence_ms: Optional[int] = None) -> str:
+        """
+        Block until the hotkey starts a turn, then wait for it to end and transcribe it.
+
+        Args:
+            end_silence_ms: In toggle mode, also end the turn after this much silence
+                            (requires a vad on the speech-to-text manager)
+
+        Returns:
+            str: The transcribed turn
+        """
+        with self.armed_lock:
+            self.turn_started.clear()
+            self.armed = True
+        self.turn_started.wait()
+        self.turn_started.clear()
+        return self.speechtotext_manager.speechtotext_from_mic_continuous(
+            stop_key=None,
+            streaming=self.streaming,
+            end_silence_ms=end_silence_ms if self.mode == "toggle" else None,
+            turn_started=True
+        )
@@ -0,0 +1,38 @@
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional
+
+from tiered_cache import TieredCache
+
+DEFAULT_RESPONSE_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "babagaboosh", "responses")
+
+
+class ResponseCache(TieredCache):
+    """
+    Exact-match cache of chat completions for requests without history.
+    Entries are keyed by a hash of the model, the messages and the request
+    parameters, expire after ttl_seconds, and live in an in-memory LRU tier with an
+    optional size-bounded on-disk tier behind it.
+    """
+
+    label = "response cache"
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: Optional[float] = 3600,
+                 cache_dir: Optional[str] = None, max_disk_bytes: int = 20 * 1024 * 1024):
+        """
+        Args:
+            max_entries: Responses kept in memory
+            ttl_seconds: How long a response stays valid, None to keep it until evicted
+            cache_dir: Directory for the on-disk tier (e.g. DEFAULT_RESPONSE_CACHE_DIR), None to keep
+                       the cache in memory only
+            max_disk_bytes: Oldest disk entries are evicted once the tier grows past this
+        """
+        super().__init__(max_entries, ttl_seconds, cache_dir, max_disk_bytes)
+
+    @staticmethod
+    def make_key(model: str, messages: List[Dict[str, str]], params: Optional[Dict] = None) -> str:
+        """Hash everything that goes into the request"""
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(json.dumps([model, messages, params or {}], sort_keys=True, default=str).encode())
+        return digest.hexdigest()
@@ -0,0 +1,90 @@
+"""
+Fast path for short utterances. Whisper normally pads every input to a 30 second
+mel window, so a 2 second clip costs as much encoder compute as 30 seconds of speech.
+Here the encoder runs on an audio context sized to the clip instead, and the
+decoder cross-attends to that shorter context.
+"""
+import copy
+import dataclasses
+import math
+from typing import Optional
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+import whisper
+from whisper.audio import HOP_LENGTH, N_FRAMES, SAMPLE_RATE
+
+# The encoder's conv stem halves the mel frame rate: 100 mel frames -> 50 contexts per second
+CONTEXTS_PER_SECOND = SAMPLE_RATE // HOP_LENGTH // 2
+
+
+def encode_truncated(model, mel: torch.Tensor) -> torch.Tensor:
+    """
+    Run Whisper's audio encoder on a mel spectrogram shorter than 30 seconds.
+    Same computation as AudioEncoder.forward, with the positional embedding sliced
+    to the input length instead of asserting a full window.
+    """
+    encoder = model.encoder
+    x = F.gelu(encoder.conv1(mel))
+    x = F.gelu(encoder.conv2(x))
+    x = x.permute(0, 2, 1)
+    x = (x + encoder.positional_embedding[:x.shape[1]]).to(x.dtype)
+    for block in encoder.blocks:
+        x = block(x)
+    return encoder.ln_post(x)
+
+
+def transcribe_short_utterance(model, audio: np.ndarray, language: Optional[str] = "en",
+                               fp16: bool = False, prompt: Optional[str] = None,
+                               min_context_seconds: float = 4.0, padding_seconds: float = 1.0,
+                               min_avg_logprob: float = -0.8, max_compression_ratio: float = 2.4,
+                               max_no_speech_prob: float = 0.6) -> Optional[str]:
+    """
+    Transcribe a short clip with a truncated audio context.
+
+    Args:
+        model: Loaded Whisper model
+        audio: float32 16kHz mono samples
+        language: Spoken language, None to detect
+        fp16: Decode in half precision (GPU only)
+        prompt: Previous text to condition on
+        min_context_seconds: Never shrink the context below this; very short contexts
+                             are far from what Whisper was trained on
+        padding_seconds: Silence kept after the clip so the last word isn't cut off
+        min_avg_logprob: Results less confident than this are rejected
+        max_compression_ratio: Results more repetitive than this are rejected
+        max_no_speech_prob: Results this likely to be silence are rejected
+
+    Returns:
+        str: The transcription, or None if the clip is too long or the result failed
+             the confidence checks; callers should then use the full 30s window
+    """
+    n_audio_ctx = model.dims.n_audio_ctx
+    clip_seconds = len(audio) / SAMPLE_RATE
+    context = math.ceil(max(clip_seconds + padding_seconds, min_context_seconds) * CONTEXTS_PER_SECOND)
+    if context >= n_audio_ctx:
+        return None
+
+    # Pad to the full window like Whisper does, then keep only the frames we need,
+    # so the log-mel normalization sees the same audio as the full-window path
+    mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), model.dims.n_mels)
+    mel = mel[:, :min(context * 2, N_FRAMES)].unsqueeze(0).to(model.device)
+    if fp16:
+        mel = mel.half()
+
+    # A shallow copy shares every weight but reports the shorter context, which tells
+    # the decoder the features are already encoded
+    short_model = copy.copy(model)
+    short_model.dims = dataclasses.replace(model.dims, n_audio_ctx=context)
+
+    options = whisper.DecodingOptions(language=language, fp16=fp16, prompt=prompt,
+                                      temperature=0.0, without_timestamps=True)
+    with torch.no_grad():
+        audio_features = encode_truncated(model, mel)
+        result = whisper.decode(short_model, audio_features, options)[0]
+
+    if (result.avg_logprob < min_avg_logprob or result.compression_ratio > max_compression_ratio
+            or result.no_speech_prob > max_no_speech_prob):
+        return None
+    return result.text.strip()
@@ -0,0 +1,124 @@
+import os
+import queue
+import threading
+import time
+from typing import Callable, Iterable, Optional
+
+from rich import print
+
+
+class StreamingSpeechManager:
+    """
+    Speaks a reply sentence by sentence while the rest of it is still being generated.
+    A worker thread pulls sentences from the (streaming) source and synthesizes them,
+    while the calling thread plays each finished audio file in order. Sentence one
+    plays while sentence two is synthesized and sentence three is still streaming in.
+    """
+
+    def __init__(self, tts_manager, audio_manager, voice: str = "default", max_pending: int = 3):
+        """
+        Args:
+            tts_manager: Anything with text_to_audio(text, voice, save_as_wave) -> file path
+            audio_manager: AudioManager used for playback
+            voice: Voice passed to the TTS manager
+            max_pending: Synthesized sentences allowed to wait for playback
+        """
+        self.tts_manager = tts_manager
+        self.audio_manager = audio_manager
+        self.voice = voice
+        self.max_pending = max_pending
+
+    def speak(self, sentences: Iterable[str], on_first_audio: Optional[Callable[[], None]] = None) -> str:
+        """
+        Synthesize and play sentences as they arrive.
+
+        Args:
+            sentences: Sentences to speak, e.g. OpenAiManager.chat_with_history_streamed()
+            on_first_audio: Called right before the first sentence starts playing
+
+        Returns:
+            str: Everything that was spoken
+        """
+        start_time = time.time()
+        ready = queue.Queue(maxsize=self.max_pending)
+        stop = threading.Event()
+        # The TTS names files after their text, so a repeated sentence reuses a file;
+        # only delete a file once nothing queued still needs it
+        pending_files = {}
+        pending_lock = threading.Lock()
+        worker = threading.Thread(target=self._synthesize, args=(sentences, ready, stop, pending_files, pending_lock),
+                                  daemon=True, name="tts-synthesize")
+        worker.start()
+
+        spoken = []
+        first_audio = True
+        try:
+            while True:
+                item = ready.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                sentence, tts_file = item
+                if not tts_file:
+                    print("[red]Failed to generate TTS audio[/red]")
+                    continue
+
+                if first_audio:
+                    first_audio = False
+                    print(f"[cyan]First audio ready {time.time() - start_time:.2f}s after the request")
+                    if on_first_audio:
+                        on_first_audio()
+                delete_file = self._release_file(tts_file, pending_files, pending_lock)
+                try:
+                    self.audio_manager.play_audio(tts_file, True, delete_file, True)
+                except Exception as e:
+                    # One sentence that can't be played shouldn't cut off the rest of the reply
+                    print(f"[red]Could not play TTS audio: {e}[/red]")
+                    continue
+                spoken.append(sentence)
+        finally:
+            # On an error, stop the worker (which closes the sentence source) and throw away
+            # audio that will never be played, so the worker isn't left blocked on a full queue
+            stop.set()
+            while worker.is_alive() or not ready.empty():
+                try:
+                    item = ready.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if isinstance(item, tuple) and item[1] and self._release_file(item[1], pending_files, pending_lock):
+                    try:
+                        os.remove(item[1])
+                    except OSError:
+                        pass
+            worker.join()
+        return " ".join(spoken)
+
+    @staticmethod
+    def _release_file(tts_file: str, pending_files: dict, pending_lock: threading.Lock) -> bool:
+        """Mark one queued use of a file as done; True if nothing queued needs it anymore"""
+        with pending_lock:
+            pending_files[tts_file] -= 1
+            return pending_files[tts_file] == 0
+
+    def _synthesize(self, sentences: Iterable[str], ready: queue.Queue, stop: threading.Event,
+                    pending_files: dict, pending_lock: threading.Lock):
+        """Worker thread: consume the sentence source and queue synthesized audio for playback"""
+        try:
+            for sentence in sentences:
+                if stop.is_set():
+                    break
+                tts_file = self.tts_manager.text_to_audio(sentence, self.voice, False)
+                if tts_file:
+                    with pending_lock:
+                        pending_files[tts_file] = pending_files.get(tts_file, 0) + 1
+                ready.put((sentence, tts_file))
+        except Exception as e:
+            ready.put(e)
+            return
+        finally:
+            # A generator (e.g. the streamed reply) is closed on the thread that iterates it
+            close = getattr(sentences, "close", None)
+            if close is not None:
+                close()
+        ready.put(None)
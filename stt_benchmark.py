@@ -0,0 +1,430 @@
+"""
+Reproducible speech-to-text benchmark. Runs every SpeechToTextManager input path
+(file, in-memory array and a simulated microphone) over a corpus of clips and
+writes real-time factor, end-of-speech latency, peak memory and WER to JSON.
+
+A corpus is a directory of audio clips; a clip's reference transcript is a text
+file next to it with the same name (clip.wav -> clip.txt). Clips without one are
+still timed but get no WER; --write-references drafts the missing ones with a
+large model as clip.draft.txt. Drafts are never scored: listen to the clip, correct
+the draft and rename it to clip.txt to use it. Everything runs on CPU
+with models already on disk. Each input path runs in its own process, so peak
+memory is measured per path.
+
+Usage:
+    python stt_benchmark.py corpus/ --write-references --model large
+    python stt_benchmark.py corpus/ --model base --output results/base.json
+    python stt_benchmark.py corpus/ --model small --baseline results/base.json
+"""
+import argparse
+import json
+import os
+import multiprocessing
+import platform
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+import numpy as np
+import torch
+
+from audio_decoding import WHISPER_SAMPLE_RATE, load_audio_file
+from batch_transcribe import find_audio_files
+from transcript_utils import word_error_rate
+from voice_activity import VoiceActivityDetector
+from whisper_speech_to_text import SpeechToTextManager
+
+DEFAULT_CORPUS = os.path.dirname(os.path.abspath(__file__))
+PATHS = ["file", "array", "mic"]
+
+
+class SimulatedInputStream:
+    """
+    Stand-in for sounddevice.InputStream that plays a clip into the callback at
+    (a multiple of) real time, followed by silence until it is stopped.
+    Records the wall-clock time at which the last speech sample was delivered, and
+    when the stream was stopped.
+    """
+
+    def __init__(self, audio: np.ndarray, speech_end_sample: int, speed: float = 1.0,
+                 samplerate: int = WHISPER_SAMPLE_RATE, channels: int = 1, dtype=np.float32,
+                 blocksize: int = 1600, callback=None):
+        self.audio = audio
+        self.speech_end_sample = speech_end_sample
+        self.speed = speed
+        self.samplerate = samplerate
+        self.channels = channels
+        self.dtype = dtype
+        self.blocksize = blocksize or 1600
+        self.callback = callback
+        self.speech_end_time: Optional[float] = None
+        self.stop_time: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def factory(cls, audio: np.ndarray, speech_end_sample: int, speed: float = 1.0):
+        """Build an AudioRecorder stream_factory that remembers the stream it created"""
+        def create(**stream_args):
+            create.stream = cls(audio, speech_end_sample, speed, **stream_args)
+            return create.stream
+        create.stream = None
+        return create
+
+    def _run(self):
+        position = 0
+        next_block_time = time.perf_counter()
+        while not self._stop.is_set():
+            block = np.zeros((self.blocksize, self.channels), dtype=self.dtype)
+            clip_block = self.audio[position:position + self.blocksize]
+            block[:len(clip_block)] = clip_block[:, None]
+            position += self.blocksize
+            self.callback(block, self.blocksize, None, None)
+            if self.speech_end_time is None and position >= self.speech_end_sample:
+                self.speech_end_time = time.perf_counter()
+
+            # Pace against an absolute schedule so callback time doesn't accumulate drift
+            next_block_time += self.blocksize / self.samplerate / self.speed
+            self._stop.wait(max(0.0, next_block_time - time.perf_counter()))
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True, name="simulated-mic")
+        self._thread.start()
+
+    def stop(self):
+        if self.stop_time is None:
+            self.stop_time = time.perf_counter()
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def close(self):
+        self.stop()
+
+
+def load_corpus(source: str) -> List[Dict]:
+    """Load every clip in a corpus directory (or glob) with its reference transcript, if any"""
+    clips = []
+    for path in find_audio_files(source):
+        reference_path = os.path.splitext(path)[0] + ".txt"
+        reference = None
+        if os.path.exists(reference_path):
+            with open(reference_path, "r", encoding="utf-8") as f:
+                reference = f.read().strip()
+        audio = load_audio_file(path, WHISPER_SAMPLE_RATE)
+        clips.append({"path": path, "audio": audio, "reference": reference,
+                      "has_draft": os.path.exists(draft_reference_path(path)),
+                      "seconds": len(audio) / WHISPER_SAMPLE_RATE})
+    return clips
+
+
+def draft_reference_path(audio_path: str) -> str:
+    """Where --write-references puts a clip's unchecked transcript (clip.wav -> clip.draft.txt)"""
+    return os.path.splitext(audio_path)[0] + ".draft.txt"
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process so far, None if it can't be measured here"""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS bytes
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    try:
+        import psutil
+    except ImportError:
+        return None
+    memory = psutil.Process().memory_info()
+    # Windows keeps the peak working set
+    return getattr(memory, "peak_wset", memory.rss) / (1024 * 1024)
+
+
+def write_missing_references(corpus: str, model_size: str = "large") -> int:
+    """
+    Draft a reference transcript for every clip that has none, using the accurate profile.
+    The drafts come from a model and are written as clip.draft.txt, which the benchmark
+    never scores against: listen to each clip, correct the draft and rename it to clip.txt.
+
+    Returns:
+        int: Number of drafts written
+    """
+    manager = None
+    written = 0
+    for clip in load_corpus(corpus):
+        if clip["reference"] is not None or clip["has_draft"]:
+            continue
+        if manager is None:
+            manager = SpeechToTextManager(model_size=model_size, device="cpu", use_cache=False)
+        text = manager.speechtotext_from_file(clip["path"])
+        draft_path = draft_reference_path(clip["path"])
+        with open(draft_path, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"Wrote DRAFT {draft_path}: {text}")
+        written += 1
+    if written:
+        print(f"Drafted {written} references with '{model_size}'. They are unchecked model output: listen to "
+              f"each clip, correct its .draft.txt and rename it to .txt before it is used for WER")
+    return written
+
+
+def speech_end_sample(vad: VoiceActivityDetector, audio: np.ndarray) -> int:
+    """Sample index just after the last frame containing speech"""
+    mask = vad.speech_mask(audio)
+    if not mask.any():
+        return len(audio)
+    return (int(np.flatnonzero(mask)[-1]) + 1) * vad.frame_size
+
+
+def run_clip(manager: SpeechToTextManager, path_name: str, clip: Dict, vad: VoiceActivityDetector,
+             mic_speed: float, end_silence_ms: int) -> Dict:
+    """
+    Run one clip through one input path.
+
+    Latency is measured from the end of speech to the text being returned. For the
+    file and array paths speech has ended before the call, so it is the call time;
+    for the mic path it also includes waiting for the end-of-turn silence.
+    """
+    audio = clip["audio"]
+    cut_early = False
+    if path_name == "file":
+        start_time = time.perf_counter()
+        text = manager.speechtotext_from_file(clip["path"])
+        end_time = time.perf_counter()
+        latency = processing = end_time - start_time
+    elif path_name == "array":
+        start_time = time.perf_counter()
+        text = manager.speechtotext_from_array(audio)
+        end_time = time.perf_counter()
+        latency = processing = end_time - start_time
+    else:
+        factory = SimulatedInputStream.factory(audio, speech_end_sample(vad, audio), mic_speed)
+        manager.recorder.stream_factory = factory
+        text = manager.speechtotext_from_mic_continuous(stop_key=None, streaming=True,
+                                                        end_silence_ms=end_silence_ms)
+        end_time = time.perf_counter()
+        stream = factory.stream
+        # If the endpoint fired in a pause before the clip's speech ended, the turn was
+        # cut short; measure from the stop instead and flag it
+        cut_early = stream.speech_end_time is None
+        latency = end_time - (stream.stop_time if cut_early else stream.speech_end_time)
+        # Time spent after the endpoint fired, i.e. what streaming left to decode
+        processing = latency if cut_early else max(0.0, latency - end_silence_ms / 1000 / mic_speed)
+
+    return {
+        "clip": os.path.basename(clip["path"]),
+        "path": path_name,
+        "audio_seconds": round(clip["seconds"], 3),
+        "latency_seconds": round(latency, 3),
+        "real_time_factor": round(processing / clip["seconds"], 4) if clip["seconds"] else None,
+        "wer": round(word_error_rate(clip["reference"], text), 4) if clip["reference"] is not None else None,
+        "text": text,
+        "cut_early": cut_early,
+    }
+
+
+def summarize(results: List[Dict], rss_mb: float) -> Dict:
+    """Aggregate per-clip results for one input path"""
+    latencies = [r["latency_seconds"] for r in results]
+    audio_seconds = sum(r["audio_seconds"] for r in results)
+    processing_seconds = sum(r["real_time_factor"] * r["audio_seconds"] for r in results
+                             if r["real_time_factor"] is not None)
+    wers = [r["wer"] for r in results if r["wer"] is not None]
+    return {
+        "runs": len(results),
+        "real_time_factor": round(processing_seconds / audio_seconds, 4) if audio_seconds else None,
+        "latency_p50_seconds": round(float(np.percentile(latencies, 50)), 3) if latencies else None,
+        "latency_p95_seconds": round(float(np.percentile(latencies, 95)), 3) if latencies else None,
+        "wer": round(float(np.mean(wers)), 4) if wers else None,
+        "peak_rss_mb": round(rss_mb, 1) if rss_mb is not None else None,
+        "cut_early": sum(r["cut_early"] for r in results),
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(corpus: str = DEFAULT_CORPUS, model_size: str = "base", paths: Optional[List[str]] = None,
+                  repeat: int = 1, decode_profile: str = "realtime", quantized: bool = False,
+                  short_utterance_mode: bool = False, threads: Optional[int] = None,
+                  mic_speed: float = 1.0, end_silence_ms: int = 800, isolate_paths: bool = True) -> Dict:
+    """
+    Benchmark the requested input paths over a corpus.
+
+    Args:
+        corpus: Directory or glob of clips with optional .txt reference transcripts
+        model_size: Whisper model size (must already be downloaded)
+        paths: Input paths to run, any of 'file', 'array', 'mic' (default: all)
+        repeat: Times each clip is run per path
+        mic_speed: Playback speed of the simulated microphone (1.0 = real time)
+        end_silence_ms: Silence that ends a simulated mic turn
+        isolate_paths: Run each path in a fresh process. Peak memory is a process-wide high-water
+                       mark, so in one process every path after the first reports the earlier peak.
+
+    Returns:
+        dict: Environment, per-path summaries and per-clip results
+    """
+    paths = paths or PATHS
+    if isolate_paths and len(paths) > 1:
+        combined = None
+        for path_name in paths:
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                result = pool.submit(run_benchmark, corpus, model_size, [path_name], repeat, decode_profile,
+                                     quantized, short_utterance_mode, threads, mic_speed, end_silence_ms,
+                                     False).result()
+            if combined is None:
+                combined = result
+            else:
+                combined["summary"].update(result["summary"])
+                combined["results"].extend(result["results"])
+        return combined
+
+    clips = load_corpus(corpus)
+    if not clips:
+        raise ValueError(f"No audio files found in {corpus}")
+    if not any(clip["reference"] is not None for clip in clips):
+        print(f"No reference transcripts in {corpus}, so no WER will be reported "
+              f"(add clip.txt files or run with --write-references)")
+    drafts = [clip["path"] for clip in clips if clip["reference"] is None and clip["has_draft"]]
+    if drafts:
+        print(f"{len(drafts)} clips only have unchecked draft references and get no WER until they are "
+              f"corrected and renamed to .txt")
+
+    torch.manual_seed(0)
+    if threads:
+        torch.set_num_threads(threads)
+
+    vad = VoiceActivityDetector()
+    # The cache would turn every repeat into a lookup; it is off so each run decodes
+    manager = SpeechToTextManager(model_size=model_size, device="cpu", vad=vad, use_cache=False,
+                                  decode_profile=decode_profile, quantized=quantized,
+                                  short_utterance_mode=short_utterance_mode)
+    manager.file_decode_profile = decode_profile
+    # Load and warm up before anything is timed
+    manager.speechtotext_from_array(clips[0]["audio"])
+
+    clip_results = []
+    summaries = {}
+    for path_name in paths:
+        path_results = []
+        for _ in range(repeat):
+            for clip in clips:
+                result = run_clip(manager, path_name, clip, vad, mic_speed, end_silence_ms)
+                print(f"[{path_name}] {result['clip']}: {result['latency_seconds']:.2f}s latency, "
+                      f"RTF {result['real_time_factor']}, WER {result['wer']}")
+                path_results.append(result)
+        summaries[path_name] = summarize(path_results, peak_rss_mb())
+        clip_results.extend(path_results)
+
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "model": manager.model_handle.model_size,
+        "dtype": manager.model_handle.dtype,
+        "decode_profile": decode_profile,
+        "short_utterance_mode": short_utterance_mode,
+        "environment": {
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+            "torch": torch.__version__,
+            "torch_threads": torch.get_num_threads(),
+            "python": platform.python_version(),
+        },
+        "corpus": {"source": corpus, "clips": len(clips),
+                   "audio_seconds": round(sum(c["seconds"] for c in clips), 3),
+                   "with_reference": sum(c["reference"] is not None for c in clips)},
+        "settings": {"repeat": repeat, "mic_speed": mic_speed, "end_silence_ms": end_silence_ms},
+        "summary": summaries,
+        "results": clip_results,
+    }
+
+
+def find_regressions(baseline: Dict, current: Dict, latency_tolerance: float = 0.2,
+                     wer_tolerance: float = 0.02) -> List[str]:
+    """
+    Compare two benchmark results.
+
+    Args:
+        latency_tolerance: Allowed relative increase of p95 latency and real-time factor
+        wer_tolerance: Allowed absolute increase of WER
+
+    Returns:
+        list: A description of each metric that got worse by more than its tolerance
+    """
+    regressions = []
+    for path_name, summary in current["summary"].items():
+        previous = baseline.get("summary", {}).get(path_name)
+        if not previous:
+            continue
+        for metric in ("latency_p95_seconds", "real_time_factor"):
+            old, new = previous.get(metric), summary.get(metric)
+            if old and new is not None and new > old * (1 + latency_tolerance):
+                regressions.append(f"{path_name} {metric}: {old} -> {new}")
+        old, new = previous.get("wer"), summary.get("wer")
+        if old is not None and new is not None and new > old + wer_tolerance:
+            regressions.append(f"{path_name} wer: {old} -> {new}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the Whisper speech-to-text paths on CPU")
+    parser.add_argument("corpus", nargs="?", default=DEFAULT_CORPUS,
+                        help="Directory or glob of clips with .txt references (default: bundled test audio)")
+    parser.add_argument("--model", default="base", help="Whisper model size (default: base)")
+    parser.add_argument("--paths", nargs="+", choices=PATHS, default=PATHS, help="Input paths to benchmark")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per clip and path")
+    parser.add_argument("--profile", default="realtime", help="Decode profile (default: realtime)")
+    parser.add_argument("--quantized", action="store_true", help="Use the int8 quantized model")
+    parser.add_argument("--short-utterance", action="store_true", help="Enable the short utterance path")
+    parser.add_argument("--threads", type=int, default=None, help="Torch CPU threads (default: torch's choice)")
+    parser.add_argument("--mic-speed", type=float, default=1.0, help="Simulated mic playback speed")
+    parser.add_argument("--end-silence-ms", type=int, default=800, help="Silence that ends a mic turn")
+    parser.add_argument("--output", default="stt_benchmark.json", help="JSON results file")
+    parser.add_argument("--baseline", default=None, help="Earlier results to check for regressions")
+    parser.add_argument("--in-process", action="store_true",
+                        help="Run all paths in this process (faster, but peak memory is only exact for the first)")
+    parser.add_argument("--write-references", action="store_true",
+                        help="Draft missing reference transcripts with --model as clip.draft.txt and exit")
+    args = parser.parse_args(argv)
+
+    if args.write_references:
+        write_missing_references(args.corpus, args.model)
+        return 0
+
+    results = run_benchmark(args.corpus, args.model, args.paths, args.repeat, args.profile, args.quantized,
+                            args.short_utterance, args.threads, args.mic_speed, args.end_silence_ms,
+                            not args.in_process)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+
+    print(f"\n{'path':<8}{'RTF':>8}{'p50 s':>8}{'p95 s':>8}{'WER':>8}{'RSS MB':>9}")
+    for path_name, summary in results["summary"].items():
+        wer = f"{summary['wer']:.1%}" if summary["wer"] is not None else "-"
+        rss = summary["peak_rss_mb"] if summary["peak_rss_mb"] is not None else "-"
+        print(f"{path_name:<8}{summary['real_time_factor']:>8}{summary['latency_p50_seconds']:>8}"
+              f"{summary['latency_p95_seconds']:>8}{wer:>8}{rss:>9}")
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = find_regressions(json.load(f), results)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
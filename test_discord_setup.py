@@ -56,6 +56,407 @@ def test_bot_structure():
         print(f"❌ Bot structure test failed: {e}")
         return False
 
+def test_chat_history():
+    """Test that the chat history keeps its token count in sync and trims from the front"""
+    try:
+        from chat_history import ChatHistory, estimate_message_tokens
+        
+        system = {"role": "system", "content": "You are Pajama Sam."}
+        history = ChatHistory([system])
+        for i in range(20):
+            history.append({"role": "user", "content": f"Question number {i} " * 10})
+        
+        expected = sum(estimate_message_tokens(m) for m in history) + 2
+        if history.token_count != expected:
+            print(f"❌ Chat history token count {history.token_count} != {expected}")
+            return False
+        
+        to_drop = history.oldest_block_size(200)
+        if len(history) != 21 or to_drop == 0:
+            print("❌ Chat history planned an eviction by removing messages")
+            return False
+        
+        history.trim_to(200)
+        if history[0] != system or history.token_count > 200 or "19" not in history[-1]["content"]:
+            print("❌ Chat history trimming dropped the wrong messages")
+            return False
+        
+        print("✅ Chat history tracks tokens and trims the oldest messages first")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Chat history test failed: {e}")
+        return False
+
+class StubCompletions:
+    """Stands in for client.chat.completions: answers with a canned reply or fails"""
+    def __init__(self, reply="A short summary.", fail=False):
+        self.reply = reply
+        self.fail = fail
+        self.prompts = []
+        self.release = None  # Optional asyncio.Event the request waits for
+    
+    async def create(self, model, messages, **options):
+        from types import SimpleNamespace
+        self.prompts.append(messages[-1]["content"])
+        if self.release is not None:
+            await self.release.wait()
+        if self.fail:
+            raise RuntimeError("summary request failed")
+        message = SimpleNamespace(role="assistant", content=self.reply)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+def test_history_compaction():
+    """Test that old turns are folded into the pinned summary, and retried if summarizing fails"""
+    try:
+        import asyncio
+        from types import SimpleNamespace
+        os.environ.setdefault("OPENAI_API_KEY", "test")
+        from openai_chat import AsyncOpenAiManager, SUMMARY_PREFIX
+        
+        def new_manager(completions):
+            manager = AsyncOpenAiManager(summarize_after_tokens=400)
+            manager._client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+            manager._client_loop = asyncio.get_running_loop()
+            manager.chat_history.append({"role": "system", "content": "You are Pajama Sam."})
+            for i in range(10):
+                manager.chat_history.append({"role": "user", "content": f"Question {i} " * 10})
+                manager.chat_history.append({"role": "assistant", "content": f"Answer {i} " * 10})
+            return manager
+        
+        async def succeed():
+            manager = new_manager(StubCompletions())
+            tokens_before = manager.chat_history.token_count
+            manager._schedule_compaction()
+            await manager.compaction_task
+            history = manager.chat_history
+            return (history.pinned_message == {"role": "system", "content": SUMMARY_PREFIX + "A short summary."}
+                    and history.token_count < tokens_before and history[2]["role"] == "user"
+                    and manager.last_request_stats == {})
+        
+        async def fail_then_retry():
+            completions = StubCompletions(fail=True)
+            completions.release = asyncio.Event()
+            manager = new_manager(completions)
+            manager._schedule_compaction()
+            await asyncio.sleep(0)
+            # The token limit drops the two oldest messages while the summary is in flight
+            dropped = [manager.chat_history.pop_oldest(), manager.chat_history.pop_oldest()]
+            completions.release.set()
+            await manager.compaction_task
+            if manager.chat_history.pinned_message is not None or manager.unsummarized != dropped:
+                return False
+            
+            # The next attempt covers the dropped messages too
+            completions.fail = False
+            manager._schedule_compaction()
+            await manager.compaction_task
+            return (dropped[0]["content"] in completions.prompts[-1] and not manager.unsummarized
+                    and manager.chat_history.pinned_message is not None)
+        
+        if not asyncio.run(succeed()):
+            print("❌ Chat history compaction did not swap the summary in")
+            return False
+        if not asyncio.run(fail_then_retry()):
+            print("❌ Chat history compaction lost messages after a failed summary")
+            return False
+        
+        print("✅ Old chat turns are summarized in the background and retried on failure")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Chat history compaction test failed: {e}")
+        return False
+
+def test_sentence_splitting():
+    """Test that streamed text is split into finished sentences for TTS"""
+    try:
+        from openai_chat import split_complete_sentences
+        
+        cases = [
+            # Abbreviations don't end a sentence
+            ("We asked Dr. Elgrin about the lunchbox. Then", ["We asked Dr. Elgrin about the lunchbox."], "Then"),
+            # Sentences under min_chars are joined onto the next one
+            ("Oh no! The trees took my flashlight. And", ["Oh no! The trees took my flashlight."], "And"),
+            # Closing quotes stay with their sentence
+            ('He yelled "Babaga-BOOSH!" Then he ran away.', ['He yelled "Babaga-BOOSH!"'], "Then he ran away."),
+            # Line breaks end a sentence even without punctuation
+            ("First line of the list\nSecond line", ["First line of the list"], "Second line"),
+            # Nothing is finished until punctuation is followed by whitespace
+            ("The darkness is scary.", [], "The darkness is scary."),
+        ]
+        for text, expected_sentences, expected_rest in cases:
+            sentences, rest = split_complete_sentences(text)
+            if sentences != expected_sentences or rest != expected_rest:
+                print(f"❌ Split {text!r} into {sentences} + {rest!r}")
+                return False
+        
+        if split_complete_sentences("Hi there. I am Sam. ", min_chars=5)[0] != ["Hi there.", "I am Sam."]:
+            print("❌ Sentence splitting ignored min_chars")
+            return False
+        
+        print("✅ Streamed answers are split into complete sentences")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Sentence splitting test failed: {e}")
+        return False
+
+def test_chat_memory():
+    """Test that the chat memory index recalls the relevant old exchange"""
+    try:
+        from chat_memory import ChatMemoryIndex
+        
+        memory = ChatMemoryIndex(path=None)
+        memory.add_exchange("Where is my lunchbox?", "The customs trees took it to the swamp.")
+        for i in range(10):
+            memory.add_exchange(f"Tell me joke number {i}", "Why did the darkness cross the road?")
+        
+        results = memory.search("Did the trees give my lunchbox back?", top_k=1)
+        if not results or "lunchbox" not in results[0][1]:
+            print(f"❌ Chat memory recalled the wrong exchange: {results}")
+            return False
+        
+        # Recalled exchanges count towards the prompt budget like the rest of the history
+        os.environ.setdefault("OPENAI_API_KEY", "test")
+        from openai_chat import AsyncOpenAiManager, MAX_HISTORY_TOKENS, RECALL_PREFIX, num_tokens_from_messages
+        manager = AsyncOpenAiManager(memory_index=memory, summarize_after_tokens=None, memory_max_tokens=2000,
+                                     history_target_tokens=MAX_HISTORY_TOKENS - 50)
+        memory.add_exchange("Tell me about the lunchbox again", "The lunchbox " * 500)
+        manager.chat_history.append({"role": "system", "content": "You are Pajama Sam."})
+        while manager.chat_history.token_count < MAX_HISTORY_TOKENS - 20:
+            manager.chat_history.append({"role": "user", "content": "Filler question " * 20})
+            manager.chat_history.append({"role": "assistant", "content": "Filler answer " * 20})
+        messages = manager._history_with({"role": "user", "content": "Where is my lunchbox?"})
+        if not messages[-2]["content"].startswith(RECALL_PREFIX) or num_tokens_from_messages(messages) > MAX_HISTORY_TOKENS:
+            print(f"❌ Prompt with recalled exchanges uses {num_tokens_from_messages(messages)} tokens")
+            return False
+        
+        print("✅ Chat memory recalls relevant old exchanges")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Chat memory test failed: {e}")
+        return False
+
+def test_response_cache():
+    """Test that the response cache keys on the whole request and expires entries"""
+    try:
+        import time
+        from response_cache import ResponseCache
+        
+        cache = ResponseCache(ttl_seconds=0.05)
+        messages = [{"role": "user", "content": "What is 2 + 2?"}]
+        cache.put(ResponseCache.make_key("gpt-4o", messages), "Four")
+        
+        if cache.get(ResponseCache.make_key("gpt-4o", messages)) != "Four":
+            print("❌ Response cache missed an identical request")
+            return False
+        if cache.get(ResponseCache.make_key("gpt-4o-mini", messages)) is not None:
+            print("❌ Response cache ignored the model")
+            return False
+        time.sleep(0.1)
+        if cache.get(ResponseCache.make_key("gpt-4o", messages)) is not None:
+            print("❌ Response cache returned an expired answer")
+            return False
+
+        import os
+        import tempfile
+        with tempfile.TemporaryDirectory() as cache_dir:
+            disk_cache = ResponseCache(ttl_seconds=0.05, cache_dir=cache_dir)
+            key = ResponseCache.make_key("gpt-4o", messages)
+            disk_cache.put(key, "Four")
+            disk_cache.put(key, "Four, definitely")
+            on_disk = sum(os.path.getsize(os.path.join(cache_dir, name)) for name in os.listdir(cache_dir))
+            if disk_cache.disk_bytes != on_disk:
+                print(f"❌ Response cache tracks {disk_cache.disk_bytes} disk bytes after an overwrite, {on_disk} are used")
+                return False
+            time.sleep(0.1)
+            disk_cache.memory.clear()
+            if disk_cache.get(key) is not None:
+                print("❌ Response cache returned an expired answer from disk")
+                return False
+            if os.listdir(cache_dir) or disk_cache.disk_bytes != 0:
+                print(f"❌ Expired disk entry left {disk_cache.disk_bytes} bytes accounted")
+                return False
+
+        print(f"✅ Response cache works ({cache.hits} hit, {cache.misses} misses)")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Response cache test failed: {e}")
+        return False
+
+def test_chat_single_flight():
+    """Test that identical concurrent chat() calls share one request and are counted once"""
+    try:
+        import asyncio
+        from types import SimpleNamespace
+        os.environ.setdefault("OPENAI_API_KEY", "test")
+        from openai_chat import AsyncOpenAiManager
+        
+        async def ask_together(callers):
+            completions = StubCompletions(reply="Four.")
+            completions.release = asyncio.Event()
+            manager = AsyncOpenAiManager()
+            manager._client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+            manager._client_loop = asyncio.get_running_loop()
+            
+            asks = [asyncio.ensure_future(manager.chat("What is 2 + 2?")) for _ in range(callers)]
+            await asyncio.sleep(0)
+            completions.release.set()
+            answers = await asyncio.gather(*asks)
+            await manager.chat("What is 2 + 2?")  # Answered from the cache afterwards
+            return manager, completions, answers
+        
+        callers = 5
+        manager, completions, answers = asyncio.run(ask_together(callers))
+        cache = manager.response_cache
+        if len(completions.prompts) != 1 or answers != ["Four."] * callers:
+            print(f"❌ {callers} identical questions sent {len(completions.prompts)} requests")
+            return False
+        if manager.coalesced_requests != callers - 1 or cache.misses != 1 or cache.hits != 1:
+            print(f"❌ Single-flight counters are off: {manager.coalesced_requests} coalesced, "
+                  f"{cache.misses} misses, {cache.hits} hits")
+            return False
+        
+        print(f"✅ {callers} identical questions shared one request")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Chat single-flight test failed: {e}")
+        return False
+
+def test_streamed_reply():
+    """Test that a streamed reply frees its request slot once read and that playback problems don't hang it"""
+    try:
+        import asyncio
+        import threading
+        from types import SimpleNamespace
+        os.environ.setdefault("OPENAI_API_KEY", "test")
+        from openai_chat import AsyncOpenAiManager
+        from streaming_speech import StreamingSpeechManager
+        
+        class StubStreamCompletions:
+            async def create(self, model, messages, stream=False, **options):
+                async def chunks():
+                    for text in ["Hello there, traveler. ", "The trees are ", "talking again. ", "Run!"]:
+                        delta = SimpleNamespace(role=None, content=text)
+                        yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None)
+                return chunks()
+        
+        async def slow_listener():
+            manager = AsyncOpenAiManager(max_concurrent_requests=1, use_response_cache=False)
+            manager._client = SimpleNamespace(chat=SimpleNamespace(completions=StubStreamCompletions()))
+            manager._client_loop = asyncio.get_running_loop()
+            sentences = manager.chat_with_history_streamed("Tell me about the forest.")
+            spoken = [await sentences.__anext__()]
+            await asyncio.sleep(0.05)  # The first sentence is still playing
+            slot_free = not manager.request_slots.locked()
+            spoken += [sentence async for sentence in sentences]
+            return slot_free, spoken, manager.chat_history[-1]["content"]
+        
+        slot_free, spoken, answer = asyncio.run(slow_listener())
+        if not slot_free or len(spoken) != 3 or answer != "Hello there, traveler. The trees are talking again. Run!":
+            print(f"❌ Streamed reply held its request slot while speaking or lost text: {spoken}")
+            return False
+        
+        class StubTts:
+            def text_to_audio(self, text, voice, save_as_wave):
+                return None if text == "silent" else text
+        
+        class StubAudio:
+            def __init__(self, fail_on):
+                self.fail_on = fail_on
+                self.played = []
+            def play_audio(self, file_path, sleep_during_playback, delete_file, play_using_music):
+                if file_path == self.fail_on:
+                    raise RuntimeError("audio device went away")
+                self.played.append(file_path)
+        
+        closed = threading.Event()
+        def reply(count):
+            try:
+                for i in range(count):
+                    yield f"sentence {i}"
+            finally:
+                closed.set()
+        
+        # A sentence that fails to play is skipped
+        audio = StubAudio(fail_on="sentence 1")
+        spoken = StreamingSpeechManager(StubTts(), audio).speak(reply(4))
+        if audio.played != ["sentence 0", "sentence 2", "sentence 3"] or spoken != "sentence 0 sentence 2 sentence 3":
+            print(f"❌ A playback error stopped the reply: {audio.played}")
+            return False
+        
+        # An error in the caller stops synthesis and closes the reply instead of leaving it blocked
+        closed.clear()
+        def fail():
+            raise RuntimeError("OBS is not running")
+        try:
+            StreamingSpeechManager(StubTts(), StubAudio(fail_on=None), max_pending=1).speak(reply(100), on_first_audio=fail)
+            print("❌ Error in the speech caller was swallowed")
+            return False
+        except RuntimeError:
+            pass
+        if not closed.is_set() or any(thread.name == "tts-synthesize" for thread in threading.enumerate()):
+            print("❌ The reply was left open after the speaker failed")
+            return False
+        
+        print("✅ Streamed replies free their request slot once read and survive playback errors")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Streamed reply test failed: {e}")
+        return False
+
+def test_async_manager_close():
+    """Test that aclose() closes the shared connection pool and that other managers open a new one"""
+    try:
+        import asyncio
+        import httpx
+        os.environ.setdefault("OPENAI_API_KEY", "test")
+        import openai_chat
+        from openai_chat import AsyncOpenAiManager
+        
+        def mock_pool(requests):
+            def answer(request):
+                requests.append(request.url.path)
+                return httpx.Response(200, json={
+                    "id": "chatcmpl-test", "object": "chat.completion", "created": 0, "model": "gpt-4o",
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": "Four."}}],
+                })
+            return httpx.AsyncClient(transport=httpx.MockTransport(answer))
+        
+        async def close_one():
+            loop = asyncio.get_running_loop()
+            first_requests, second_requests = [], []
+            openai_chat._http_clients[loop] = mock_pool(first_requests)
+            closing, other = AsyncOpenAiManager(use_response_cache=False), AsyncOpenAiManager(use_response_cache=False)
+            await closing.chat("What is 2 + 2?")
+            await other.chat("What is 3 + 1?")
+            pool = openai_chat._http_clients[loop]
+            await closing.aclose()
+            if not pool.is_closed or loop in openai_chat._http_clients or len(first_requests) != 2:
+                return False
+            
+            openai_chat._http_clients[loop] = mock_pool(second_requests)
+            answer = await other.chat("What is 1 + 3?")
+            await other.aclose()
+            return answer == "Four." and len(second_requests) == 1 and loop not in openai_chat._http_clients
+        
+        if not asyncio.run(close_one()):
+            print("❌ aclose() left the connection pool open or broke the other managers")
+            return False
+        
+        print("✅ Closing a manager closes the shared connection pool")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Async manager close test failed: {e}")
+        return False
+
 def main():
     print("🧪 Testing Discord Bot Setup")
     print("=" * 40)
@@ -64,10 +465,19 @@ def main():
     discord_ok = test_discord_imports()
     core_ok = test_core_modules()
     structure_ok = test_bot_structure()
+    history_ok = test_chat_history()
+    compaction_ok = test_history_compaction()
+    sentences_ok = test_sentence_splitting()
+    memory_ok = test_chat_memory()
+    response_cache_ok = test_response_cache()
+    single_flight_ok = test_chat_single_flight()
+    streamed_ok = test_streamed_reply()
+    close_ok = test_async_manager_close()
     
     print("\n" + "=" * 40)
     
-    if discord_ok and core_ok and structure_ok:
+    if (discord_ok and core_ok and structure_ok and history_ok and compaction_ok and sentences_ok and memory_ok
+            and response_cache_ok and single_flight_ok and streamed_ok and close_ok):
         print("🎉 All tests passed! Discord bot is ready to run.")
         print("\n📋 Next steps:")
         print("1. Set up your Discord bot token: DISCORD_BOT_TOKEN")
@@ -24,12 +24,65 @@ def test_whisper_initialization():
         from whisper_speech_to_text import SpeechToTextManager
         print("Initializing Whisper model (this may take a moment)...")
         manager = SpeechToTextManager(model_size="base")  # Use base model for balance
+        manager.model  # The model loads in the background; wait for it here
         print("✅ Whisper model initialized successfully!")
         return manager
     except Exception as e:
         print(f"❌ Whisper initialization failed: {e}")
         return None
 
+def test_model_registry(manager):
+    """Test that each model is loaded once, off the calling thread, and shared by every caller"""
+    try:
+        import threading
+        import time
+        import whisper_model_registry
+        from concurrent.futures import ThreadPoolExecutor
+        from whisper_model_registry import WhisperModelRegistry, get_whisper_model
+
+        model_size = manager.model_handle.model_size
+        if get_whisper_model(model_size, warm_up=False) is not manager.model_handle:
+            print("❌ A second manager would load its own copy of the model")
+            return False
+
+        loads = []
+        load_model = whisper_model_registry.whisper.load_model
+        def slow_load(*args, **kwargs):
+            loads.append(threading.current_thread().name)
+            time.sleep(0.5)
+            return load_model(*args, **kwargs)
+
+        registry = WhisperModelRegistry()
+        whisper_model_registry.whisper.load_model = slow_load
+        try:
+            start_time = time.time()
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                handles = list(pool.map(lambda _: registry.get(model_size, "cpu", warm_up=False), range(4)))
+            waited = time.time() - start_time
+            ready_early = handles[0].is_ready()
+            handles[0].model
+            half = registry.get(model_size, "cpu", "float16", warm_up=False)
+            half.model
+        finally:
+            whisper_model_registry.whisper.load_model = load_model
+
+        if any(handle is not handles[0] for handle in handles) or len(loads) != 2:
+            print(f"❌ Concurrent callers got {len(set(map(id, handles)))} handles and {len(loads)} loads")
+            return False
+        if waited > 0.4 or ready_early or not all(name.startswith("whisper-load") for name in loads):
+            print("❌ get() waited for the model instead of loading it in the background")
+            return False
+        if half is handles[0] or not handles[0].is_ready():
+            print("❌ Handles aren't keyed by dtype or never became ready")
+            return False
+
+        print("✅ Model registry loads each model once in the background and shares it")
+        return True
+
+    except Exception as e:
+        print(f"❌ Model registry test failed: {e}")
+        return False
+
 def test_file_processing(manager):
     """Test file-based speech recognition"""
     try:
@@ -74,6 +127,514 @@ def test_file_processing(manager):
         print(f"❌ File processing test failed: {e}")
         return False
 
+def test_pcm_input(manager):
+    """Test that Discord-style PCM reaches the model as 16kHz mono float32 without a temp file"""
+    try:
+        import io
+        import wave
+        import whisper_speech_to_text
+
+        # One second of 48kHz stereo: a 440Hz tone on the left, silence on the right, plus a partial frame
+        t = np.arange(48000) / 48000
+        left = (0.5 * 32767 * np.sin(2 * np.pi * 440 * t)).astype(np.int16)
+        stereo = np.stack([left, np.zeros_like(left)], axis=1)
+        pcm = stereo.tobytes() + b"\x01"
+
+        # The same tone as a 44.1kHz mono WAV, whose header overrides the given format
+        wav_bytes = io.BytesIO()
+        with wave.open(wav_bytes, "wb") as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(44100)
+            tone = 0.25 * 32767 * np.sin(2 * np.pi * 440 * np.arange(44100) / 44100)
+            wav_file.writeframes(tone.astype(np.int16).tobytes())
+
+        received = []
+        def fake_transcribe(audio, **options):
+            received.append(audio)
+            return "pcm"
+        def no_temp_files(*args, **kwargs):
+            raise AssertionError("PCM input was written to a temp file")
+
+        manager._transcribe_audio = fake_transcribe
+        named_temporary_file = whisper_speech_to_text.tempfile.NamedTemporaryFile
+        whisper_speech_to_text.tempfile.NamedTemporaryFile = no_temp_files
+        try:
+            results = [manager.speechtotext_from_pcm(pcm, 48000, 2),
+                       manager.speechtotext_from_pcm(wav_bytes.getvalue(), 48000, 2)]
+        finally:
+            whisper_speech_to_text.tempfile.NamedTemporaryFile = named_temporary_file
+            del manager._transcribe_audio
+
+        if results != ["pcm", "pcm"] or len(received) != 2:
+            print(f"❌ PCM input wasn't transcribed: {results}")
+            return False
+        for audio in received:
+            spectrum = np.abs(np.fft.rfft(audio))
+            peak_hz = np.argmax(spectrum) * manager.sample_rate / len(audio)
+            amplitude = np.sqrt(2 * np.mean(audio[1000:-1000] ** 2))
+            if (audio.dtype != np.float32 or audio.ndim != 1 or len(audio) != manager.sample_rate
+                    or abs(peak_hz - 440) > 2 or abs(amplitude - 0.25) > 0.01):
+                print(f"❌ PCM became {audio.dtype} {audio.shape}, {peak_hz:.0f}Hz at amplitude {amplitude:.2f}")
+                return False
+
+        print("✅ PCM input is converted to 16kHz mono float32 in memory")
+        return True
+
+    except Exception as e:
+        print(f"❌ PCM input test failed: {e}")
+        return False
+
+def test_batch_transcribe(manager):
+    """Test that the batch CLI writes one JSONL result per audio file and reports bad files"""
+    try:
+        import json
+        import shutil
+        import batch_transcribe
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            os.makedirs(os.path.join(temp_dir, "nested"))
+            shutil.copy("TestAudio_WAV.wav", os.path.join(temp_dir, "first.wav"))
+            shutil.copy("TestAudio_WAV.wav", os.path.join(temp_dir, "nested", "second.wav"))
+            with open(os.path.join(temp_dir, "broken.mp3"), "wb") as file:
+                file.write(b"not audio")
+            with open(os.path.join(temp_dir, "notes.txt"), "w") as file:
+                file.write("not a recording")
+            output = os.path.join(temp_dir, "transcripts.jsonl")
+
+            exit_code = batch_transcribe.main([temp_dir, "--output", output, "--workers", "1",
+                                               "--model", manager.model_handle.model_size, "--language", "en"])
+            with open(output, encoding="utf-8") as file:
+                results = {os.path.basename(result["file"]): result for result in map(json.loads, file)}
+            empty_exit_code = batch_transcribe.main([os.path.join(temp_dir, "nested", "*.flac")])
+
+        if exit_code != 0 or sorted(results) != ["broken.mp3", "first.wav", "second.wav"]:
+            print(f"❌ Batch CLI exited with {exit_code} and wrote results for {sorted(results)}")
+            return False
+        first, second, broken = results["first.wav"], results["second.wav"], results["broken.mp3"]
+        if "error" in first or first["text"] != second["text"] or first["duration"] <= 0:
+            print(f"❌ Identical files got different results: {first} {second}")
+            return False
+        if "error" not in broken or empty_exit_code != 1:
+            print("❌ Bad files or an empty source weren't reported")
+            return False
+
+        print("✅ Batch CLI writes one result per file and reports files it can't decode")
+        return True
+
+    except Exception as e:
+        print(f"❌ Batch transcription CLI test failed: {e}")
+        return False
+
+def test_decode_profiles(manager):
+    """Test that decoding profiles produce the expected options and per-call options override them"""
+    try:
+        realtime = manager.decode_options("realtime")
+        if (realtime["language"] != manager.language or realtime["beam_size"] is not None
+                or realtime["temperature"] != (0.0, 0.4) or not realtime["without_timestamps"]
+                or realtime["fp16"] != manager.model_handle.fp16):
+            print(f"❌ Unexpected realtime decode options: {realtime}")
+            return False
+        
+        accurate = manager.decode_options("accurate")
+        if "language" in accurate or accurate["beam_size"] != 5 or len(accurate["temperature"]) != 6:
+            print(f"❌ Unexpected accurate decode options: {accurate}")
+            return False
+        
+        # Capture what reaches model.transcribe instead of decoding
+        model = manager.model
+        received = {}
+        def fake_transcribe(audio, **options):
+            received.update(options)
+            return {"text": "override"}
+        model.transcribe, cache, manager.cache = fake_transcribe, manager.cache, None
+        try:
+            manager._transcribe_audio(np.zeros(16000, dtype=np.float32), profile="accurate", beam_size=2)
+        finally:
+            del model.transcribe
+            manager.cache = cache
+        if received.get("beam_size") != 2 or received.get("best_of") != 5:
+            print(f"❌ Per-call options did not override the profile: {received}")
+            return False
+        
+        # Realtime turns only drop timestamp tokens while they fit in one 30s window
+        without_timestamps = {}
+        model.transcribe, manager.cache = fake_transcribe, None
+        try:
+            for seconds in (20, 35):
+                received.clear()
+                manager._transcribe_audio(np.full(seconds * 16000, 0.1, dtype=np.float32), profile="realtime")
+                without_timestamps[seconds] = received.get("without_timestamps")
+        finally:
+            del model.transcribe
+            manager.cache = cache
+        if without_timestamps != {20: True, 35: False}:
+            print(f"❌ Realtime timestamp setting by clip length: {without_timestamps}")
+            return False
+        
+        print("✅ Decoding profiles and per-call overrides work")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Decoding profile test failed: {e}")
+        return False
+
+def test_short_utterance(manager):
+    """Test that the short utterance path rejects what it can't handle and leaves the shared model alone"""
+    try:
+        import whisper_speech_to_text
+        from short_utterance import transcribe_short_utterance
+        
+        model = manager.model
+        dims = model.dims
+        n_audio_ctx = dims.n_audio_ctx
+        rng = np.random.RandomState(0)
+        short_clip = (0.1 * rng.randn(2 * 16000)).astype(np.float32)
+        long_clip = (0.1 * rng.randn(29 * 16000)).astype(np.float32)
+        
+        # Too long for a shorter context, or not confident enough: the caller must use the full window
+        if transcribe_short_utterance(model, long_clip) is not None:
+            print("❌ Short utterance path accepted a clip that needs the full window")
+            return False
+        if transcribe_short_utterance(model, short_clip, min_avg_logprob=1.0) is not None:
+            print("❌ Short utterance path accepted a low confidence result")
+            return False
+        # The decode uses a shallow copy with a shorter context; the shared model must keep its own
+        if model.dims is not dims or model.dims.n_audio_ctx != n_audio_ctx:
+            print("❌ Short utterance path changed the shared model's dims")
+            return False
+        
+        # When the fast path gives up, the manager decodes with the full 30s window
+        full_window_calls = []
+        def fake_transcribe(audio, **options):
+            full_window_calls.append(len(audio))
+            return {"text": "full window"}
+        original = whisper_speech_to_text.transcribe_short_utterance
+        whisper_speech_to_text.transcribe_short_utterance = lambda *args, **kwargs: None
+        model.transcribe, cache, manager.cache = fake_transcribe, manager.cache, None
+        manager.short_utterance_mode = True
+        try:
+            result = manager._transcribe_audio(short_clip, profile="realtime")
+        finally:
+            whisper_speech_to_text.transcribe_short_utterance = original
+            del model.transcribe
+            manager.cache = cache
+            manager.short_utterance_mode = False
+        if result != "full window" or full_window_calls != [len(short_clip)]:
+            print("❌ Manager did not fall back to the full window")
+            return False
+        
+        print("✅ Short utterance path falls back to the full window when it should")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Short utterance test failed: {e}")
+        return False
+
+def test_batched_transcription(manager):
+    """Test that batched decoding matches clip-by-clip decoding, also while a long clip decodes alongside"""
+    try:
+        import threading
+        from audio_decoding import load_audio_file
+        from batched_transcription import BatchedTranscriber
+        
+        speech = load_audio_file("TestAudio_WAV.wav")
+        clips = [speech[start:start + 3 * 16000] for start in (0, 16000, 2 * 16000)]
+        batcher = BatchedTranscriber(manager.model_handle, language=manager.language, max_wait_ms=200)
+        sequential = [batcher._decode_batch([clip])[0] for clip in clips]
+        
+        # Clips over 30 seconds skip the batcher and decode on the same model from another thread
+        long_clip = np.tile(speech, int(np.ceil(35 * 16000 / len(speech))))[:35 * 16000]
+        long_options = dict(manager.decode_options("realtime"), temperature=0.0)
+        expected_long = manager.model.transcribe(long_clip, **long_options)["text"]
+        long_result = {}
+        def decode_long():
+            with manager.model_handle.decode_lock:
+                long_result["text"] = manager.model.transcribe(long_clip, **long_options)["text"]
+        long_thread = threading.Thread(target=decode_long)
+        long_thread.start()
+        futures = [batcher.submit(clip) for clip in clips]
+        batched = [future.result(timeout=300) for future in futures]
+        long_thread.join()
+        
+        if batched != sequential:
+            print(f"❌ Batched results {batched} differ from sequential {sequential}")
+            return False
+        if long_result.get("text") != expected_long:
+            print("❌ A long clip decoded alongside a batch came out differently")
+            return False
+        
+        # A silent clip gets the hallucination-prone result whisper's transcribe() would skip
+        from types import SimpleNamespace
+        import batched_transcription
+        silence = np.zeros(2 * 16000, dtype=np.float32)
+        hallucination = SimpleNamespace(text=" Thank you.", no_speech_prob=0.95, avg_logprob=-1.4,
+                                        compression_ratio=0.9)
+        decode = batched_transcription.whisper.decode
+        batched_transcription.whisper.decode = lambda model, mel, options: [hallucination] * len(mel)
+        try:
+            silent_text = batcher.transcribe(silence)
+        finally:
+            batched_transcription.whisper.decode = decode
+        if silent_text != "":
+            print(f"❌ Batched transcription of silence returned {silent_text!r}")
+            return False
+        
+        print("✅ Batched transcription matches sequential transcription")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Batched transcription test failed: {e}")
+        return False
+
+def test_streaming_transcription(manager):
+    """Test that streaming decodes finished segments while recording, leaving only the tail"""
+    try:
+        import threading
+        import time
+
+        recorder = manager.recorder
+        fed = []
+
+        class FeedingStream:
+            """Plays five seconds of distinct samples through the recorder callback, then ends the turn"""
+            def __init__(self, callback, **options):
+                self.callback = callback
+                self.thread = None
+            def start(self):
+                self.thread = threading.Thread(target=self._feed, daemon=True)
+                self.thread.start()
+            def _feed(self):
+                for i in range(50):
+                    block = (np.arange(i * 1600, (i + 1) * 1600, dtype=np.float32) % 997) * 1e-4
+                    fed.append(block)
+                    self.callback(block.reshape(-1, 1), len(block), None, None)
+                    time.sleep(0.05)
+                manager.stop_recording()
+            def stop(self):
+                pass
+            def close(self):
+                pass
+
+        decoded = []
+        def fake_transcribe(audio, **options):
+            decoded.append((audio.copy(), manager.is_recording))
+            return f"segment{len(decoded)}"
+
+        settings = (manager.streaming_segment_seconds, manager.streaming_max_segment_seconds, manager.vad)
+        stream_factory, recorder.stream_factory = recorder.stream_factory, FeedingStream
+        manager.streaming_segment_seconds, manager.streaming_max_segment_seconds, manager.vad = 1.0, 2.0, None
+        manager._transcribe_audio = fake_transcribe
+        try:
+            result = manager.speechtotext_from_mic_continuous(stop_key=None, streaming=True)
+        finally:
+            del manager._transcribe_audio
+            recorder.stream_factory = stream_factory
+            manager.streaming_segment_seconds, manager.streaming_max_segment_seconds, manager.vad = settings
+
+        segments = [audio for audio, _ in decoded]
+        if not decoded or not np.array_equal(np.concatenate(segments), np.concatenate(fed)):
+            print("❌ Streaming segments don't add up to the recorded audio")
+            return False
+        if not any(recording for _, recording in decoded[:-1]):
+            print("❌ No segment was transcribed while recording")
+            return False
+        if decoded[-1][1] or len(segments[-1]) > 2 * manager.sample_rate:
+            print(f"❌ {len(segments[-1]) / manager.sample_rate:.1f}s were left to decode after the turn")
+            return False
+        if result != " ".join(f"segment{i + 1}" for i in range(len(decoded))):
+            print(f"❌ Streaming result {result!r} doesn't join the segment transcripts")
+            return False
+
+        print(f"✅ Streaming decoded {len(decoded) - 1} segments while recording, "
+              f"{len(segments[-1]) / manager.sample_rate:.1f}s after the turn")
+        return True
+
+    except Exception as e:
+        print(f"❌ Streaming transcription test failed: {e}")
+        return False
+
+def test_speculation(manager):
+    """Test that a speculative transcription is only used if nothing was said after the pause"""
+    try:
+        from voice_activity import VoiceActivityDetector
+        
+        t = np.arange(16000) / 16000
+        speech = (0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+        pause = np.zeros(8000, dtype=np.float32)
+        captured = np.concatenate([speech, pause])
+        
+        decoded = []
+        def fake_transcribe(audio, **options):
+            decoded.append(len(audio))
+            return "speculated"
+        manager._transcribe_audio, vad, manager.vad = fake_transcribe, manager.vad, VoiceActivityDetector()
+        try:
+            # Only silence after the pause: the speculation is the answer
+            manager._speculate(captured, streaming=False)
+            manager.speculation["future"].result()
+            manager._speculate(np.concatenate([captured, pause]), streaming=False)  # Nothing new to speculate on
+            if len(decoded) != 1:
+                print("❌ Speculated again although nobody spoke since the last pause")
+                return False
+            if manager._take_speculation(np.concatenate([captured, pause]), 0, None) != "speculated":
+                print("❌ Speculation was discarded although only silence followed it")
+                return False
+            
+            # Speech after the pause: the speculation covers too little audio
+            manager._speculate(captured, streaming=False)
+            if manager._take_speculation(np.concatenate([captured, speech]), 0, None) is not None:
+                print("❌ Speculation was used although more speech followed it")
+                return False
+            
+            # A speculation made for different streaming state doesn't apply either
+            manager._speculate(captured, streaming=False)
+            if manager._take_speculation(captured, 16000, "earlier text") is not None:
+                print("❌ Speculation was used for a different part of the recording")
+                return False
+        finally:
+            del manager._transcribe_audio
+            manager.vad = vad
+            manager.speculation = None
+        
+        # A discarded speculation stops decoding, so the final decode doesn't wait for it
+        import threading
+        import time
+        decoding = threading.Event()
+        def slow_step(module, inputs):
+            decoding.set()
+            time.sleep(0.05)
+        slow_hook = manager.model.decoder.register_forward_pre_hook(slow_step)
+        cache, manager.cache = manager.cache, None
+        manager.vad = VoiceActivityDetector()
+        try:
+            manager._speculate(captured, streaming=False)
+            decoding.wait(60)
+            manager._take_speculation(np.concatenate([captured, speech]), 0, None)
+            start_time = time.time()
+            with manager.model_handle.decode_lock:
+                waited = time.time() - start_time
+        finally:
+            slow_hook.remove()
+            manager.cache = cache
+            manager.vad = vad
+            manager.speculation = None
+        if waited > 1.0:
+            print(f"❌ The final decode waited {waited:.1f}s for a discarded speculation")
+            return False
+        
+        print("✅ Speculative transcriptions are only used when nothing was said after the pause")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Speculation test failed: {e}")
+        return False
+
+def test_quantization(manager):
+    """Test that the int8 model is rebuilt from its cached state_dict and decodes like the fresh one"""
+    try:
+        import torch
+        import whisper
+        import whisper_quantization
+        from audio_decoding import load_audio_file
+        
+        model_size = manager.model_handle.model_size
+        audio = load_audio_file("TestAudio_WAV.wav")
+        mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(audio)).unsqueeze(0)
+        cache_dir = whisper_quantization.QUANTIZED_CACHE_DIR
+        with tempfile.TemporaryDirectory() as temp_dir:
+            whisper_quantization.QUANTIZED_CACHE_DIR = temp_dir
+            try:
+                fresh = whisper_quantization.load_quantized_model(model_size)
+                cached = whisper_quantization.load_quantized_model(model_size)
+                # The cache must load without unpickling arbitrary objects
+                torch.load(whisper_quantization._cache_path(model_size), weights_only=True)
+            finally:
+                whisper_quantization.QUANTIZED_CACHE_DIR = cache_dir
+        
+        quantized_layers = [module for module in cached.modules()
+                            if isinstance(module, torch.ao.nn.quantized.dynamic.Linear)]
+        with torch.no_grad():
+            same_features = torch.equal(fresh.encoder(mel), cached.encoder(mel))
+        if not quantized_layers or not same_features:
+            print("❌ The cached int8 model differs from the one it was saved from")
+            return False
+        
+        print(f"✅ Quantized model is cached as a state_dict ({len(quantized_layers)} int8 layers)")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Quantization test failed: {e}")
+        return False
+
+def test_wake_word(manager):
+    """Test that a wake phrase starts a turn and nothing said while it is being confirmed is lost"""
+    try:
+        import threading
+        from wake_word import WakeWordManager
+        
+        class SilentStream:
+            """The test feeds blocks through the recorder callback itself"""
+            def __init__(self, **options):
+                pass
+            def start(self):
+                pass
+            def stop(self):
+                pass
+            def close(self):
+                pass
+        
+        recorder = manager.recorder
+        stream_factory, recorder.stream_factory = recorder.stream_factory, SilentStream
+        wake_word = WakeWordManager(manager, pause_ms=100)
+        
+        # Every sample is distinct, so the recording can be matched sample for sample
+        samples = iter(np.arange(1, 10 ** 6, dtype=np.float32))
+        def feed(blocks, loud):
+            fed = []
+            for _ in range(blocks):
+                block = np.array([next(samples) for _ in range(1600)], dtype=np.float32) * 1e-6
+                block += 0.5 if loud else 0.0
+                recorder._callback(block.reshape(-1, 1), len(block), None, None)
+                fed.append(block)
+            return np.concatenate(fed)
+        
+        # The detector is slow: a second of speech arrives while it runs
+        during_check = []
+        def slow_detect(audio):
+            during_check.append(feed(10, loud=True))
+            return "hey sam"
+        wake_word._detect = slow_detect
+        
+        try:
+            wake_word.start()
+            with wake_word.window_lock:
+                wake_word.window.clear()
+            wake_word.armed = True
+            feed(8, loud=True)   # "hey sam"
+            feed(2, loud=False)  # The pause that triggers the check
+            if not wake_word.turn_started.wait(10):
+                print("❌ The wake phrase did not start a turn")
+                return False
+            wake_word.turn_started.clear()
+            after_check = feed(5, loud=True)
+            recorded = recorder.stop().copy()
+        finally:
+            wake_word.stop()
+            recorder.stream_factory = stream_factory
+        
+        expected = np.concatenate([during_check[0], after_check])
+        if not np.array_equal(recorded, expected):
+            print(f"❌ Wake word turn recorded {len(recorded)} samples, expected the {len(expected)} after the phrase")
+            return False
+        
+        print("✅ Wake word turns keep what was said while the phrase was checked")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Wake word test failed: {e}")
+        return False
+
 def test_interface_compatibility():
     """Test that all expected methods exist with correct signatures"""
     try:
@@ -101,6 +662,280 @@ def test_interface_compatibility():
         print(f"❌ Interface compatibility test failed: {e}")
         return False
 
+def test_capture_buffer():
+    """Test that the capture buffer grows without losing samples and enforces its cap"""
+    try:
+        from audio_capture import AudioCaptureBuffer
+        
+        buffer = AudioCaptureBuffer(sample_rate=1000, initial_seconds=1.0, max_seconds=5.0)
+        blocks = [np.full(300, i, dtype=np.float32) for i in range(20)]
+        written = sum(buffer.write(block) for block in blocks)
+        
+        # 6000 samples were offered but only 5 seconds (5000 samples) fit
+        expected = np.concatenate(blocks)[:5000]
+        if written != 5000 or not buffer.is_full or not np.array_equal(buffer.view(), expected):
+            print("❌ Capture buffer returned the wrong samples")
+            return False
+        
+        # Views share memory with the buffer instead of copying
+        if not np.shares_memory(buffer.view(100, 200), buffer.view()):
+            print("❌ Capture buffer view is a copy")
+            return False
+        
+        # Past spill_seconds the audio moves to a memory-mapped file without losing samples
+        spilling = AudioCaptureBuffer(sample_rate=1000, initial_seconds=1.0, max_seconds=5.0, spill_seconds=2.0)
+        for block in blocks:
+            spilling.write(block)
+        if not spilling.is_spilled or not np.array_equal(spilling.view(), expected):
+            print("❌ Capture buffer did not spill to disk correctly")
+            return False
+        spilling.reset()
+        if spilling.is_spilled or len(spilling) != 0:
+            print("❌ Capture buffer did not return to memory after reset")
+            return False
+        
+        print("✅ Capture buffer keeps every sample, spills to disk and stops at its maximum length")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Capture buffer test failed: {e}")
+        return False
+
+def test_preroll_buffer():
+    """Test that the pre-roll ring buffer keeps the most recent audio in order"""
+    try:
+        from audio_capture import PreRollBuffer
+        
+        preroll = PreRollBuffer(sample_rate=1000, preroll_ms=100)  # 100 samples
+        samples = np.arange(250, dtype=np.float32)
+        preroll.write(samples[:30])
+        if not np.array_equal(preroll.read(), samples[:30]):
+            print("❌ Pre-roll buffer lost samples before filling up")
+            return False
+        
+        # Writes that wrap around the end, and one larger than the whole buffer
+        for start, end in ((30, 90), (90, 130), (130, 250)):
+            preroll.write(samples[start:end])
+            if not np.array_equal(preroll.read(), samples[max(end - 100, 0):end]):
+                print(f"❌ Pre-roll buffer returned the wrong samples after writing up to {end}")
+                return False
+        
+        preroll.clear()
+        if len(preroll.read()) != 0:
+            print("❌ Pre-roll buffer was not emptied by clear()")
+            return False
+        
+        print("✅ Pre-roll buffer keeps the most recent audio")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Pre-roll buffer test failed: {e}")
+        return False
+
+def test_push_to_talk():
+    """Test the hold and toggle hotkey state machines, and that presses outside a turn are ignored"""
+    try:
+        import threading
+        import time
+        from push_to_talk import PushToTalkManager
+        
+        class FakeSpeechToText:
+            def __init__(self):
+                self.is_recording = False
+                self.events = []
+                self.turn_over = threading.Event()
+            def start_mic_turn(self):
+                self.is_recording = True
+                self.events.append("start")
+            def stop_recording(self):
+                self.is_recording = False
+                self.events.append("stop")
+                self.turn_over.set()
+            def speechtotext_from_mic_continuous(self, **options):
+                self.turn_over.wait(5)
+                self.turn_over.clear()
+                return "turn"
+        
+        def run_turn(push_to_talk, presses):
+            """Wait for a turn in the background and feed it key events"""
+            result = {}
+            waiter = threading.Thread(target=lambda: result.update(text=push_to_talk.wait_for_turn()))
+            waiter.start()
+            while not push_to_talk.armed:
+                time.sleep(0.01)
+            for event in presses:
+                (push_to_talk._on_press if event == "down" else push_to_talk._on_release)(None)
+            waiter.join(5)
+            return result.get("text")
+        
+        for mode, presses, expected in (("hold", ["down", "down", "up"], ["start", "stop"]),
+                                        ("toggle", ["down", "up", "down", "up"], ["start", "stop"])):
+            speech = FakeSpeechToText()
+            push_to_talk = PushToTalkManager(speech, mode=mode)
+            
+            # Not waiting for a turn (e.g. Sam is talking): nothing may start
+            push_to_talk._on_press(None)
+            push_to_talk._on_release(None)
+            if speech.events or push_to_talk.turn_started.is_set():
+                print(f"❌ {mode} mode started a turn while none was expected")
+                return False
+            
+            # Auto-repeated key downs in hold mode must not restart the turn
+            if run_turn(push_to_talk, presses) != "turn" or speech.events != expected:
+                print(f"❌ {mode} mode produced {speech.events}, expected {expected}")
+                return False
+            
+            # The turn has ended and is being answered: presses are ignored again
+            push_to_talk._on_press(None)
+            push_to_talk._on_release(None)
+            if speech.events != expected or push_to_talk.armed:
+                print(f"❌ {mode} mode reacted to a press after the turn ended")
+                return False
+        
+        print("✅ Push-to-talk hold and toggle modes only start turns when one is expected")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Push-to-talk test failed: {e}")
+        return False
+
+def test_voice_activity():
+    """Test that silence is trimmed and trailing silence is measured"""
+    try:
+        from voice_activity import VoiceActivityDetector
+        
+        sample_rate = 16000
+        t = np.arange(sample_rate) / sample_rate
+        tone = (0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+        silence = np.zeros(sample_rate, dtype=np.float32)
+        audio = np.concatenate([silence, tone, silence])
+        
+        vad = VoiceActivityDetector(sample_rate=sample_rate, padding_ms=0)
+        trimmed = vad.trim_silence(audio)
+        if abs(len(trimmed) - sample_rate) > vad.frame_size:
+            print(f"❌ Expected about 1s of speech after trimming, got {len(trimmed) / sample_rate:.2f}s")
+            return False
+        
+        if not 900 <= vad.trailing_silence_ms(audio) <= 1000 or len(vad.trim_silence(silence)) != 0:
+            print("❌ Voice activity detector misread silence")
+            return False
+        
+        print("✅ Voice activity detector trims silence correctly")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Voice activity test failed: {e}")
+        return False
+
+def test_transcription_cache():
+    """Test that the transcription cache keys on content and evicts old entries"""
+    try:
+        from transcription_cache import TranscriptionCache
+        
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = TranscriptionCache(max_entries=2, cache_dir=cache_dir)
+            audio = np.zeros(16000, dtype=np.float32)
+            key = TranscriptionCache.make_key(audio, "base", {"language": "en"})
+            
+            # Different options or different audio must not share an entry
+            if key == TranscriptionCache.make_key(audio, "base", {"language": "de"}) or \
+                    key == TranscriptionCache.make_key(audio + 0.1, "base", {"language": "en"}):
+                print("❌ Cache keys collide")
+                return False
+            
+            cache.put(key, "hello")
+            cache.put("second", "a")
+            cache.put("third", "b")  # Pushes the first entry out of memory
+            
+            # The evicted entry is still served from disk by a fresh cache
+            if key in cache.memory or TranscriptionCache(cache_dir=cache_dir).get(key) != "hello":
+                print("❌ Cache did not evict or persist correctly")
+                return False
+            
+            # Overwriting an entry must not count its disk size twice
+            cache.put(key, "hello again")
+            on_disk = sum(os.path.getsize(os.path.join(cache_dir, name)) for name in os.listdir(cache_dir))
+            if cache.disk_bytes != on_disk:
+                print(f"❌ Cache tracks {cache.disk_bytes} disk bytes, {on_disk} are used")
+                return False
+            
+            cache.clear()
+            if os.listdir(cache_dir) or cache.disk_bytes != 0 or cache.get(key) is not None:
+                print("❌ Cache clear left entries behind")
+                return False
+        
+        print("✅ Transcription cache works")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Transcription cache test failed: {e}")
+        return False
+
+def test_calibration():
+    """Test that 'auto' picks from saved measurements and that background calibration saves them"""
+    try:
+        import whisper_calibration
+        
+        calibration_file = whisper_calibration.CALIBRATION_FILE
+        measure = whisper_calibration.measure_real_time_factor
+        downloaded = whisper_calibration.downloaded_model_sizes
+        with tempfile.TemporaryDirectory() as cache_dir:
+            whisper_calibration.CALIBRATION_FILE = os.path.join(cache_dir, "whisper_calibration.json")
+            # 0.1s per second of audio for base, 0.3s for small: a 10s turn takes 1s and 3s
+            whisper_calibration.measure_real_time_factor = lambda size, audio, device, quantized=False: \
+                {"base": 0.1, "small": 0.3}[size]
+            whisper_calibration.downloaded_model_sizes = lambda candidates: ["base", "small"]
+            try:
+                if (whisper_calibration.select_model_size(2.0, device="cpu", measure=False)
+                        != whisper_calibration.UNCALIBRATED_MODEL_SIZE or whisper_calibration.is_calibrated(device="cpu")):
+                    print("❌ An uncalibrated machine did not fall back to the default size")
+                    return False
+                
+                thread = whisper_calibration.calibrate_in_background(2.0, device="cpu")
+                thread.join(60)
+                # tiny was never downloaded, so it is skipped instead of ending the choice
+                chosen = whisper_calibration.select_model_size(2.0, device="cpu", measure=False)
+                if not whisper_calibration.is_calibrated(device="cpu") or chosen != "base":
+                    print(f"❌ Background calibration led to '{chosen}', expected 'base'")
+                    return False
+                if whisper_calibration.select_model_size(5.0, device="cpu", measure=False) != "small":
+                    print("❌ A larger budget did not pick the larger measured model")
+                    return False
+            finally:
+                whisper_calibration.CALIBRATION_FILE = calibration_file
+                whisper_calibration.measure_real_time_factor = measure
+                whisper_calibration.downloaded_model_sizes = downloaded
+        
+        print("✅ Model size calibration runs in the background and is used by 'auto'")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Calibration test failed: {e}")
+        return False
+
+def test_transcript_stitching():
+    """Test that words repeated in chunk overlaps are removed when stitching"""
+    try:
+        from transcript_utils import stitch_transcripts
+        
+        chunks = [
+            "Sam went into the closet to find his",
+            "find his flashlight, but the trees took it.",
+            "Totally unrelated words here.",
+        ]
+        expected = "Sam went into the closet to find his flashlight, but the trees took it. Totally unrelated words here."
+        result = stitch_transcripts(chunks)
+        if result != expected:
+            print(f"❌ Unexpected stitched transcript: {result}")
+            return False
+        
+        print("✅ Overlapping chunk transcripts stitch correctly")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Transcript stitching test failed: {e}")
+        return False
+
 def main():
     print("🧪 Testing Whisper Speech-to-Text Integration")
     print("=" * 50)
@@ -108,8 +943,16 @@ def main():
     # Test imports
     imports_ok = test_whisper_imports()
     interface_ok = test_interface_compatibility()
+    capture_ok = test_capture_buffer()
+    vad_ok = test_voice_activity()
+    preroll_ok = test_preroll_buffer()
+    push_to_talk_ok = test_push_to_talk()
+    cache_ok = test_transcription_cache()
+    stitching_ok = test_transcript_stitching()
+    calibration_ok = test_calibration()
     
-    if not imports_ok or not interface_ok:
+    if not all([imports_ok, interface_ok, capture_ok, vad_ok, preroll_ok, push_to_talk_ok, cache_ok, stitching_ok,
+                calibration_ok]):
         print("\n" + "=" * 50)
         print("❌ Basic tests failed. Please check the errors above.")
         return 1
@@ -123,11 +966,22 @@ def main():
         return 1
     
     # Test file processing
+    registry_ok = test_model_registry(manager)
     file_ok = test_file_processing(manager)
+    pcm_ok = test_pcm_input(manager)
+    profiles_ok = test_decode_profiles(manager)
+    short_utterance_ok = test_short_utterance(manager)
+    batched_ok = test_batched_transcription(manager)
+    batch_cli_ok = test_batch_transcribe(manager)
+    streaming_ok = test_streaming_transcription(manager)
+    speculation_ok = test_speculation(manager)
+    wake_word_ok = test_wake_word(manager)
+    quantization_ok = test_quantization(manager)
     
     print("\n" + "=" * 50)
     
-    if imports_ok and interface_ok and manager and file_ok:
+    if (imports_ok and interface_ok and manager and registry_ok and file_ok and pcm_ok and profiles_ok
+            and short_utterance_ok and batched_ok and batch_cli_ok and streaming_ok and speculation_ok and wake_word_ok and quantization_ok):
         print("🎉 All tests passed! Whisper Speech-to-Text is ready to use.")
         print("\n📋 Benefits of the new implementation:")
         print("✅ No Azure API keys required - completely free!")
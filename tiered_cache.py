@@ -0,0 +1,167 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+
+class TieredCache:
+    """
+    Text cache with an in-memory LRU tier in front of an optional size-bounded on-disk tier.
+    Entries can expire after ttl_seconds. Subclasses only decide how keys are built.
+    """
+
+    label = "cache"
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: Optional[float] = None,
+                 cache_dir: Optional[str] = None, max_disk_bytes: int = 50 * 1024 * 1024):
+        """
+        Args:
+            max_entries: Entries kept in memory
+            ttl_seconds: How long an entry stays valid, None to keep it until evicted
+            cache_dir: Directory for the on-disk tier, None to keep the cache in memory only
+            max_disk_bytes: Oldest disk entries are evicted once the tier grows past this
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self.disk_bytes = 0
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self.disk_bytes = sum(os.path.getsize(path) for path in self._disk_entries())
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _disk_entries(self):
+        return [entry.path for entry in os.scandir(self.cache_dir) if entry.name.endswith(".json")]
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl_seconds is not None and time.time() - created > self.ttl_seconds
+
+    def get(self, key: str) -> Optional[str]:
+        """Look up an entry that hasn't expired, promoting disk hits into memory"""
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                if not self._expired(entry[1]):
+                    self.memory.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self.memory[key]
+
+        entry = self._read_disk(key)
+        with self.lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, entry)
+        return entry[0]
+
+    def put(self, key: str, text: str):
+        entry = (text, time.time())
+        with self.lock:
+            self._remember(key, entry)
+        self._write_disk(key, entry)
+
+    def _remember(self, key: str, entry: Tuple[str, float]):
+        """Insert into the memory tier, evicting least recently used entries. Caller holds the lock."""
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def _read_disk(self, key: str) -> Optional[Tuple[str, float]]:
+        if not self.cache_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+            entry = (data["text"], data.get("created", 0.0))
+        except (OSError, ValueError, KeyError):
+            return None
+        if self._expired(entry[1]):
+            self._remove_disk(path)
+            return None
+        try:
+            os.utime(path)  # Mark as recently used for eviction
+        except OSError:
+            pass
+        return entry
+
+    def _remove_disk(self, path: str):
+        """Delete one disk entry and take its size off the tier's total"""
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        with self.lock:
+            self.disk_bytes = max(0, self.disk_bytes - size)
+
+    def _write_disk(self, key: str, entry: Tuple[str, float]):
+        if not self.cache_dir:
+            return
+        path = self._disk_path(key)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump({"text": entry[0], "created": entry[1]}, file)
+            try:
+                replaced_bytes = os.path.getsize(path)  # Overwriting an entry frees its old size
+            except OSError:
+                replaced_bytes = 0
+            os.replace(temp_path, path)  # Atomic, so readers never see a partial entry
+            with self.lock:
+                self.disk_bytes += os.path.getsize(path) - replaced_bytes
+                over_limit = self.disk_bytes > self.max_disk_bytes
+            if over_limit:
+                self._evict_disk()
+        except OSError as e:
+            print(f"Could not write {self.label} entry: {e}")
+
+    def _evict_disk(self):
+        """Remove least recently used disk entries until the tier is back under 80% of its limit"""
+        entries = []
+        for path in self._disk_entries():
+            try:
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+            except OSError:
+                continue
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_disk_bytes * 0.8)
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                continue
+
+        with self.lock:
+            self.disk_bytes = total
+
+    def clear(self):
+        with self.lock:
+            self.memory.clear()
+            paths = self._disk_entries() if self.cache_dir else []
+            self.disk_bytes = 0
+        # Delete outside the lock so lookups aren't blocked on file system calls
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,66 @@
+import re
+from difflib import SequenceMatcher
+from typing import List
+
+_PUNCTUATION = re.compile(r"[^\w']+")
+
+
+def _normalize_word(word: str) -> str:
+    """Lowercase with punctuation stripped, for comparing words across transcripts"""
+    return _PUNCTUATION.sub("", word.lower())
+
+
+def stitch_transcripts(texts: List[str], max_overlap_words: int = 12) -> str:
+    """
+    Join transcripts of overlapping audio chunks, removing the words that were
+    transcribed twice in each overlap region.
+
+    The end of the text so far is aligned against the start of the next chunk's text.
+    A run of at least two matching words reaching the end of the previous text is
+    treated as the overlap, allowing for a clipped word at either chunk edge.
+    """
+    stitched: List[str] = []
+    for text in texts:
+        words = text.split()
+        if not stitched or not words:
+            stitched += words
+            continue
+
+        tail = [_normalize_word(word) for word in stitched[-max_overlap_words:]]
+        head = [_normalize_word(word) for word in words[:max_overlap_words + 2]]
+        match = SequenceMatcher(None, tail, head, autojunk=False).find_longest_match(0, len(tail), 0, len(head))
+
+        if match.size >= 2 and match.a + match.size >= len(tail) - 1:
+            # Keep the previous chunk's copy of the overlap, drop the next chunk's
+            del stitched[len(stitched) - len(tail) + match.a + match.size:]
+            words = words[match.b + match.size:]
+        stitched += words
+
+    return " ".join(stitched)
+
+
+def normalize_words(text: str) -> List[str]:
+    """Split a transcript into normalized words, dropping pure punctuation"""
+    words = (_normalize_word(word) for word in text.split())
+    return [word for word in words if word]
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    """
+    Word-level edit distance between two transcripts divided by the reference length,
+    ignoring case and punctuation.
+    """
+    reference_words = normalize_words(reference)
+    hypothesis_words = normalize_words(hypothesis)
+    if not reference_words:
+        return 0.0 if not hypothesis_words else 1.0
+
+    # Levenshtein distance, one row of the DP table at a time
+    previous = list(range(len(hypothesis_words) + 1))
+    for i, reference_word in enumerate(reference_words, start=1):
+        current = [i] + [0] * len(hypothesis_words)
+        for j, hypothesis_word in enumerate(hypothesis_words, start=1):
+            substitution = previous[j - 1] + (reference_word != hypothesis_word)
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, substitution)
+        previous = current
+    return previous[-1] / len(reference_words)
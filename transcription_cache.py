@@ -0,0 +1,53 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Optional
+
+import numpy as np
+
+from tiered_cache import TieredCache
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "babagaboosh", "transcriptions")
+
+
+class TranscriptionCache(TieredCache):
+    """
+    Content-addressed cache of Whisper transcriptions.
+    Entries are keyed by a hash of the decoded PCM, the model size and the decode
+    options, with an in-memory LRU tier in front of a size-bounded on-disk tier.
+    """
+
+    label = "transcription cache"
+
+    def __init__(self, max_entries: int = 256, cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+                 max_disk_bytes: int = 50 * 1024 * 1024):
+        """
+        Args:
+            max_entries: Transcriptions kept in memory
+            cache_dir: Directory for the on-disk tier, None to keep the cache in memory only
+            max_disk_bytes: Oldest disk entries are evicted once the tier grows past this
+        """
+        super().__init__(max_entries, None, cache_dir, max_disk_bytes)
+
+    @staticmethod
+    def make_key(audio: np.ndarray, model_size: str, options: Optional[Dict] = None) -> str:
+        """Hash the PCM samples together with everything that affects the decode"""
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(np.ascontiguousarray(audio, dtype=np.float32).tobytes())
+        digest.update(model_size.encode())
+        digest.update(json.dumps(options or {}, sort_keys=True, default=str).encode())
+        return digest.hexdigest()
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache() -> TranscriptionCache:
+    """The process-wide cache shared by every SpeechToTextManager"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = TranscriptionCache()
+        return _default_cache
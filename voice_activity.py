@@ -0,0 +1,94 @@
+import numpy as np
+from typing import Callable, Optional
+
+
+class VoiceActivityDetector:
+    """
+    Lightweight voice activity detection using vectorized frame energy and
+    zero-crossing rate. A trained model can be plugged in via speech_detector.
+    """
+
+    def __init__(self, sample_rate: int = 16000, frame_ms: int = 30,
+                 energy_threshold_db: float = -40.0, max_zero_crossing_rate: float = 0.35,
+                 padding_ms: int = 200,
+                 speech_detector: Optional[Callable[[np.ndarray], np.ndarray]] = None):
+        """
+        Args:
+            sample_rate: Sample rate of the audio being analyzed
+            frame_ms: Analysis frame length
+            energy_threshold_db: Frames quieter than this (dBFS) count as silence
+            max_zero_crossing_rate: Frames noisier than this (hiss, fans) count as silence
+            padding_ms: Audio kept either side of detected speech when trimming
+            speech_detector: Optional model taking (n_frames, frame_size) float32 frames and
+                             returning a boolean speech mask, replacing the energy rule
+        """
+        self.sample_rate = sample_rate
+        self.frame_size = int(sample_rate * frame_ms / 1000)
+        self.frame_ms = frame_ms
+        self.energy_threshold_db = energy_threshold_db
+        self.max_zero_crossing_rate = max_zero_crossing_rate
+        self.padding_samples = int(sample_rate * padding_ms / 1000)
+        self.speech_detector = speech_detector
+
+    def _frames(self, audio: np.ndarray) -> np.ndarray:
+        """Reshape audio into (n_frames, frame_size) without copying"""
+        n_frames = len(audio) // self.frame_size
+        return audio[:n_frames * self.frame_size].reshape(n_frames, self.frame_size)
+
+    def frame_energy_db(self, audio: np.ndarray) -> np.ndarray:
+        """RMS energy of each frame in dBFS"""
+        frames = self._frames(audio)
+        rms = np.sqrt(np.mean(frames * frames, axis=1))
+        return 20 * np.log10(rms + 1e-10)
+
+    def zero_crossing_rate(self, audio: np.ndarray) -> np.ndarray:
+        """Fraction of sign changes within each frame"""
+        signs = np.signbit(self._frames(audio))
+        return np.mean(signs[:, 1:] != signs[:, :-1], axis=1)
+
+    def speech_mask(self, audio: np.ndarray) -> np.ndarray:
+        """
+        Classify each frame as speech or silence.
+
+        Returns:
+            np.ndarray: Boolean mask with one entry per frame
+        """
+        if self.speech_detector is not None:
+            return np.asarray(self.speech_detector(self._frames(audio)), dtype=bool)
+
+        loud = self.frame_energy_db(audio) > self.energy_threshold_db
+        voiced = self.zero_crossing_rate(audio) < self.max_zero_crossing_rate
+        return loud & voiced
+
+    def has_speech(self, audio: np.ndarray) -> bool:
+        return bool(np.any(self.speech_mask(audio)))
+
+    def trim_silence(self, audio: np.ndarray) -> np.ndarray:
+        """
+        Trim leading and trailing silence, keeping padding_ms around the speech.
+
+        Returns:
+            np.ndarray: View of the speech region, empty if no speech was found
+        """
+        speech = np.flatnonzero(self.speech_mask(audio))
+        if len(speech) == 0:
+            return audio[:0]
+
+        start = max(speech[0] * self.frame_size - self.padding_samples, 0)
+        end = min((speech[-1] + 1) * self.frame_size + self.padding_samples, len(audio))
+        return audio[start:end]
+
+    def trailing_silence_ms(self, audio: np.ndarray, window_ms: int = 3000) -> float:
+        """
+        How long the audio has been silent at its end. Only the last window_ms is
+        analyzed, so this stays cheap to call repeatedly on a growing recording.
+        """
+        window = audio[-int(self.sample_rate * window_ms / 1000):]
+        # Align to the end so the last frame is the most recent audio
+        window = window[len(window) % self.frame_size:]
+        speech = np.flatnonzero(self.speech_mask(window))
+        if len(speech) == 0:
+            return len(window) / self.sample_rate * 1000
+
+        silent_frames = len(window) // self.frame_size - (speech[-1] + 1)
+        return silent_frames * self.frame_ms
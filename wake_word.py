@@ -0,0 +1,174 @@
+"""
+Hands-free turns: a wake phrase such as "hey Sam" starts a recording instead of a hotkey.
+
+Detection runs in two stages so the idle cost stays near zero. Every block the
+open microphone stream delivers goes through an energy gate, which is one RMS
+over 100ms of samples. Only when the gate opens and the speaker pauses (or the
+window fills) does a worker thread run a tiny Whisper model on the last couple
+of seconds. That decode uses the truncated audio context from short_utterance.py,
+and its text is fuzzy-matched against the wake phrases.
+"""
+import threading
+import time
+from difflib import SequenceMatcher
+from typing import List, Optional, Sequence
+
+import numpy as np
+from rich import print
+
+from audio_capture import PreRollBuffer
+from short_utterance import transcribe_short_utterance
+from transcript_utils import normalize_words
+from whisper_model_registry import get_whisper_model
+
+
+class WakeWordManager:
+    """
+    Starts a SpeechToTextManager turn when a wake phrase is heard. Drop-in alternative
+    to PushToTalkManager: start(), wait_for_turn() and stop() work the same way.
+    """
+
+    def __init__(self, speechtotext_manager, phrases: Sequence[str] = ("hey sam",), model_size: str = "tiny",
+                 energy_threshold_db: float = -40.0, window_seconds: float = 2.0, pause_ms: int = 300,
+                 match_threshold: float = 0.75, streaming: bool = True, no_speech_timeout_ms: int = 5000,
+                 max_check_ms: int = 2000):
+        """
+        Args:
+            speechtotext_manager: Manager whose microphone stream is listened to
+            phrases: Wake phrases, matched case and punctuation insensitively
+            model_size: Whisper model used for the keyword check; 'tiny' is plenty
+            energy_threshold_db: Blocks louder than this (dBFS) open the gate
+            window_seconds: Audio checked for the wake phrase; also the longest the check
+                            waits while someone keeps talking
+            pause_ms: Quiet after loud audio that triggers the check
+            match_threshold: Minimum similarity (0-1) between heard words and a phrase
+            streaming: Transcribe long turns in the background while they're recorded
+            no_speech_timeout_ms: End a triggered turn if nobody talks within this long
+            max_check_ms: Longest a wake phrase check is expected to take. The microphone keeps
+                          this much idle audio, so what's said while the check runs starts the turn.
+        """
+        self.speechtotext_manager = speechtotext_manager
+        self.phrases = [normalize_words(phrase) for phrase in phrases]
+        self.model_handle = get_whisper_model(model_size, speechtotext_manager.model_handle.device)
+        self.energy_threshold_db = energy_threshold_db
+        self.window_seconds = window_seconds
+        self.pause_seconds = pause_ms / 1000
+        self.match_threshold = match_threshold
+        self.streaming = streaming
+        self.no_speech_timeout_ms = no_speech_timeout_ms
+        self.max_check_ms = max_check_ms
+
+        self.sample_rate = speechtotext_manager.sample_rate
+        self.window = PreRollBuffer(self.sample_rate, int(window_seconds * 1000))
+        self.window_lock = threading.Lock()
+        self.window_end = 0  # Recorder idle_samples position of the window's last sample
+        self.armed = False  # Only listen while someone is waiting for a turn
+        self.gate_open = threading.Event()
+        self.first_loud_time = 0.0
+        self.last_loud_time = 0.0
+        self.turn_started = threading.Event()
+        self.worker_thread = None
+
+    def start(self):
+        """Open the microphone and start listening for the wake phrase"""
+        if self.worker_thread is None:
+            self.worker_thread = threading.Thread(target=self._run, daemon=True, name="wake-word")
+            self.worker_thread.start()
+        recorder = self.speechtotext_manager.recorder
+        recorder.keep_idle_audio(int(self.pause_seconds * 1000) + self.max_check_ms)
+        recorder.idle_listeners.append(self._on_idle_audio)
+        self.speechtotext_manager.start_listening()
+
+    def stop(self):
+        """Stop listening and close the microphone"""
+        self.armed = False
+        if self._on_idle_audio in self.speechtotext_manager.recorder.idle_listeners:
+            self.speechtotext_manager.recorder.idle_listeners.remove(self._on_idle_audio)
+        self.speechtotext_manager.stop_listening()
+
+    def _on_idle_audio(self, samples: np.ndarray):
+        """Energy gate, runs on the audio thread for every idle block"""
+        if not self.armed:
+            return
+        with self.window_lock:
+            self.window.write(samples)
+            self.window_end = self.speechtotext_manager.recorder.idle_samples
+        rms = float(np.sqrt(np.mean(np.square(samples, dtype=np.float32))))
+        if 20 * np.log10(rms + 1e-10) > self.energy_threshold_db:
+            now = time.time()
+            if not self.gate_open.is_set():
+                self.first_loud_time = now
+                self.gate_open.set()
+            self.last_loud_time = now
+
+    def _run(self):
+        while True:
+            # Blocks without using any CPU until the energy gate opens
+            self.gate_open.wait()
+
+            # Let the speaker finish the phrase: wait for a pause or a full window
+            while (time.time() - self.last_loud_time < self.pause_seconds
+                   and time.time() - self.first_loud_time < self.window_seconds):
+                time.sleep(0.05)
+
+            with self.window_lock:
+                audio = self.window.read()
+                phrase_end = self.window_end
+            self.gate_open.clear()
+            if not self.armed or len(audio) == 0:
+                continue
+
+            try:
+                phrase = self._detect(audio)
+            except Exception as e:
+                print(f"[red]Wake word check failed: {e}")
+                continue
+            if phrase and self.armed:
+                self.armed = False
+                # The turn starts right after the phrase, including what was said during the check
+                self.speechtotext_manager.start_mic_turn(since_idle_sample=phrase_end)
+                self.turn_started.set()
+                print(f"[green]Heard '{phrase}'! Now listening to your microphone:")
+
+    def _detect(self, audio: np.ndarray) -> Optional[str]:
+        """Transcribe the window with the small model and return the wake phrase heard, if any"""
+        model = self.model_handle.model
+        with self.model_handle.decode_lock:
+            text = transcribe_short_utterance(model, audio, language=self.speechtotext_manager.language,
+                                              fp16=self.model_handle.fp16)
+        if not text:
+            return None
+        return self.match_phrase(normalize_words(text))
+
+    def match_phrase(self, words: List[str]) -> Optional[str]:
+        """Fuzzy-match every run of words against the wake phrases (tolerates e.g. 'hay sam')"""
+        for phrase in self.phrases:
+            target = " ".join(phrase)
+            for start in range(max(len(words) - len(phrase), 0) + 1):
+                candidate = " ".join(words[start:start + len(phrase)])
+                if SequenceMatcher(None, candidate, target).ratio() >= self.match_threshold:
+                    return target
+        return None
+
+    def wait_for_turn(self, end_silence_ms: Optional[int] = 1200) -> str:
+        """
+        Listen for the wake phrase, then record until the speaker goes quiet and transcribe.
+
+        Args:
+            end_silence_ms: Silence that ends the turn (the manager needs a vad)
+
+        Returns:
+            str: The transcribed turn
+        """
+        with self.window_lock:
+            self.window.clear()
+        self.armed = True
+        self.turn_started.wait()
+        self.turn_started.clear()
+        return self.speechtotext_manager.speechtotext_from_mic_continuous(
+            stop_key=None,
+            streaming=self.streaming,
+            end_silence_ms=end_silence_ms,
+            turn_started=True,
+            no_speech_timeout_ms=self.no_speech_timeout_ms
+        )
@@ -0,0 +1,218 @@
+"""
+Picks the largest Whisper model that keeps transcription under a latency budget on
+this machine. Measuring downloads and times each model size, so it only happens
+when this script is run; the real-time factors are persisted and
+SpeechToTextManager(model_size="auto") picks from them without measuring anything.
+On a machine without measurements, 'auto' starts with the default size and times
+the models that are already downloaded in a background thread, so the next start
+can pick from them.
+
+Usage:
+    python whisper_calibration.py --budget 2.0
+    python whisper_calibration.py --budget 2.0 --max-size large
+"""
+import argparse
+import json
+import os
+import platform
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import torch
+import whisper
+
+from audio_decoding import WHISPER_SAMPLE_RATE, load_audio_file
+
+MODEL_SIZES = ["tiny", "base", "small", "medium", "large"]  # Smallest to largest
+DEFAULT_MAX_MODEL_SIZE = "medium"  # Largest size measured unless asked for; large is a multi-GB download
+UNCALIBRATED_MODEL_SIZE = "base"  # Used by 'auto' until this machine has been calibrated
+CALIBRATION_FILE = os.path.join(os.path.expanduser("~"), ".cache", "babagaboosh", "whisper_calibration.json")
+CALIBRATION_AUDIO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "TestAudio_WAV.wav")
+
+
+def machine_fingerprint(device: str) -> str:
+    """Identifies the hardware a calibration was measured on"""
+    parts = [platform.machine(), platform.processor() or "unknown", str(os.cpu_count()),
+             f"torch-{torch.__version__}", device, str(torch.get_num_threads())]
+    if device.startswith("cuda") and torch.cuda.is_available():
+        parts.append(torch.cuda.get_device_name(0))
+    return "|".join(parts)
+
+
+def _load_calibrations() -> Dict:
+    try:
+        with open(CALIBRATION_FILE, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_calibrations(calibrations: Dict):
+    try:
+        os.makedirs(os.path.dirname(CALIBRATION_FILE), exist_ok=True)
+        temp_path = CALIBRATION_FILE + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(calibrations, file, indent=2)
+        os.replace(temp_path, CALIBRATION_FILE)
+    except OSError as e:
+        print(f"Could not save Whisper calibration: {e}")
+
+
+def calibration_clip(utterance_seconds: float, audio_file: str = CALIBRATION_AUDIO) -> np.ndarray:
+    """The bundled test audio looped to the length of a typical utterance"""
+    clip = load_audio_file(audio_file, WHISPER_SAMPLE_RATE)
+    n_samples = int(utterance_seconds * WHISPER_SAMPLE_RATE)
+    return np.tile(clip, int(np.ceil(n_samples / len(clip))))[:n_samples]
+
+
+def measure_real_time_factor(model_size: str, audio: np.ndarray, device: str, quantized: bool = False) -> float:
+    """
+    Decode the audio once to warm up, then time a second decode.
+
+    Returns:
+        float: Seconds of compute per second of audio
+    """
+    if quantized:
+        from whisper_quantization import load_quantized_model
+        model = load_quantized_model(model_size)
+    else:
+        model = whisper.load_model(model_size, device=device)
+    fp16 = device.startswith("cuda")
+    try:
+        model.transcribe(audio[:WHISPER_SAMPLE_RATE], language="en", fp16=fp16)
+        start_time = time.time()
+        model.transcribe(audio, language="en", fp16=fp16)
+        return (time.time() - start_time) / (len(audio) / WHISPER_SAMPLE_RATE)
+    finally:
+        del model
+
+
+def downloaded_model_sizes(candidates: List[str]) -> List[str]:
+    """The candidates whose checkpoints are already in Whisper's download folder"""
+    download_root = os.path.join(os.getenv("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")),
+                                 "whisper")
+    return [model_size for model_size in candidates
+            if os.path.exists(os.path.join(download_root, os.path.basename(whisper._MODELS[model_size])))]
+
+
+def calibration_key(device: str, quantized: bool = False) -> str:
+    return machine_fingerprint(device) + ("|int8" if quantized else "")
+
+
+def is_calibrated(utterance_seconds: float = 10.0, device: Optional[str] = None, quantized: bool = False) -> bool:
+    """Whether any model size has been measured on this machine for this utterance length"""
+    device = "cpu" if quantized else (device or ("cuda" if torch.cuda.is_available() else "cpu"))
+    entry = _load_calibrations().get(calibration_key(device, quantized), {})
+    return entry.get("utterance_seconds") == utterance_seconds and bool(entry.get("real_time_factor"))
+
+
+def calibrate_in_background(latency_budget_seconds: float = 2.0, utterance_seconds: float = 10.0,
+                            device: Optional[str] = None, quantized: bool = False) -> Optional[threading.Thread]:
+    """
+    Measure the model sizes that are already downloaded in a daemon thread and save the
+    results, so a later select_model_size(measure=False) can choose from them. Nothing
+    is downloaded.
+
+    Returns:
+        threading.Thread: The calibration thread, or None if no model is downloaded yet
+    """
+    candidates = downloaded_model_sizes(model_sizes_up_to())
+    if not candidates:
+        return None
+
+    def calibrate():
+        try:
+            select_model_size(latency_budget_seconds, utterance_seconds, device, candidates, quantized=quantized)
+        except Exception as e:
+            print(f"Background Whisper calibration failed: {e}")
+
+    print(f"Calibrating Whisper ({', '.join(candidates)}) in the background; the result is used from the next start")
+    thread = threading.Thread(target=calibrate, daemon=True, name="whisper-calibration")
+    thread.start()
+    return thread
+
+
+def model_sizes_up_to(max_model_size: str = DEFAULT_MAX_MODEL_SIZE) -> List[str]:
+    """Model sizes from tiny up to and including max_model_size"""
+    return MODEL_SIZES[:MODEL_SIZES.index(max_model_size) + 1]
+
+
+def select_model_size(latency_budget_seconds: float = 2.0, utterance_seconds: float = 10.0,
+                      device: Optional[str] = None, candidates: Optional[List[str]] = None,
+                      recalibrate: bool = False, quantized: bool = False, measure: bool = True) -> str:
+    """
+    Choose the largest model whose transcription of a typical utterance fits the budget.
+    Sizes are measured smallest first and measuring stops at the first one that is too
+    slow, so large models are never downloaded on machines that can't run them.
+    With measure=False only saved measurements are used, so this returns immediately.
+
+    Args:
+        latency_budget_seconds: Maximum acceptable transcription time per utterance
+        utterance_seconds: Length of a typical utterance
+        device: 'cpu' or 'cuda', defaults to cuda when available
+        candidates: Model sizes to consider, smallest first (default: tiny up to DEFAULT_MAX_MODEL_SIZE)
+        recalibrate: Ignore persisted measurements for this machine
+        quantized: Calibrate int8 quantized CPU models instead of fp32
+        measure: Time sizes that have no saved measurement yet. When False, unmeasured sizes below the
+                 smallest measured one are skipped (e.g. tiny was never downloaded), the choice stops
+                 at the next unmeasured size, and it is UNCALIBRATED_MODEL_SIZE if nothing was measured.
+
+    Returns:
+        str: Chosen model size ('tiny' if even that exceeds the budget)
+    """
+    device = "cpu" if quantized else (device or ("cuda" if torch.cuda.is_available() else "cpu"))
+    candidates = candidates or model_sizes_up_to()
+    fingerprint = calibration_key(device, quantized)
+
+    calibrations = _load_calibrations()
+    entry = calibrations.get(fingerprint, {})
+    if recalibrate or entry.get("utterance_seconds") != utterance_seconds:
+        entry = {"utterance_seconds": utterance_seconds, "real_time_factor": {}}
+    real_time_factors = entry["real_time_factor"]
+
+    if not measure:
+        measured = [model_size for model_size in candidates if model_size in real_time_factors]
+        if not measured:
+            print(f"Whisper hasn't been calibrated on this machine, using '{UNCALIBRATED_MODEL_SIZE}'. "
+                  f"Run 'python whisper_calibration.py' to pick the largest model that fits.")
+            return UNCALIBRATED_MODEL_SIZE
+        candidates = candidates[candidates.index(measured[0]):]
+
+    chosen = candidates[0]
+    clip = None
+    for model_size in candidates:
+        if model_size not in real_time_factors:
+            if not measure:
+                break
+            if clip is None:
+                clip = calibration_clip(utterance_seconds)
+            print(f"Calibrating Whisper model ({model_size})...")
+            real_time_factors[model_size] = round(measure_real_time_factor(model_size, clip, device, quantized), 4)
+            entry["calibrated_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+            calibrations[fingerprint] = entry
+            _save_calibrations(calibrations)
+
+        latency = real_time_factors[model_size] * utterance_seconds
+        print(f"Whisper {model_size}: {latency:.2f}s per {utterance_seconds:.0f}s utterance")
+        if latency > latency_budget_seconds:
+            break
+        chosen = model_size
+
+    print(f"Selected Whisper model '{chosen}' for a {latency_budget_seconds:.1f}s latency budget")
+    return chosen
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure Whisper speed on this machine and pick a model size")
+    parser.add_argument("--budget", type=float, default=2.0, help="Latency budget per utterance in seconds")
+    parser.add_argument("--utterance", type=float, default=10.0, help="Typical utterance length in seconds")
+    parser.add_argument("--device", default=None, help="cpu or cuda (default: cuda if available)")
+    parser.add_argument("--recalibrate", action="store_true", help="Ignore saved measurements")
+    parser.add_argument("--quantized", action="store_true", help="Calibrate int8 quantized CPU models")
+    parser.add_argument("--max-size", choices=MODEL_SIZES, default=DEFAULT_MAX_MODEL_SIZE,
+                        help=f"Largest model size to measure (default: {DEFAULT_MAX_MODEL_SIZE})")
+    args = parser.parse_args()
+    select_model_size(args.budget, args.utterance, args.device, model_sizes_up_to(args.max_size),
+                      recalibrate=args.recalibrate, quantized=args.quantized)
@@ -0,0 +1,162 @@
+import threading
+import time
+import numpy as np
+import torch
+import whisper
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+
+class DecodeCancelled(Exception):
+    """Raised inside a decode running under WhisperModelHandle.cancellable() once it is cancelled"""
+
+
+class WhisperModelHandle:
+    """
+    Handle to a Whisper model that may still be loading in the background.
+    Accessing .model blocks only until the load (and warm-up) has finished.
+    Hold decode_lock while decoding: Whisper installs its kv-cache hooks on the shared
+    model for every decode, so two decodes running at once would corrupt each other.
+    """
+
+    def __init__(self, model_size: str, device: str, dtype: str, future: Optional[Future] = None):
+        self.model_size = model_size
+        self.device = device
+        self.dtype = dtype
+        self.decode_lock = threading.Lock()
+        self._future = future
+        self._cancel = threading.local()  # Cancel event of the decode running on each thread
+
+    @property
+    def model(self):
+        if not self._future.done():
+            print(f"Waiting for Whisper model ({self.model_size}) to finish loading...")
+        return self._future.result()
+
+    @property
+    def fp16(self) -> bool:
+        """Whether decoding should run in half precision for this model"""
+        return self.dtype == "float16"
+
+    def is_ready(self) -> bool:
+        return self._future.done()
+
+    @contextmanager
+    def cancellable(self, cancel: threading.Event):
+        """
+        Decodes this thread runs inside the block raise DecodeCancelled at the next encoder
+        or decoder step once cancel is set, so e.g. a speculative decode that will be thrown
+        away stops holding decode_lock.
+        """
+        self._cancel.event = cancel
+        try:
+            yield
+        finally:
+            self._cancel.event = None
+
+    def _check_cancelled(self, module, inputs):
+        cancel = getattr(self._cancel, "event", None)
+        if cancel is not None and cancel.is_set():
+            raise DecodeCancelled()
+
+    def _install_cancel_hooks(self, model):
+        """Called once while the model loads, before anyone else can decode with it"""
+        model.encoder.register_forward_pre_hook(self._check_cancelled)
+        model.decoder.register_forward_pre_hook(self._check_cancelled)
+
+
+class WhisperModelRegistry:
+    """
+    Loads each Whisper model once per process, off the main thread.
+    Models are keyed by (model size, device, dtype) and shared by every caller.
+    """
+
+    def __init__(self, max_workers: int = 2):
+        self._handles: Dict[Tuple[str, str, str], WhisperModelHandle] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="whisper-load")
+
+    @staticmethod
+    def resolve_device(device: Optional[str] = None) -> str:
+        if device:
+            return device
+        return "cuda" if torch.cuda.is_available() else "cpu"
+
+    @staticmethod
+    def resolve_dtype(device: str, dtype: Optional[str] = None) -> str:
+        if dtype:
+            return dtype
+        # Half precision is not supported for Whisper on CPU
+        return "float16" if device.startswith("cuda") else "float32"
+
+    def get(self, model_size: str = "base", device: Optional[str] = None,
+            dtype: Optional[str] = None, warm_up: bool = True) -> WhisperModelHandle:
+        """
+        Get a handle to a shared model, starting a background load the first time.
+
+        Args:
+            model_size: Whisper model size ('tiny', 'base', 'small', 'medium', 'large')
+            device: 'cpu' or 'cuda', defaults to cuda when available
+            dtype: 'float32', 'float16' or 'int8' (quantized, CPU only), defaults to
+                   float16 on cuda and float32 on cpu
+            warm_up: Run a short throwaway decode after loading
+        """
+        device = "cpu" if dtype == "int8" else self.resolve_device(device)
+        dtype = self.resolve_dtype(device, dtype)
+        key = (model_size, device, dtype)
+
+        with self._lock:
+            handle = self._handles.get(key)
+            if handle is None:
+                print(f"Loading Whisper model ({model_size}) in the background...")
+                handle = WhisperModelHandle(model_size, device, dtype)
+                handle._future = self._executor.submit(self._load, handle, warm_up)
+                self._handles[key] = handle
+            return handle
+
+    def _load(self, handle: WhisperModelHandle, warm_up: bool):
+        """Load the model and optionally warm it up. Runs on a registry worker thread."""
+        model_size, device, dtype = handle.model_size, handle.device, handle.dtype
+        start_time = time.time()
+        if dtype == "int8":
+            # Imported here so torch's quantization modules only load when used
+            from whisper_quantization import load_quantized_model
+            model = load_quantized_model(model_size)
+        else:
+            model = whisper.load_model(model_size, device=device)
+        if dtype == "float16" and device != "cpu":
+            model = model.half()
+        handle._install_cancel_hooks(model)
+        print(f"Whisper model ({model_size}) loaded in {time.time() - start_time:.1f}s")
+
+        if warm_up:
+            try:
+                self._warm_up(model, dtype == "float16")
+            except Exception as e:
+                print(f"Whisper warm-up failed (the model is still usable): {e}")
+        return model
+
+    @staticmethod
+    def _warm_up(model, fp16: bool):
+        """
+        Run one short decode on silence so lazy initialization, allocator growth and
+        kernel selection happen now rather than on the first real utterance.
+        """
+        start_time = time.time()
+        silence = np.zeros(16000, dtype=np.float32)
+        mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(silence), model.dims.n_mels).to(model.device)
+        options = whisper.DecodingOptions(language="en", fp16=fp16, without_timestamps=True, sample_len=8)
+        with torch.no_grad():
+            whisper.decode(model, mel, options)
+        print(f"Whisper model warmed up in {time.time() - start_time:.1f}s")
+
+
+# Shared by every SpeechToTextManager in this process
+model_registry = WhisperModelRegistry()
+
+
+def get_whisper_model(model_size: str = "base", device: Optional[str] = None,
+                      dtype: Optional[str] = None, warm_up: bool = True) -> WhisperModelHandle:
+    """Get a handle to the process-wide shared Whisper model for these settings"""
+    return model_registry.get(model_size, device, dtype, warm_up)
@@ -0,0 +1,129 @@
+"""
+Int8 dynamically quantized Whisper models for CPU-only machines.
+The linear layers (most of Whisper's compute) get int8 weights and activations are
+quantized on the fly. Quantized models are cached on disk so the conversion only
+happens once per model size.
+
+Usage (compare speed and accuracy against fp32 on the bundled test audio):
+    python whisper_quantization.py --models base small
+"""
+import argparse
+import dataclasses
+import os
+import time
+from typing import Dict, List
+
+import torch
+import whisper
+import whisper.model
+from torch.ao.quantization import quantize_dynamic
+
+from audio_decoding import WHISPER_SAMPLE_RATE, load_audio_file
+from transcript_utils import word_error_rate
+
+QUANTIZED_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "babagaboosh", "quantized")
+COMPARISON_AUDIO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "TestAudio_WAV.wav")
+
+
+def quantize_whisper_model(model):
+    """
+    Apply int8 dynamic quantization to every linear layer of a CPU fp32 model.
+    """
+    # Whisper's Linear subclass only adds a dtype cast for fp16, which the quantized
+    # layers don't need; torch only knows how to convert the plain nn.Linear
+    for module in model.modules():
+        if type(module) is whisper.model.Linear:
+            module.__class__ = torch.nn.Linear
+    return quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def _cache_path(model_size: str) -> str:
+    # The packed int8 weight format can change between torch versions
+    return os.path.join(QUANTIZED_CACHE_DIR, f"whisper-{model_size}-int8-state-torch{torch.__version__}.pt")
+
+
+def _empty_quantized_model(dims: Dict, alignment_heads: torch.Tensor):
+    """An int8 model with the right structure whose weights are about to be replaced"""
+    model = whisper.model.Whisper(whisper.model.ModelDimensions(**dims))
+    # Used for word timestamps; a non-persistent buffer, so it isn't part of the state_dict
+    model.register_buffer("alignment_heads", alignment_heads.to_sparse(), persistent=False)
+    return quantize_whisper_model(model)
+
+
+def load_quantized_model(model_size: str = "base"):
+    """
+    Load an int8 model from the on-disk cache, quantizing and caching it the first time.
+    Only the dimensions and the state_dict are cached and they are read with
+    weights_only=True, so loading the cache never unpickles arbitrary objects.
+    """
+    path = _cache_path(model_size)
+    if os.path.exists(path):
+        try:
+            checkpoint = torch.load(path, map_location="cpu", weights_only=True)
+            model = _empty_quantized_model(checkpoint["dims"], checkpoint["alignment_heads"])
+            model.load_state_dict(checkpoint["model_state_dict"])
+            return model.eval()
+        except Exception as e:
+            print(f"Could not load cached quantized model, rebuilding it: {e}")
+
+    start_time = time.time()
+    model = quantize_whisper_model(whisper.load_model(model_size, device="cpu"))
+    print(f"Quantized Whisper model ({model_size}) to int8 in {time.time() - start_time:.1f}s")
+
+    try:
+        os.makedirs(QUANTIZED_CACHE_DIR, exist_ok=True)
+        temp_path = path + ".tmp"
+        torch.save({"dims": dataclasses.asdict(model.dims), "alignment_heads": model.alignment_heads.to_dense(),
+                    "model_state_dict": model.state_dict()}, temp_path)
+        os.replace(temp_path, path)
+    except OSError as e:
+        print(f"Could not cache quantized model: {e}")
+    return model
+
+
+def _timed_transcribe(model, audio, runs: int = 3) -> Dict:
+    """Best-of-n decode time after one warm-up decode"""
+    options = {"language": "en", "fp16": False, "temperature": 0.0, "without_timestamps": True}
+    model.transcribe(audio, **options)
+    timings = []
+    for _ in range(runs):
+        start_time = time.time()
+        text = model.transcribe(audio, **options)["text"].strip()
+        timings.append(time.time() - start_time)
+    return {"text": text, "seconds": min(timings)}
+
+
+def compare_with_fp32(model_size: str = "base", audio_file: str = COMPARISON_AUDIO) -> Dict:
+    """
+    Compare the int8 model against fp32 on one clip.
+
+    Returns:
+        dict: Decode times, speedup, and the int8 word error rate measured against
+              the fp32 transcript
+    """
+    audio = load_audio_file(audio_file, WHISPER_SAMPLE_RATE)
+    fp32 = _timed_transcribe(whisper.load_model(model_size, device="cpu"), audio)
+    int8 = _timed_transcribe(load_quantized_model(model_size), audio)
+    return {
+        "model": model_size,
+        "audio_seconds": round(len(audio) / WHISPER_SAMPLE_RATE, 2),
+        "fp32_seconds": round(fp32["seconds"], 3),
+        "int8_seconds": round(int8["seconds"], 3),
+        "speedup": round(fp32["seconds"] / int8["seconds"], 2),
+        "int8_wer_vs_fp32": round(word_error_rate(fp32["text"], int8["text"]), 3),
+        "fp32_text": fp32["text"],
+        "int8_text": int8["text"],
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare int8 quantized Whisper against fp32 on CPU")
+    parser.add_argument("--models", nargs="+", default=["base"], help="Model sizes to compare")
+    parser.add_argument("--audio", default=COMPARISON_AUDIO, help="Audio file to decode")
+    args = parser.parse_args()
+
+    results: List[Dict] = [compare_with_fp32(model_size, args.audio) for model_size in args.models]
+    print(f"\n{'model':<8}{'fp32 s':>10}{'int8 s':>10}{'speedup':>10}{'WER vs fp32':>14}")
+    for result in results:
+        print(f"{result['model']:<8}{result['fp32_seconds']:>10}{result['int8_seconds']:>10}"
+              f"{result['speedup']:>9}x{result['int8_wer_vs_fp32']:>14.1%}")
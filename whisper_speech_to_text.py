@@ -1,5 +1,4 @@
 import time
-import whisper
 import keyboard
 import os
 import tempfile
@@ -7,7 +6,38 @@ import numpy as np
 import sounddevice as sd
 import soundfile as sf
 import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
+from audio_capture import AudioRecorder
+from voice_activity import VoiceActivityDetector
+from whisper_model_registry import DecodeCancelled, get_whisper_model
+from transcription_cache import TranscriptionCache, get_default_cache
+from audio_decoding import load_audio_file, pcm_to_whisper_audio
+from whisper_calibration import calibrate_in_background, is_calibrated, select_model_size
+from long_file_transcribe import transcribe_long_audio
+from short_utterance import transcribe_short_utterance
+from batched_transcription import BatchedTranscriber
+
+# Named sets of model.transcribe options. {language} is filled in per manager.
+DECODE_PROFILES = {
+    # Short conversational turns: no language detection, greedy decoding, at most one
+    # temperature fallback retry and no timestamp tokens (turns over 30s keep them)
+    "realtime": {
+        "language": "{language}",
+        "temperature": (0.0, 0.4),
+        "beam_size": None,
+        "best_of": None,
+        "condition_on_previous_text": False,
+        "without_timestamps": True,
+    },
+    # File jobs where accuracy matters more than turnaround: beam search and the
+    # full temperature fallback ladder
+    "accurate": {
+        "temperature": (0.0, 0.2, 0.4, 0.6, 0.8, 1.0),
+        "beam_size": 5,
+        "best_of": 5,
+    },
+}
 
 class SpeechToTextManager:
     """
@@ -15,27 +45,110 @@ class SpeechToTextManager:
     Replaces Azure Cognitive Services to eliminate API costs.
     """
     
-    def __init__(self, model_size: str = "base"):
+    def __init__(self, model_size: str = "base", max_recording_seconds: float = 300.0,
+                 vad: Optional[VoiceActivityDetector] = None, device: Optional[str] = None,
+                 cache: Optional[TranscriptionCache] = None, use_cache: bool = True,
+                 latency_budget_seconds: float = 2.0, decode_profile: str = "realtime",
+                 language: str = "en", quantized: bool = False, short_utterance_mode: bool = False,
+                 batch_window_ms: Optional[int] = None, spill_recording_seconds: Optional[float] = 120.0,
+                 preroll_ms: int = 300):
         """
         Initialize Whisper model.
+        The model is shared process-wide and loads in the background; the first
+        transcription waits for it if it isn't ready yet.
         
         Args:
             model_size: Whisper model size ('tiny', 'base', 'small', 'medium', 'large')
                        'base' provides good balance of speed and accuracy
+                       'auto' picks the largest model that fits latency_budget_seconds
+                       according to the measurements saved by 'python whisper_calibration.py',
+                       or 'base' if this machine hasn't been calibrated yet (the models already
+                       downloaded are then measured in the background for the next start)
+            max_recording_seconds: Continuous mic recordings end automatically at this length
+            spill_recording_seconds: Past this length a recording is kept in a memory-mapped
+                                     temporary file instead of RAM (None to disable)
+            preroll_ms: Audio from before a recording starts that is kept when the stream
+                        is held open with start_listening()
+            vad: Optional voice activity detector. When set, silence is trimmed before
+                 transcription and continuous recordings can end on trailing silence
+            device: 'cpu' or 'cuda', defaults to cuda when available
+            cache: Transcription cache to use, defaults to the shared process-wide cache
+            use_cache: Set to False to always run Whisper
+            latency_budget_seconds: Target transcription time per utterance for 'auto'
+            decode_profile: Decoding profile from DECODE_PROFILES for mic and in-memory audio
+            language: Spoken language pinned by the 'realtime' profile
+            quantized: Run an int8 dynamically quantized model on the CPU (see whisper_quantization.py)
+            short_utterance_mode: Encode short realtime clips with an audio context sized to the
+                                  clip instead of the full 30s window (see short_utterance.py)
+            batch_window_ms: If set, realtime clips transcribed concurrently (e.g. several Discord
+                             speakers) are collected for this long and decoded as one batch
         """
-        print(f"Loading Whisper model ({model_size})...")
-        self.model = whisper.load_model(model_size)
-        print("Whisper model loaded successfully!")
+        if model_size == "auto":
+            # Never measure here: that downloads and times several models before startup can finish
+            model_size = select_model_size(latency_budget_seconds, device=device, quantized=quantized,
+                                           measure=False)
+            if not is_calibrated(device=device, quantized=quantized):
+                calibrate_in_background(latency_budget_seconds, device=device, quantized=quantized)
+        self.model_handle = get_whisper_model(model_size, device, dtype="int8" if quantized else None)
         
         # Audio recording settings
         self.sample_rate = 16000  # Whisper expects 16kHz
         self.channels = 1  # Mono audio
         self.dtype = np.float32
+        self.vad = vad
+        self.cache = (cache or get_default_cache()) if use_cache else None
+
+        # Decoding profiles; file jobs default to the accurate profile
+        self.decode_profile = decode_profile
+        self.file_decode_profile = "accurate"
+        self.language = language
+        self.last_decode_stats = {}
+
+        # Short utterance fast path, only used for realtime decodes of clips up to this length
+        self.short_utterance_mode = short_utterance_mode
+        self.short_utterance_max_seconds = 10.0
+
+        # Batches concurrent realtime transcriptions into one forward pass per decode step
+        self.batcher = None
+        if batch_window_ms is not None:
+            self.batcher = BatchedTranscriber(self.model_handle, language=self.language,
+                                              max_wait_ms=batch_window_ms)
         
         # Continuous recording state
         self.is_recording = False
-        self.audio_data = []
-        self.recording_thread = None
+        self.recorder = AudioRecorder(
+            sample_rate=self.sample_rate,
+            channels=self.channels,
+            dtype=self.dtype,
+            max_seconds=max_recording_seconds,
+            on_limit_reached=self.stop_recording,
+            spill_seconds=spill_recording_seconds,
+            preroll_ms=preroll_ms
+        )
+
+        # Streaming transcription settings (used by speechtotext_from_mic_continuous)
+        # Once this much uncommitted audio has been captured, a segment is cut at the
+        # quietest point and transcribed in the background while recording continues.
+        self.streaming_segment_seconds = 8.0
+        self.streaming_max_segment_seconds = 15.0
+        self.streaming_thread = None
+        self.streaming_texts = []
+        self.streaming_committed = 0  # Samples already handed to a streaming segment
+
+        # Speculative transcription (needs a vad): whenever the speaker pauses this long during
+        # a continuous recording, what has been said so far is transcribed in the background.
+        # If nothing more is said before the recording stops, that result is used right away.
+        self.speculative_pause_ms = 400
+        self.speculation = None
+        self.speculation_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="whisper-speculate")
+
+        # Files longer than this are split into chunks and transcribed by worker processes
+        self.long_file_seconds = 180.0
+
+    @property
+    def model(self):
+        """The Whisper model, blocking until the background load has finished"""
+        return self.model_handle.model
 
     def speechtotext_from_mic(self) -> str:
         """
@@ -66,8 +179,7 @@ class SpeechToTextManager:
             audio_np = audio_data.flatten()
             
             # Transcribe with Whisper
-            result = self.model.transcribe(audio_np)
-            text_result = result["text"].strip()
+            text_result = self._transcribe_audio(audio_np)
             
             if text_result:
                 print(f"Recognized: {text_result}")
@@ -99,9 +211,9 @@ class SpeechToTextManager:
                 print(f"Error: File {filename} not found")
                 return ""
             
-            # Transcribe with Whisper
-            result = self.model.transcribe(filename)
-            text_result = result["text"].strip()
+            # Decode to PCM first so repeated files are answered from the cache
+            audio = load_audio_file(filename, self.sample_rate)
+            text_result = self._transcribe_audio(audio, profile=self.file_decode_profile)
             
             if text_result:
                 print(f"Recognized: \n {text_result}")
@@ -114,12 +226,63 @@ class SpeechToTextManager:
             print(f"Error processing file: {e}")
             return ""
 
-    def speechtotext_from_file_continuous(self, filename: str) -> str:
+    def speechtotext_from_array(self, audio: np.ndarray) -> str:
+        """
+        Convert in-memory audio to text.
+        
+        Args:
+            audio: float32 mono samples at 16kHz
+            
+        Returns:
+            str: Transcribed text
+        """
+        try:
+            text_result = self._transcribe_audio(np.asarray(audio, dtype=self.dtype))
+            
+            if text_result:
+                print(f"Recognized: \n {text_result}")
+            else:
+                print("No speech could be recognized")
+            
+            return text_result
+            
+        except Exception as e:
+            print(f"Error processing audio: {e}")
+            return ""
+
+    def speechtotext_from_pcm(self, pcm: bytes, sample_rate: int = 48000, channels: int = 2) -> str:
+        """
+        Convert raw 16-bit PCM audio to text without writing it to disk.
+        
+        Args:
+            pcm: Raw little-endian int16 samples (a WAV header is also accepted)
+            sample_rate: Sample rate of the PCM data (Discord uses 48kHz)
+            channels: Interleaved channel count (Discord audio is stereo)
+            
+        Returns:
+            str: Transcribed text
+        """
+        try:
+            audio = pcm_to_whisper_audio(pcm, sample_rate, channels, self.sample_rate)
+            if len(audio) == 0:
+                print("No audio was recorded")
+                return ""
+            
+            return self.speechtotext_from_array(audio)
+            
+        except Exception as e:
+            print(f"Error processing PCM audio: {e}")
+            return ""
+
+    def speechtotext_from_file_continuous(self, filename: str, workers: Optional[int] = None) -> str:
         """
         Convert long audio file to text with continuous processing.
+        Files longer than long_file_seconds are split at pauses into overlapping
+        chunks that are transcribed in parallel and stitched back together.
         
         Args:
             filename: Path to audio file
+            workers: Worker processes for long files (default: one per 4 cores)
             
         Returns:
             str: Complete transcribed text
@@ -131,9 +294,12 @@ class SpeechToTextManager:
                 print(f"Error: File {filename} not found")
                 return ""
             
-            # Transcribe with Whisper (it handles long files automatically)
-            result = self.model.transcribe(filename)
-            text_result = result["text"].strip()
+            audio = load_audio_file(filename, self.sample_rate)
+            if len(audio) > self.long_file_seconds * self.sample_rate:
+                text_result = self._transcribe_audio(audio, profile=self.file_decode_profile,
+                                                     chunked=True, workers=workers)
+            else:
+                text_result = self._transcribe_audio(audio, profile=self.file_decode_profile)
             
             print(f"\n\nHeres the result we got from continuous file read!\n\n{text_result}\n\n")
             return text_result
@@ -142,55 +308,93 @@ class SpeechToTextManager:
             print(f"Error processing file continuously: {e}")
             return ""
 
-    def speechtotext_from_mic_continuous(self, stop_key: str = 'p') -> str:
+    def speechtotext_from_mic_continuous(self, stop_key: Optional[str] = 'p', streaming: bool = False,
+                                         end_silence_ms: Optional[int] = None, turn_started: bool = False,
+                                         no_speech_timeout_ms: Optional[int] = None) -> str:
         """
         Continuous speech recognition from microphone.
         Records until stop key is pressed.
         
         Args:
-            stop_key: Key to press to stop recording (default: 'p')
+            stop_key: Key to press to stop recording (default: 'p'), None to rely on
+                      end_silence_ms or the recording limit alone
+            streaming: If True, finished segments are transcribed in the background
+                       while recording continues, so only the unfinished tail has
+                       to be decoded after the stop key is pressed
+            end_silence_ms: If set (requires a vad), recording also ends once the speaker
+                            has been silent this long after starting to talk
+            turn_started: The recording was already started with start_mic_turn() (e.g. by
+                          a push-to-talk hotkey); wait for it to end and transcribe it
+            no_speech_timeout_ms: With end_silence_ms, give up if nobody starts talking
+                                  within this long (e.g. after a false wake word)
             
         Returns:
             str: Complete transcribed text
         """
         print(f'Continuous Speech Recognition is now running, say something.')
-        print(f"Press '{stop_key}' to stop recording.")
+        if stop_key:
+            print(f"Press '{stop_key}' to stop recording.")
+        if end_silence_ms and self.vad is None:
+            print("end_silence_ms requires a voice activity detector, ignoring it")
+            end_silence_ms = None
         
         try:
-            self.is_recording = True
-            self.audio_data = []
-            
-            # Start recording in a separate thread
-            self.recording_thread = threading.Thread(target=self._continuous_recording)
-            self.recording_thread.daemon = True
-            self.recording_thread.start()
-            
-            # Wait for stop key
-            while self.is_recording:
-                try:
-                    if keyboard.read_key() == stop_key:
-                        print(f"\nStopping speech recognition")
-                        self.is_recording = False
-                        break
-                except:
-                    # Handle keyboard reading errors
-                    time.sleep(0.1)
-                    continue
+            if not turn_started:
+                self.start_mic_turn()
+
+            # Start transcribing committed segments in the background
+            if streaming:
+                self.streaming_thread = threading.Thread(target=self._streaming_transcription)
+                self.streaming_thread.daemon = True
+                self.streaming_thread.start()
             
-            # Wait for recording thread to finish
-            if self.recording_thread and self.recording_thread.is_alive():
-                self.recording_thread.join(timeout=2.0)
+            # Wait for stop key (or for the recorder to hit its maximum length)
+            stop_hook = keyboard.on_press_key(stop_key, lambda event: self.stop_recording()) if stop_key else None
+            try:
+                speech_started = False
+                checked_samples = 0
+                speculate = self.vad is not None and bool(self.speculative_pause_ms)
+                while self.is_recording:
+                    time.sleep(0.05)
+                    if not end_silence_ms and not speculate:
+                        continue
+
+                    # Only new audio needs checking for the start of speech
+                    captured = self.recorder.buffer.view()
+                    if not speech_started:
+                        speech_started = self.vad.has_speech(captured[checked_samples:])
+                        checked_samples = len(captured) - len(captured) % self.vad.frame_size
+                        if (not speech_started and no_speech_timeout_ms
+                                and len(captured) >= no_speech_timeout_ms * self.sample_rate // 1000):
+                            print(f"\nNo speech within {no_speech_timeout_ms}ms")
+                            self.stop_recording()
+                    else:
+                        window_ms = max(end_silence_ms or 0, self.speculative_pause_ms or 0) + 500
+                        silence_ms = self.vad.trailing_silence_ms(captured, window_ms=window_ms)
+                        if end_silence_ms and silence_ms >= end_silence_ms:
+                            print(f"\nDetected {end_silence_ms}ms of silence")
+                            self.stop_recording()
+                        elif speculate and silence_ms >= self.speculative_pause_ms:
+                            self._speculate(captured, streaming)
+            finally:
+                if stop_hook:
+                    keyboard.unhook(stop_hook)
+            print(f"\nStopping speech recognition")
+
+            # Close the stream; this is a view of the captured audio, not a copy
+            recorded_audio = self.recorder.stop()
+
+            if streaming:
+                return self._finish_streaming_transcription(recorded_audio)
             
             # Process recorded audio
-            if len(self.audio_data) > 0:
-                print("Processing recorded audio...")
-                
-                # Combine all audio chunks
-                combined_audio = np.concatenate(self.audio_data)
-                
-                # Transcribe with Whisper
-                result = self.model.transcribe(combined_audio)
-                final_result = result["text"].strip()
+            if len(recorded_audio) > 0:
+                final_result = self._take_speculation(recorded_audio, 0, None)
+                if final_result is None:
+                    print("Processing recorded audio...")
+                    
+                    # Transcribe with Whisper
+                    final_result = self._transcribe_audio(recorded_audio)
                 
                 print(f"\n\nHeres the result we got!\n\n{final_result}\n\n")
                 return final_result
@@ -201,34 +405,308 @@ class SpeechToTextManager:
         except Exception as e:
             print(f"Error in continuous speech recognition: {e}")
             self.is_recording = False
+            self.recorder.stop()
             return ""
-    
-    def _continuous_recording(self):
+
+    def start_listening(self):
         """
-        Internal method for continuous audio recording.
-        Runs in a separate thread.
+        Keep the microphone stream open between recordings. A short pre-roll of the
+        audio heard before each recording starts is kept, and recordings start
+        without waiting for the stream to open.
         """
-        try:
-            # Record audio in chunks
-            chunk_duration = 0.5  # seconds
-            chunk_samples = int(chunk_duration * self.sample_rate)
+        self.recorder.open()
+
+    def stop_listening(self):
+        """Close the microphone stream opened by start_listening()"""
+        self.recorder.close()
+
+    def start_mic_turn(self, since_idle_sample: Optional[int] = None):
+        """
+        Start recording right away; finish the turn with
+        speechtotext_from_mic_continuous(turn_started=True). Safe to call from a hotkey handler.
+
+        Args:
+            since_idle_sample: Start the turn from this point of the listening stream
+                               (see AudioRecorder.start) instead of the usual short pre-roll
+        """
+        self.streaming_texts = []
+        self.streaming_committed = 0
+        self._cancel_speculation(self.speculation)
+        self.speculation = None
+        
+        # The recorder's stream callback fills its buffer (plus the pre-roll if listening)
+        self.is_recording = True
+        self.recorder.start(since_idle_sample)
+
+    def stop_recording(self):
+        """Ends a continuous recording; called from the stop key hook, a hotkey handler or the recorder"""
+        self.is_recording = False
+
+    def decode_options(self, profile: Optional[str] = None) -> dict:
+        """
+        model.transcribe options for a decoding profile.
+        
+        Args:
+            profile: Name from DECODE_PROFILES (default: this manager's decode_profile)
+        """
+        options = {key: (value.format(language=self.language) if isinstance(value, str) else value)
+                   for key, value in DECODE_PROFILES[profile or self.decode_profile].items()}
+        # fp16 only works on GPU; forcing it off on CPU skips the failed attempt and warning
+        options["fp16"] = self.model_handle.fp16
+        return options
+
+    def _transcribe_audio(self, audio: np.ndarray, profile: Optional[str] = None, chunked: bool = False,
+                          workers: Optional[int] = None, **transcribe_options) -> str:
+        """
+        Transcribe an in-memory float32 16kHz mono array with Whisper.
+        Timing for the call is kept in last_decode_stats.
+        
+        Args:
+            audio: Audio samples
+            profile: Decoding profile (default: this manager's decode_profile)
+            chunked: Transcribe overlapping chunks in parallel worker processes
+            workers: Worker processes to use when chunked
+            **transcribe_options: Extra options passed to model.transcribe, overriding the profile
             
+        Returns:
+            str: Transcribed text
+        """
+        start_time = time.time()
+        profile = profile or self.decode_profile
+        if self.vad is not None:
+            # Whisper compute scales with length and it hallucinates on silence
+            audio = self.vad.trim_silence(audio)
+            if len(audio) == 0:
+                return ""
+
+        profile_options = self.decode_options(profile)
+        if profile_options.get("without_timestamps") and len(audio) > 30 * self.sample_rate:
+            # Whisper moves through audio past its 30s window by the timestamp of the last finished
+            # segment; without timestamps it jumps a whole window and cuts words at the boundary
+            profile_options["without_timestamps"] = False
+        transcribe_options = dict(profile_options, **transcribe_options)
+
+        short_utterance = (self.short_utterance_mode and profile == "realtime" and not chunked
+                           and len(audio) <= self.short_utterance_max_seconds * self.sample_rate)
+        # Batched decoding is greedy (unconfident results are decoded again below) and can't carry
+        # a per-clip prompt
+        batched = (self.batcher is not None and profile == "realtime" and not chunked
+                   and not transcribe_options.get("initial_prompt")
+                   and len(audio) <= 30 * self.sample_rate)
+
+        # Identical audio with identical settings always decodes the same way. The dtype and device are
+        # part of the key so e.g. int8 and fp32 managers never answer with each other's transcriptions.
+        cache_key = None
+        if self.cache is not None:
+            key_options = dict(transcribe_options, chunked=chunked, short_utterance=short_utterance,
+                               batched=batched, dtype=self.model_handle.dtype, device=self.model_handle.device)
+            cache_key = TranscriptionCache.make_key(audio, self.model_handle.model_size, key_options)
+            cached_text = self.cache.get(cache_key)
+            if cached_text is not None:
+                self._record_decode_stats(profile, audio, start_time, cached=True)
+                return cached_text
+
+        text_result = None
+        if short_utterance:
+            model = self.model
+            with self.model_handle.decode_lock:
+                text_result = transcribe_short_utterance(model, audio, transcribe_options.get("language"),
+                                                         transcribe_options["fp16"],
+                                                         transcribe_options.get("initial_prompt"))
+            if text_result is None:
+                print("Short utterance result was not confident, using the full 30s window")
+
+        if batched and text_result is None:
+            text_result = self.batcher.transcribe(audio)
+            if text_result is None:
+                print("Batched result was not confident, decoding with temperature fallback")
+
+        if chunked:
+            text_result = transcribe_long_audio(audio, self.model_handle.model_size, workers,
+                                                self.model_handle.device, self.model_handle.dtype,
+                                                **transcribe_options)
+        elif text_result is None:
+            model = self.model
+            with self.model_handle.decode_lock:
+                result = model.transcribe(audio, **transcribe_options)
+            text_result = result["text"].strip()
+
+        if cache_key is not None:
+            self.cache.put(cache_key, text_result)
+        self._record_decode_stats(profile, audio, start_time, cached=False)
+        return text_result
+
+    def _record_decode_stats(self, profile: str, audio: np.ndarray, start_time: float, cached: bool):
+        """Keep and print timing for the last transcription"""
+        decode_seconds = time.time() - start_time
+        audio_seconds = len(audio) / self.sample_rate
+        self.last_decode_stats = {
+            "profile": profile,
+            "audio_seconds": round(audio_seconds, 3),
+            "decode_seconds": round(decode_seconds, 3),
+            "real_time_factor": round(decode_seconds / audio_seconds, 3) if audio_seconds else 0.0,
+            "cached": cached,
+        }
+        source = "cache" if cached else f"'{profile}' decode"
+        print(f"Transcribed {audio_seconds:.1f}s of audio in {decode_seconds:.2f}s ({source})")
+
+    def _find_segment_cut(self, audio: np.ndarray, min_samples: int, max_samples: int) -> int:
+        """
+        Find the quietest point between min_samples and max_samples to cut a segment,
+        so segment boundaries land in pauses rather than in the middle of a word.
+        
+        Returns:
+            int: Sample index to cut at
+        """
+        frame_size = int(0.03 * self.sample_rate)  # 30ms frames
+        window = audio[min_samples:max_samples]
+        n_frames = len(window) // frame_size
+        if n_frames == 0:
+            return max_samples
+
+        # RMS energy per frame, vectorized over the whole search window
+        frames = window[:n_frames * frame_size].reshape(n_frames, frame_size)
+        energy = np.sqrt(np.mean(frames * frames, axis=1))
+        quietest = int(np.argmin(energy))
+        return min_samples + quietest * frame_size + frame_size // 2
+
+    def _speculate(self, captured: np.ndarray, streaming: bool):
+        """
+        Start a background transcription of everything not yet transcribed, unless nobody
+        has spoken since the last speculation. A speculation still running when more speech
+        arrives is cancelled, since it would be discarded anyway.
+        
+        Args:
+            captured: Everything recorded so far
+            streaming: Whether committed streaming segments are transcribed separately
+        """
+        speculation = self.speculation
+        if speculation is not None and not self.vad.has_speech(captured[speculation["length"]:]):
+            return
+        if speculation is not None and not speculation["future"].done():
+            # Speech after it means it will be discarded; stop it so it doesn't hold the model
+            speculation["cancel"].set()
+
+        start = self.streaming_committed if streaming else 0
+        prompt = (self.streaming_texts[-1] if self.streaming_texts else None) if streaming else None
+        audio = captured[start:]
+        options = {"initial_prompt": prompt} if prompt else {}
+        cancel = threading.Event()
+        self.speculation = {
+            "start": start,
+            "length": len(captured),
+            "prompt": prompt,
+            "cancel": cancel,
+            "future": self.speculation_executor.submit(self._speculative_transcription, audio, cancel, **options),
+        }
+
+    def _speculative_transcription(self, audio: np.ndarray, cancel: threading.Event, **options) -> Optional[str]:
+        """Runs on the speculation thread; returns None if cancelled before or during the decode"""
+        if cancel.is_set():
+            return None
+        try:
+            with self.model_handle.cancellable(cancel):
+                return self._transcribe_audio(audio, **options)
+        except DecodeCancelled:
+            return None
+
+    def _cancel_speculation(self, speculation: Optional[dict]):
+        if speculation is not None:
+            speculation["cancel"].set()
+            speculation["future"].cancel()
+
+    def _take_speculation(self, recorded_audio: np.ndarray, start: int, prompt: Optional[str]) -> Optional[str]:
+        """
+        Use the speculative transcription if it covered the same audio and nothing but
+        silence was recorded after it.
+        
+        Returns:
+            str: The speculative text, or None if it has to be discarded
+        """
+        speculation, self.speculation = self.speculation, None
+        if speculation is None:
+            return None
+        if speculation["start"] != start or speculation["prompt"] != prompt:
+            self._cancel_speculation(speculation)
+            return None
+        if self.vad.has_speech(recorded_audio[speculation["length"]:]):
+            print("More speech arrived after the pause, discarding the speculative transcription")
+            self._cancel_speculation(speculation)
+            return None
+        try:
+            text = speculation["future"].result()
+        except Exception as e:
+            print(f"Speculative transcription failed: {e}")
+            return None
+        if text is None:
+            return None
+        print("Using the transcription made during the last pause")
+        return text
+
+    def _streaming_transcription(self):
+        """
+        Internal method that transcribes committed segments while recording is running.
+        Runs in a separate thread. Any audio left uncommitted when recording stops is
+        handled by _finish_streaming_transcription.
+        """
+        min_samples = int(self.streaming_segment_seconds * self.sample_rate)
+        max_samples = int(self.streaming_max_segment_seconds * self.sample_rate)
+
+        try:
             while self.is_recording:
-                # Record a small chunk
-                chunk = sd.rec(
-                    chunk_samples,
-                    samplerate=self.sample_rate,
-                    channels=self.channels,
-                    dtype=self.dtype
-                )
-                sd.wait()  # Wait for chunk to complete
-                
-                if self.is_recording:  # Check again in case we stopped during recording
-                    self.audio_data.append(chunk.flatten())
-                
+                # Zero-copy view of everything captured since the last committed segment
+                pending = self.recorder.buffer.view(self.streaming_committed)
+
+                # Wait for enough audio that the quietest point is a real pause
+                if len(pending) < max_samples:
+                    time.sleep(0.1)
+                    continue
+
+                cut = self._find_segment_cut(pending, min_samples, max_samples)
+                segment = pending[:cut]
+                self.streaming_committed += cut
+
+                # Condition on the previous segment so wording stays consistent across cuts
+                previous_text = self.streaming_texts[-1] if self.streaming_texts else None
+                text = self._transcribe_audio(segment, initial_prompt=previous_text)
+                if text:
+                    self.streaming_texts.append(text)
+                    print(f"[streaming] {text}")
+
         except Exception as e:
-            print(f"Error in continuous recording: {e}")
-            self.is_recording = False
+            print(f"Error in streaming transcription: {e}")
+
+    def _finish_streaming_transcription(self, recorded_audio: np.ndarray) -> str:
+        """
+        Wait for the background segment in progress, then decode only the unfinished tail.
+        
+        Args:
+            recorded_audio: Everything captured during the recording
+        
+        Returns:
+            str: Complete transcribed text
+        """
+        if self.streaming_thread and self.streaming_thread.is_alive():
+            self.streaming_thread.join()
+
+        tail = recorded_audio[self.streaming_committed:]
+
+        if len(tail) == 0 and not self.streaming_texts:
+            print("No audio was recorded")
+            return ""
+
+        if len(tail) > 0:
+            previous_text = self.streaming_texts[-1] if self.streaming_texts else None
+            text = self._take_speculation(recorded_audio, self.streaming_committed, previous_text)
+            if text is None:
+                print("Processing the remaining audio...")
+                text = self._transcribe_audio(tail, initial_prompt=previous_text)
+            if text:
+                self.streaming_texts.append(text)
+
+        final_result = " ".join(self.streaming_texts)
+        print(f"\n\nHeres the result we got!\n\n{final_result}\n\n")
+        return final_result
 
 
 # Tests